@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The generator's modules import each other as top-level modules (main.py is
+# run as "python3 src/main.py"), so make src/ importable the same way.
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
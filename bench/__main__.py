@@ -0,0 +1,141 @@
+"""
+Benchmark suite for the site generator. Run from the repository root:
+
+    python3 -m bench run --output results.json       # micro + end-to-end
+    python3 -m bench compare base.json results.json  # flag regressions
+    python3 -m bench corpus /tmp/site --pages 1000   # just write a corpus
+    python3 -m bench.render_depth                    # recursive vs iterative renderer
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from bench.build import run_build
+from bench.corpus import CorpusConfig, generate_corpus
+from bench.micro import run_micro
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--blocks-per-page", type=int, default=30)
+    parser.add_argument("--inline-density", type=float, default=0.15,
+                        help="chance that a word carries inline markup (default: 0.15)")
+    parser.add_argument("--depth", type=int, default=3, help="maximum content directory depth")
+    parser.add_argument("--assets", type=int, default=20)
+    parser.add_argument("--block-mix", default=None,
+                        help="weights such as paragraph=5,code=1 (default: mostly paragraphs)")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def config_from_args(args):
+    block_mix = None
+    if args.block_mix:
+        block_mix = {}
+        for item in args.block_mix.split(","):
+            name, weight = item.split("=")
+            block_mix[name.strip()] = float(weight)
+    return CorpusConfig(args.pages, args.blocks_per_page, block_mix, args.inline_density,
+                        args.depth, args.assets, args.seed)
+
+
+def command_run(args):
+    config = config_from_args(args)
+    results = {}
+    if args.suite in ("all", "micro"):
+        results.update(run_micro(config, repeat=args.repeat))
+    if args.suite in ("all", "build"):
+        results.update(run_build(config, jobs=args.jobs))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": config.to_dict(),
+        "results": results,
+    }
+    for name, result in results.items():
+        print(f"{name:<24} {result['seconds'] * 1000:10.2f} ms   {result['mb_per_second']:8.2f} MB/s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+def compare_results(base, new, threshold):
+    """
+    Returns (rows, regressions) where each row is (name, base seconds,
+    new seconds, ratio) for benchmarks present in both reports.
+    """
+    rows = []
+    regressions = []
+    for name, base_result in base["results"].items():
+        new_result = new["results"].get(name)
+        if new_result is None:
+            continue
+        ratio = new_result["seconds"] / base_result["seconds"]
+        rows.append((name, base_result["seconds"], new_result["seconds"], ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def command_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    if base.get("config") != new.get("config"):
+        print("Warning: the two reports were run on different corpus settings")
+
+    rows, regressions = compare_results(base, new, args.threshold)
+    for name, base_seconds, new_seconds, ratio in rows:
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<24} {base_seconds * 1000:10.2f} ms -> {new_seconds * 1000:10.2f} ms  {ratio:6.2f}x{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+def command_corpus(args):
+    markdown_bytes = generate_corpus(args.root, config_from_args(args))
+    print(f"Wrote {args.pages} pages ({markdown_bytes / 1e6:.2f} MB of markdown) to {args.root}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m bench")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    add_corpus_arguments(run_parser)
+    run_parser.add_argument("--suite", choices=["all", "micro", "build"], default="all")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--jobs", type=int, default=1, help="--jobs for the end-to-end build")
+    run_parser.add_argument("--output", help="write results as JSON to this file")
+    run_parser.set_defaults(handler=command_run)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="slowdown that counts as a regression (default: 0.10)")
+    compare_parser.set_defaults(handler=command_compare)
+
+    corpus_parser = commands.add_parser("corpus", help="only write a synthetic site")
+    corpus_parser.add_argument("root")
+    add_corpus_arguments(corpus_parser)
+    corpus_parser.set_defaults(handler=command_corpus)
+
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
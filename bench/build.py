@@ -0,0 +1,40 @@
+"""
+End-to-end benchmark: builds a synthetic site with main() in a temporary
+directory, once from scratch and once again with nothing changed.
+"""
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import bench  # noqa: F401  (puts src/ on sys.path)
+import main as site_main
+from bench.corpus import generate_corpus
+
+
+def _timed_build(argv):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        site_main.main(argv)
+    return time.perf_counter() - started
+
+
+def run_build(config, jobs=1):
+    results = {}
+    old_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        markdown_bytes = generate_corpus(root, config)
+        os.chdir(root)
+        try:
+            options = ["--no-block-cache", "--jobs", str(jobs)]
+            cold = _timed_build(["--clean"] + options)
+            noop = _timed_build(options)
+        finally:
+            os.chdir(old_cwd)
+
+    results["build_cold"] = {"seconds": cold, "items": config.pages,
+                             "mb_per_second": markdown_bytes / cold / 1e6}
+    results["build_noop"] = {"seconds": noop, "items": config.pages,
+                             "mb_per_second": markdown_bytes / noop / 1e6}
+    return results
@@ -0,0 +1,164 @@
+"""
+Deterministic synthetic site generator for benchmarks.
+
+The same arguments always produce the same files, so timings from different
+runs (and different commits) are measured against identical input.
+"""
+import os
+import random
+import struct
+import zlib
+
+
+WORDS = (
+    "the ring of power was forged in secret by the dark lord in the fires of "
+    "mount doom elves men and dwarves each received rings of their own while "
+    "hobbits lived quietly in the shire far from the troubles of the world"
+).split()
+
+DEFAULT_BLOCK_MIX = {
+    "paragraph": 50,
+    "heading": 10,
+    "code": 10,
+    "quote": 10,
+    "unordered_list": 10,
+    "ordered_list": 10,
+}
+
+TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <meta charset="utf-8" />
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>
+"""
+
+
+class CorpusConfig:
+    def __init__(self, pages=200, blocks_per_page=30, block_mix=None, inline_density=0.15,
+                 depth=3, assets=20, seed=0):
+        self.pages = pages
+        self.blocks_per_page = blocks_per_page
+        self.block_mix = dict(block_mix or DEFAULT_BLOCK_MIX)
+        self.inline_density = inline_density
+        self.depth = depth
+        self.assets = assets
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def _words(rng, count):
+    return [rng.choice(WORDS) for _ in range(count)]
+
+
+def inline_text(rng, word_count, density, assets=0):
+    # Markup is only ever wrapped around whole words, so every delimiter is balanced.
+    out = []
+    for word in _words(rng, word_count):
+        if rng.random() >= density:
+            out.append(word)
+            continue
+        kind = rng.randrange(5 if assets else 4)
+        if kind == 0:
+            out.append(f"**{word}**")
+        elif kind == 1:
+            out.append(f"_{word}_")
+        elif kind == 2:
+            out.append(f"`{word}`")
+        elif kind == 3:
+            out.append(f"[{word}](/{rng.choice(WORDS)}/)")
+        else:
+            out.append(f"![{word}](/images/asset_{rng.randrange(assets)}.png)")
+    return " ".join(out)
+
+
+def generate_block(rng, block_type, density, assets=0):
+    if block_type == "heading":
+        return "#" * rng.randint(2, 6) + " " + inline_text(rng, rng.randint(2, 8), density, assets)
+    if block_type == "code":
+        lines = [" ".join(_words(rng, rng.randint(2, 10))) for _ in range(rng.randint(2, 15))]
+        return "```\n" + "\n".join(lines) + "\n```"
+    if block_type == "quote":
+        return "\n".join("> " + inline_text(rng, rng.randint(5, 20), density, assets)
+                         for _ in range(rng.randint(1, 5)))
+    if block_type == "unordered_list":
+        return "\n".join("- " + inline_text(rng, rng.randint(3, 12), density, assets)
+                         for _ in range(rng.randint(2, 8)))
+    if block_type == "ordered_list":
+        return "\n".join(f"{i + 1}. " + inline_text(rng, rng.randint(3, 12), density, assets)
+                         for i in range(rng.randint(2, 8)))
+    lines = [inline_text(rng, rng.randint(8, 25), density, assets) for _ in range(rng.randint(1, 6))]
+    return "\n".join(lines)
+
+
+def generate_markdown(rng, config):
+    block_types = list(config.block_mix)
+    weights = [config.block_mix[block_type] for block_type in block_types]
+    blocks = ["# " + " ".join(_words(rng, rng.randint(2, 6))).title()]
+    for block_type in rng.choices(block_types, weights, k=config.blocks_per_page):
+        blocks.append(generate_block(rng, block_type, config.inline_density, config.assets))
+    return "\n\n".join(blocks) + "\n"
+
+
+def page_path(rng, index, depth):
+    parts = [f"section_{rng.randrange(4)}" for _ in range(rng.randint(0, depth))]
+    return os.path.join(*parts, f"page_{index}", "index.md")
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def generate_png(rng, width, height):
+    # An RGB image with a gradient and some noise, deflated at a low level
+    # so there is something left for an optimizer to find.
+    noise = rng.randrange(1, 32)
+    rows = []
+    for y in range(height):
+        row = bytearray([0])
+        for x in range(width):
+            row += bytes(((x * 255 // width) ^ rng.randrange(noise), (y * 255 // height), (x + y) & 0xFF))
+        rows.append(bytes(row))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"tEXt", b"Comment\x00synthetic benchmark image")
+            + _png_chunk(b"IDAT", zlib.compress(b"".join(rows), 1))
+            + _png_chunk(b"IEND", b""))
+
+
+def generate_corpus(root, config):
+    """
+    Writes content/, static/ and template.html for a synthetic site under root.
+    Returns the total size of the generated markdown in bytes.
+    """
+    rng = random.Random(config.seed)
+    markdown_bytes = 0
+
+    for index in range(config.pages):
+        path = os.path.join(root, "content", page_path(rng, index, config.depth))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        markdown = generate_markdown(rng, config)
+        with open(path, 'w') as f:
+            f.write(markdown)
+        markdown_bytes += len(markdown.encode("utf-8"))
+
+    images_dir = os.path.join(root, "static", "images")
+    os.makedirs(images_dir, exist_ok=True)
+    with open(os.path.join(root, "static", "index.css"), 'w') as f:
+        f.write("body { font-family: serif; }\n" * 50)
+    for index in range(config.assets):
+        with open(os.path.join(images_dir, f"asset_{index}.png"), 'wb') as f:
+            f.write(generate_png(rng, rng.randint(16, 400), rng.randint(16, 300)))
+
+    with open(os.path.join(root, "template.html"), 'w') as f:
+        f.write(TEMPLATE)
+
+    return markdown_bytes
@@ -0,0 +1,56 @@
+"""
+Microbenchmarks for the markdown pipeline, run on text from the synthetic
+corpus so every run measures the same input.
+"""
+import random
+import timeit
+
+import bench  # noqa: F401  (puts src/ on sys.path)
+from bench.corpus import generate_markdown
+from markdown_converter import markdown_to_html_node
+from markdown_utils import block_to_block_type, markdown_to_blocks
+from minify import minify_html
+from textnode import text_to_textnodes
+
+
+def _best_time(function, number, repeat):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def run_micro(config, repeat=5):
+    """
+    Returns {benchmark name: result dict}. Each benchmark processes the whole
+    sample once per call; seconds is the best time per call.
+    """
+    rng = random.Random(config.seed)
+    documents = [generate_markdown(rng, config) for _ in range(min(config.pages, 20))]
+    blocks = [block for document in documents for block in markdown_to_blocks(document)]
+    texts = [block for block in blocks if not block.startswith("```")]
+    nodes = [markdown_to_html_node(document) for document in documents]
+    pages = [node.to_html() for node in nodes]
+    def size(strings):
+        return sum(len(string.encode("utf-8")) for string in strings)
+
+    def each(function, items):
+        return lambda: [function(item) for item in items]
+
+    # name: (benchmark, number of items, bytes of markdown (or, for
+    # minify_html, HTML) processed)
+    benchmarks = {
+        "text_to_textnodes": (each(text_to_textnodes, texts), len(texts), size(texts)),
+        "markdown_to_blocks": (each(markdown_to_blocks, documents), len(documents), size(documents)),
+        "block_to_block_type": (each(block_to_block_type, blocks), len(blocks), size(blocks)),
+        "markdown_to_html_node": (each(markdown_to_html_node, documents), len(documents), size(documents)),
+        "to_html": (each(lambda node: node.to_html(), nodes), len(nodes), size(documents)),
+        "minify_html": (each(minify_html, pages), len(pages), size(pages)),
+    }
+
+    results = {}
+    for name, (function, items, sample_bytes) in benchmarks.items():
+        seconds = _best_time(function, number=3, repeat=repeat)
+        results[name] = {
+            "seconds": seconds,
+            "items": items,
+            "mb_per_second": sample_bytes / seconds / 1e6,
+        }
+    return results
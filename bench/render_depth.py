@@ -0,0 +1,82 @@
+"""
+Compares the explicit-stack ParentNode renderer with a recursive reference
+renderer on wide and on deep trees.
+
+Run from the repository root:
+
+    python3 -m bench.render_depth
+"""
+import sys
+import timeit
+
+import bench  # noqa: F401  (puts src/ on sys.path)
+from htmlnode import LeafNode, ParentNode
+
+
+def render_recursive(node, write):
+    # The one-frame-per-level renderer ParentNode.render_to used to be.
+    if not isinstance(node, ParentNode):
+        node.render_to(write)
+        return
+    write(f"<{node.tag}{node.props_to_html()}>")
+    for child in node.children:
+        render_recursive(child, write)
+    write(f"</{node.tag}>")
+
+
+def wide_tree(paragraphs=2000, leaves=20):
+    children = []
+    for i in range(paragraphs):
+        inline = [LeafNode("b" if j % 3 == 0 else None, f"text {i}.{j} ") for j in range(leaves)]
+        children.append(ParentNode("p", inline))
+    return ParentNode("div", children)
+
+
+def deep_tree(depth):
+    node = LeafNode(None, "core")
+    for _ in range(depth):
+        node = ParentNode("blockquote", [node])
+    return node
+
+
+def time_renderer(render, node, number):
+    def run():
+        chunks = []
+        render(node, chunks.append)
+        return chunks
+    return min(timeit.repeat(run, number=number, repeat=5)) / number
+
+
+def report(name, node, number):
+    iterative = lambda n, write: n.render_to(write)
+
+    chunks = []
+    iterative(node, chunks.append)
+    expected = "".join(chunks)
+
+    iterative_time = time_renderer(iterative, node, number)
+    try:
+        chunks = []
+        render_recursive(node, chunks.append)
+        assert "".join(chunks) == expected, f"{name}: renderers disagree"
+        recursive_time = time_renderer(render_recursive, node, number)
+        recursive_text = f"{recursive_time * 1000:9.3f} ms"
+        ratio_text = f"{recursive_time / iterative_time:5.2f}x"
+    except RecursionError:
+        recursive_text = "RecursionError"
+        ratio_text = "  n/a"
+
+    print(f"{name:<22} iterative {iterative_time * 1000:9.3f} ms   recursive {recursive_text:>14}   speedup {ratio_text}")
+
+
+def main():
+    limit = sys.getrecursionlimit()
+    print(f"Python recursion limit: {limit}")
+    report("wide 2000x20", wide_tree(), number=5)
+    report("deep 500", deep_tree(500), number=50)
+    report(f"deep {limit - 100}", deep_tree(limit - 100), number=50)
+    report("deep 100000", deep_tree(100000), number=1)
+
+
+if __name__ == "__main__":
+    main()
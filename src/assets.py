@@ -0,0 +1,151 @@
+import hashlib
+import os
+
+from build_manifest import hash_bytes, hash_file
+from output_writer import replace_if_changed
+from stylesheets import resolve_css_urls
+
+
+HEADERS_FILENAME = "_headers"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+FINGERPRINT_LENGTH = 10
+
+# Only files that pages and stylesheets link to are fingerprinted. Others,
+# such as robots.txt, favicon.ico, CNAME or _redirects, are looked up by
+# their names and keep them.
+FINGERPRINT_EXTENSIONS = (
+    ".css", ".js", ".mjs",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg",
+    ".woff", ".woff2", ".ttf", ".otf",
+)
+
+
+def fingerprinted_name(name, content_hash):
+    # index.css -> index.<hash>.css
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{content_hash[:FINGERPRINT_LENGTH]}{ext}"
+
+
+def is_fingerprinted(name):
+    return name.lower().endswith(FINGERPRINT_EXTENSIONS)
+
+
+def is_stylesheet(name):
+    return name.lower().endswith(".css")
+
+
+class AssetMap(dict):
+    """
+    Maps the root-relative URL of each static file ("/index.css") to the URL
+    of its fingerprinted copy ("/index.0123456789.css"). copy_contents_recursive
+    fills it in; the template and text_node_to_html_node resolve href and src
+    URLs through it, before the basepath is applied.
+    """
+
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+        # Other files under content-hashed names, such as responsive image
+        # variants, to be cached as immutable too.
+        self.immutable_urls = set()
+        self._digest = None
+
+    def __setitem__(self, url, fingerprinted_url):
+        self._digest = None
+        super().__setitem__(url, fingerprinted_url)
+
+    def url(self, dest_path):
+        return "/" + os.path.relpath(dest_path, self.root).replace(os.sep, "/")
+
+    def path(self, url):
+        return os.path.join(self.root, *url.lstrip("/").split("/"))
+
+    def fingerprint(self, source_path, dest_path, stat_key, manifest=None):
+        """
+        Adds the static file that would be copied to dest_path and returns the
+        fingerprinted path to copy it to instead. The file is only hashed when
+        it is new or changed: otherwise it keeps the name the previous build
+        gave it, as recorded in the manifest.
+        """
+        url = self.url(dest_path)
+        fingerprinted_url = None
+        if manifest is not None:
+            previous_url = manifest.previous_asset_map.get(url)
+            if previous_url is not None and manifest.previous_hash(self.path(previous_url), kind="assets") == stat_key:
+                fingerprinted_url = previous_url
+        if fingerprinted_url is None:
+            dir_url, name = url.rsplit("/", 1)
+            fingerprinted_url = f"{dir_url}/{fingerprinted_name(name, hash_file(source_path))}"
+        self[url] = fingerprinted_url
+        return self.path(fingerprinted_url)
+
+    def copy_stylesheet(self, source_path, dest_path, inputs_key, manifest=None):
+        """
+        Copies a stylesheet under its fingerprinted name with every url() that
+        points at a fingerprinted file resolved through the map, so it must be
+        called once the files it refers to are in the map. The name is the
+        hash of the rewritten stylesheet. inputs_key identifies the source
+        and the map, and a stylesheet whose inputs_key is unchanged keeps the
+        name and copy the previous build gave it. Returns the path copied to
+        and whether it was written.
+        """
+        url = self.url(dest_path)
+        if manifest is not None:
+            previous_url = manifest.previous_asset_map.get(url)
+            if previous_url is not None and os.path.isfile(self.path(previous_url)) \
+                    and manifest.previous_hash(self.path(previous_url), kind="assets") == inputs_key:
+                self[url] = previous_url
+                return self.path(previous_url), False
+
+        with open(source_path, 'r') as f:
+            css = resolve_css_urls(f.read(), url, self).encode("utf-8")
+        dir_url, name = url.rsplit("/", 1)
+        fingerprinted_url = f"{dir_url}/{fingerprinted_name(name, hashlib.sha256(css).hexdigest())}"
+        self[url] = fingerprinted_url
+        fingerprinted_path = self.path(fingerprinted_url)
+        tmp_path = fingerprinted_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(css)
+        return fingerprinted_path, replace_if_changed(tmp_path, fingerprinted_path)
+
+    def resolve(self, url):
+        # A query string or fragment is kept on the fingerprinted URL.
+        end = len(url)
+        for separator in "?#":
+            index = url.find(separator)
+            if index != -1:
+                end = min(end, index)
+        fingerprinted_url = self.get(url[:end])
+        if fingerprinted_url is None:
+            return url
+        return fingerprinted_url + url[end:]
+
+    def add_immutable(self, url):
+        self.immutable_urls.add(url)
+
+    def digest(self):
+        # Identifies the mapping, for the hashes of outputs that depend on it.
+        if self._digest is None:
+            self._digest = hash_bytes(*(part for item in sorted(self.items()) for part in item))
+        return self._digest
+
+    def write_headers(self, manifest=None):
+        """
+        Writes a _headers file (the format Netlify and Cloudflare Pages read)
+        that gives every fingerprinted file, and every URL added with
+        add_immutable, an immutable, year-long cache lifetime. Returns its
+        path. Called again after more immutable URLs are added, it rewrites
+        the file.
+        """
+        lines = []
+        for fingerprinted_url in sorted(set(self.values()) | self.immutable_urls):
+            lines.append(fingerprinted_url)
+            lines.append(f"  Cache-Control: {IMMUTABLE_CACHE_CONTROL}")
+        headers_path = os.path.join(self.root, HEADERS_FILENAME)
+        tmp_path = headers_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        replace_if_changed(tmp_path, headers_path)
+        if manifest is not None:
+            manifest.record(headers_path, hash_bytes(self.digest(), *sorted(self.immutable_urls)), kind="assets")
+        return headers_path
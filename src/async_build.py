@@ -0,0 +1,284 @@
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import profiling
+from build_manifest import HASH_CHUNK_SIZE, hash_bytes
+from markdown_converter import MarkdownStream
+from markdown_utils import extract_title
+from minify import HTMLMinifier
+from output_writer import WriteStats, files_identical, remove_if_exists
+from page_generator import collect_pages, markdown_inputs_hash, print_write_stats, template_inputs_hash
+from template import load_template
+
+
+DEFAULT_IO_CONCURRENCY = 8
+
+# Pages are copied to and from the spool this much at a time.
+SPOOL_CHUNK_SIZE = 64 * 1024
+
+
+class LocalFiles:
+    """
+    The file operations of the async build. They block, and are run on the
+    build's I/O threads. Every source read and output write goes through
+    open_file(), which tests override to simulate a high-latency
+    filesystem.
+
+    Pages are spooled through a local temporary directory: fetch() copies a
+    page's markdown there, the page renders from that copy into the file
+    output_path() names, and store() copies the result into place. Both
+    copies are made in chunks, so no page is held in memory whole, and the
+    render never waits on the filesystem itself.
+    """
+
+    def __init__(self):
+        self.spool_dir = None
+
+    def start(self):
+        self.spool_dir = tempfile.mkdtemp(prefix="spool-")
+
+    def close(self):
+        if self.spool_dir is not None:
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+            self.spool_dir = None
+
+    def open_file(self, path, mode):
+        return open(path, mode)
+
+    def hash_file(self, path):
+        digest = hashlib.sha256()
+        with self.open_file(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _spool_path(self, path, suffix):
+        return os.path.join(self.spool_dir, hash_bytes(os.path.abspath(path))[:16] + suffix)
+
+    def fetch(self, path):
+        # Returns the local copy of path to render from.
+        local_path = self._spool_path(path, ".md")
+        with self.open_file(path, 'rb') as source, open(local_path, 'wb') as f:
+            shutil.copyfileobj(source, f, SPOOL_CHUNK_SIZE)
+        return local_path
+
+    def release(self, local_path):
+        remove_if_exists(local_path)
+
+    def output_path(self, path):
+        # A page that fails to render leaves nothing behind at path.
+        return self._spool_path(path, ".html")
+
+    def store(self, output_path, path):
+        # Copied into place like generate_page writes, unless the file
+        # already holds the same bytes. Returns whether it was written.
+        try:
+            if files_identical(output_path, path, self.open_file):
+                return False
+            dest_dir = os.path.dirname(path)
+            if dest_dir:
+                os.makedirs(dest_dir, exist_ok=True)
+            tmp_path = path + ".tmp"
+            try:
+                with open(output_path, 'rb') as source, self.open_file(tmp_path, 'wb') as f:
+                    shutil.copyfileobj(source, f, SPOOL_CHUNK_SIZE)
+                os.replace(tmp_path, path)
+            except BaseException:
+                remove_if_exists(tmp_path)
+                raise
+            return True
+        finally:
+            remove_if_exists(output_path)
+
+
+def render_page(from_path, source_path, template_path, dest_path, output_path, basepath, log, block_cache=None,
+                asset_map=None, minify=False, stylesheets=None, images=None):
+    """
+    The CPU half of generate_page: streams the markdown at source_path, the
+    local copy of from_path, into the page's HTML at output_path block by
+    block. Returns whether it did, after printing the reason to log when it
+    did not; a failed page leaves no output_path behind.
+    """
+    print(f"Generating page from {from_path} to {dest_path} using {template_path}", file=log)
+
+    try:
+        template = load_template(template_path, basepath, asset_map, stylesheets)
+    except FileNotFoundError:
+        print(f"Error: Template file not found at {template_path}", file=log)
+        return False
+    except Exception as e:
+        print(f"Error reading template file {template_path}: {e}", file=log)
+        return False
+
+    try:
+        markdown_file = open(source_path, 'r')
+    except Exception as e:
+        print(f"Error reading markdown file {from_path}: {e}", file=log)
+        return False
+
+    with markdown_file:
+        try:
+            page_title = extract_title(markdown_file)
+        except UnicodeDecodeError as e:
+            print(f"Error reading markdown file {from_path}: {e}", file=log)
+            return False
+        except ValueError as e:
+            print(f"Error extracting title from {from_path}: {e}", file=log)
+            return False
+        markdown_file.seek(0)
+
+        try:
+            with open(output_path, 'w') as f:
+                write = f.write
+                if minify:
+                    minifier = HTMLMinifier(write)
+                    write = minifier.write
+                content = MarkdownStream(markdown_file, block_cache, asset_map, images)
+                template.render_to(write, {"Title": page_title, "Content": content})
+                if minify:
+                    minifier.close()
+        except UnicodeDecodeError as e:
+            remove_if_exists(output_path)
+            print(f"Error reading markdown file {from_path}: {e}", file=log)
+            return False
+        except ValueError as e:
+            remove_if_exists(output_path)
+            print(f"Error converting markdown to HTML for {from_path}: {e}", file=log)
+            return False
+        except Exception as e:
+            remove_if_exists(output_path)
+            print(f"Error writing final HTML file to {dest_path}: {e}", file=log)
+            return False
+    return True
+
+
+def _render_page_job(from_path, source_path, template_path, dest_path, output_path, basepath, page_options,
+                     profile=False):
+    # Runs on the render executor. Like _generate_page_job, a worker process
+    # of a profiled build sends the page's timings back.
+    if profile:
+        profiling.enable()
+    log = io.StringIO()
+    try:
+        with profiling.page(from_path):
+            ok = render_page(from_path, source_path, template_path, dest_path, output_path, basepath, log,
+                             **page_options)
+    except Exception as e:
+        remove_if_exists(output_path)
+        print(f"Error generating page from {from_path}: {e!r}", file=log)
+        ok = False
+    profile_data = profiling.disable().export() if profile else None
+    return ok, log.getvalue(), profile_data
+
+
+class AsyncPageBuilder:
+    """
+    Generates pages as a pipeline: markdown is fetched and HTML stored on a
+    pool of I/O threads while other pages render on the render executor, so
+    file latency overlaps with CPU work instead of adding to it. At most
+    io_concurrency pages are in flight at once, and each renders from file
+    to file block by block.
+
+    Rendering happens on one thread, or across a process pool with more than
+    one job. Logs are printed in page order, as generate_pages_recursive does.
+    """
+
+    def __init__(self, template_path, basepath, manifest=None, jobs=1, io_concurrency=DEFAULT_IO_CONCURRENCY,
+                 files=None, **page_options):
+        self.template_path = template_path
+        self.basepath = basepath
+        self.manifest = manifest
+        self.jobs = jobs
+        self.io_concurrency = io_concurrency
+        self.files = files or LocalFiles()
+        self.page_options = page_options
+
+    async def build(self, pages):
+        loop = asyncio.get_running_loop()
+        profiler = profiling.active()
+        if self.jobs > 1:
+            render_executor = ProcessPoolExecutor(max_workers=self.jobs)
+        else:
+            render_executor = ThreadPoolExecutor(max_workers=1)
+        io_executor = ThreadPoolExecutor(max_workers=self.io_concurrency)
+        semaphore = asyncio.Semaphore(self.io_concurrency)
+        write_stats = WriteStats()
+
+        async def run_io(func, *args):
+            return await loop.run_in_executor(io_executor, func, *args)
+
+        async def build_page(from_path, dest_path):
+            async with semaphore:
+                inputs_hash = None
+                try:
+                    if self.manifest is not None:
+                        markdown_hash = await run_io(self.files.hash_file, from_path)
+                        inputs_hash = markdown_inputs_hash(markdown_hash, template_hash, self.basepath)
+                        if self.manifest.is_fresh(dest_path, inputs_hash):
+                            return False, f"Skipping unchanged page: {from_path}\n"
+                    source_path = await run_io(self.files.fetch, from_path)
+                except FileNotFoundError:
+                    return False, f"Error: Markdown file not found at {from_path}\n"
+                except Exception as e:
+                    return False, f"Error reading markdown file {from_path}: {e}\n"
+
+                output_path = self.files.output_path(dest_path)
+                try:
+                    ok, log, profile_data = await loop.run_in_executor(
+                        render_executor, _render_page_job, from_path, source_path, self.template_path, dest_path,
+                        output_path, self.basepath, self.page_options, self.jobs > 1 and profiler is not None,
+                    )
+                finally:
+                    await run_io(self.files.release, source_path)
+                if profile_data is not None:
+                    profiler.merge(profile_data)
+                if not ok:
+                    return False, log
+
+                try:
+                    written = await run_io(self.files.store, output_path, dest_path)
+                except Exception as e:
+                    return False, log + f"Error writing final HTML file to {dest_path}: {e}\n"
+                write_stats.count(written)
+
+                if self.manifest is not None:
+                    self.manifest.record(dest_path, inputs_hash)
+                return True, log
+
+        self.files.start()
+        try:
+            template_hash = None
+            if self.manifest is not None:
+                template_hash = await run_io(template_inputs_hash, self.manifest, self.template_path, self.page_options)
+
+            tasks = [asyncio.ensure_future(build_page(from_path, dest_path)) for from_path, dest_path in pages]
+            for task in tasks:
+                ok, log = await task
+                sys.stdout.write(log)
+            return write_stats
+        finally:
+            io_executor.shutdown()
+            render_executor.shutdown()
+            self.files.close()
+
+
+def generate_pages_async(current_content_path, template_path, current_dest_path, basepath, manifest=None, jobs=1,
+                         io_concurrency=DEFAULT_IO_CONCURRENCY, files=None, pages=None, **page_options):
+    """
+    The asyncio counterpart of generate_pages_recursive, for filesystems where
+    I/O latency dominates. Returns the build's WriteStats.
+    """
+    if pages is None:
+        with profiling.span("directory walk"):
+            pages = collect_pages(current_content_path, current_dest_path)
+
+    builder = AsyncPageBuilder(template_path, basepath, manifest, jobs, io_concurrency, files, **page_options)
+    write_stats = asyncio.run(builder.build(pages))
+    print_write_stats(write_stats)
+    return write_stats
@@ -0,0 +1,180 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from build_manifest import GENERATOR_VERSION, hash_bytes
+
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "blocks.sqlite3")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Parsing a short block costs less than hashing it and looking it up.
+MIN_BLOCK_CHARS = 256
+
+
+class BlockCache:
+    """
+    A persistent cache of rendered HTML for markdown blocks, keyed by a hash
+    of the block's lines, the basepath, the asset map and image index, and
+    the generator version, stored in SQLite so it is shared between pages,
+    builds and worker processes. Each entry remembers when it was last used;
+    gc() evicts least recently used entries until the cache fits in
+    max_bytes.
+
+    Lookups and inserts are batched in memory and written by flush(), which
+    MarkdownStream calls once per page.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, min_block_chars=MIN_BLOCK_CHARS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.min_block_chars = min_block_chars
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pending = {}
+        self._used = set()
+
+    # A cache sent to a worker process is rebuilt there from its settings, and
+    # every page job in that worker shares one instance and connection.
+    def __reduce__(self):
+        return (_process_cache, (self.path, self.max_bytes, self.min_block_chars))
+
+    def _connect(self):
+        if self._connection is None:
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            # The async build renders on a thread of its own; the cache is
+            # still only used by one thread at a time.
+            self._connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS blocks ("
+                " key TEXT PRIMARY KEY,"
+                " html TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS blocks_last_used ON blocks (last_used)")
+        return self._connection
+
+    def is_cacheable(self, lines):
+        return sum(len(line) for line in lines) >= self.min_block_chars
+
+    def key(self, lines, basepath="/", *context):
+        # context holds anything else the rendered HTML depends on, such as
+        # the asset map's digest.
+        return hash_bytes(GENERATOR_VERSION, basepath, *context, "\n".join(lines))
+
+    def get(self, key):
+        html = self._pending.get(key)
+        if html is None:
+            row = self._connect().execute("SELECT html FROM blocks WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                html = row[0]
+                self._used.add(key)
+
+        if html is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return html
+
+    def put(self, key, html):
+        self._pending[key] = html
+
+    def flush(self):
+        if not self._pending and not self._used:
+            return
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO blocks (key, html, size, last_used) VALUES (?, ?, ?, ?)",
+                [(key, html, len(html.encode("utf-8")), now) for key, html in self._pending.items()],
+            )
+            connection.executemany(
+                "UPDATE blocks SET last_used = ? WHERE key = ?",
+                [(now, key) for key in self._used],
+            )
+        self._pending.clear()
+        self._used.clear()
+
+    def stats(self):
+        entries, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blocks"
+        ).fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+    def gc(self, max_bytes=None, vacuum=False):
+        """
+        Evicts least recently used blocks until the cache holds at most
+        max_bytes of HTML. Returns (entries removed, bytes removed).
+        """
+        self.flush()
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        connection = self._connect()
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM blocks").fetchone()[0]
+        evicted = []
+        freed = 0
+        if total > max_bytes:
+            for key, size in connection.execute("SELECT key, size FROM blocks ORDER BY last_used, key"):
+                if total - freed <= max_bytes:
+                    break
+                evicted.append((key,))
+                freed += size
+
+        with connection:
+            connection.executemany("DELETE FROM blocks WHERE key = ?", evicted)
+        if vacuum:
+            connection.execute("VACUUM")
+        return len(evicted), freed
+
+    def close(self):
+        self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+_process_caches = {}
+
+
+def _process_cache(path, max_bytes, min_block_chars):
+    key = (os.getpid(), path, max_bytes, min_block_chars)
+    if key not in _process_caches:
+        _process_caches[key] = BlockCache(path, max_bytes, min_block_chars)
+    return _process_caches[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py cache", description="Inspect or trim the block render cache")
+    parser.add_argument("command", choices=["stats", "gc"])
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH, help=f"cache file (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--max-size", type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="size cap in MB for gc (default: %(default)g)")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    if not os.path.exists(args.path):
+        print(f"No block cache at {args.path}")
+        return
+
+    cache = BlockCache(args.path, int(args.max_size * 1024 * 1024))
+    try:
+        if args.command == "gc":
+            removed, freed = cache.gc(vacuum=True)
+            print(f"Evicted {removed} block(s), {freed / (1024 * 1024):.2f} MB")
+        stats = cache.stats()
+        print(f"Block cache {args.path}: {stats['entries']} block(s), "
+              f"{stats['bytes'] / (1024 * 1024):.2f} MB of {stats['max_bytes'] / (1024 * 1024):.2f} MB")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
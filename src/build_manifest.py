@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+
+from output_writer import replace_if_changed
+
+
+# Bump this whenever a change to the generator alters the HTML it produces,
+# so every page recorded by an older build is regenerated.
+GENERATOR_VERSION = "2"
+
+MANIFEST_FILENAME = ".build-manifest.json"
+CHANGES_FILENAME = ".build-changes.json"
+MANIFEST_FORMAT = 2
+
+OUTPUT_KINDS = ("pages", "assets", "compressed", "variants", "search")
+
+# Recorded in place of an inputs hash for inputs that produce no output,
+# such as a compressed variant that would not be smaller than its source.
+SKIPPED_PREFIX = "skipped:"
+
+# Files are hashed this much at a time, which keeps the memory used by a
+# build independent of the size of its pages.
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def hash_bytes(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    Records, for every output file under the destination directory, a hash of
+    the inputs that produced it. A later build can skip any output whose
+    inputs hash is unchanged and delete any output that was not produced again.
+
+    Outputs are grouped by kind ("pages", "assets", "compressed", "variants"
+    or "search") so each stage of the build can clean up after itself.
+
+    The content hash of every output is kept too, so that save() can also
+    write the list of outputs added, modified and removed since the previous
+    build for deploy tooling.
+    """
+
+    def __init__(self, dest_dir_path, entries=None):
+        self.dest_dir_path = dest_dir_path
+        self.path = os.path.join(dest_dir_path, MANIFEST_FILENAME)
+        self.changes_path = os.path.join(dest_dir_path, CHANGES_FILENAME)
+        self.previous = {kind: dict((entries or {}).get(kind, {})) for kind in OUTPUT_KINDS}
+        self.entries = {kind: {} for kind in OUTPUT_KINDS}
+        previous_outputs = (entries or {}).get("outputs", {})
+        self.previous_outputs = {kind: dict(previous_outputs.get(kind, {})) for kind in OUTPUT_KINDS}
+        self.outputs = {kind: {} for kind in OUTPUT_KINDS}
+        self.previous_asset_map = dict((entries or {}).get("asset_map", {}))
+        self.asset_map = {}
+        self._input_hashes = {}
+
+    @classmethod
+    def load(cls, dest_dir_path):
+        path = os.path.join(dest_dir_path, MANIFEST_FILENAME)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return cls(dest_dir_path)
+
+        if data.get("format") != MANIFEST_FORMAT:
+            print(f"Build manifest {path} has an unknown format, rebuilding everything")
+            return cls.outdated(dest_dir_path, data)
+
+        if data.get("generator_version") != GENERATOR_VERSION:
+            print(f"Build manifest is from generator version {data.get('generator_version')}, rebuilding everything")
+            return cls.outdated(dest_dir_path, data)
+
+        return cls(dest_dir_path, data)
+
+    @classmethod
+    def outdated(cls, dest_dir_path, data):
+        # None of the inputs hashes of an older manifest can be trusted, so
+        # every output is rebuilt, but its outputs are still known: those not
+        # produced again are removed as stale and listed as removed.
+        outputs = _as_dict(data.get("outputs"))
+        entries = {kind: dict.fromkeys(_as_dict(data.get(kind))) for kind in OUTPUT_KINDS}
+        entries["outputs"] = {kind: _as_dict(outputs.get(kind)) for kind in OUTPUT_KINDS}
+        return cls(dest_dir_path, entries)
+
+    def hash_input(self, path):
+        # Shared inputs such as the template are hashed once per build.
+        if path not in self._input_hashes:
+            self._input_hashes[path] = hash_file(path) if os.path.isfile(path) else ""
+        return self._input_hashes[path]
+
+    def _key(self, output_path):
+        return os.path.relpath(output_path, self.dest_dir_path).replace(os.sep, "/")
+
+    def previous_hash(self, output_path, kind="pages"):
+        return self.previous[kind].get(self._key(output_path))
+
+    def is_fresh(self, output_path, inputs_hash, kind="pages"):
+        key = self._key(output_path)
+        if self.previous[kind].get(key) != inputs_hash or not os.path.isfile(output_path):
+            return False
+        self.record(output_path, inputs_hash, kind)
+        return True
+
+    def record(self, output_path, inputs_hash, kind="pages"):
+        key = self._key(output_path)
+        self.entries[kind][key] = inputs_hash
+        # An output made from the same inputs as before has the same content,
+        # so only new or changed outputs are read back and hashed.
+        previous_output = self.previous_outputs[kind].get(key)
+        if previous_output is not None and self.previous[kind].get(key) == inputs_hash:
+            self.outputs[kind][key] = previous_output
+        else:
+            self.outputs[kind][key] = hash_file(output_path)
+
+    def is_skipped(self, output_path, inputs_hash, kind="pages"):
+        # Whether the previous build found that these inputs produce no
+        # output. If so, that is recorded again.
+        if self.previous[kind].get(self._key(output_path)) != SKIPPED_PREFIX + inputs_hash:
+            return False
+        self.record_skipped(output_path, inputs_hash, kind)
+        return True
+
+    def record_skipped(self, output_path, inputs_hash, kind="pages"):
+        # Remembers that inputs_hash produces no output at output_path, so a
+        # later build with the same inputs does not try again.
+        key = self._key(output_path)
+        self.entries[kind][key] = SKIPPED_PREFIX + inputs_hash
+        self.outputs[kind].pop(key, None)
+
+    def forget(self, output_path, kind="pages"):
+        key = self._key(output_path)
+        self.entries[kind].pop(key, None)
+        self.outputs[kind].pop(key, None)
+
+    def carry_over(self, kind="pages"):
+        # For partial rebuilds: keep every output of the previous build unless
+        # it is re-recorded or forgotten.
+        for key, inputs_hash in self.previous[kind].items():
+            if key not in self.entries[kind]:
+                self.entries[kind][key] = inputs_hash
+                if key in self.previous_outputs[kind]:
+                    self.outputs[kind][key] = self.previous_outputs[kind][key]
+
+    def stale_outputs(self, kind="pages"):
+        stale = []
+        for key in sorted(self.previous[kind]):
+            if key not in self.entries[kind]:
+                stale.append(os.path.join(self.dest_dir_path, *key.split("/")))
+        return stale
+
+    def remove_stale_outputs(self, kind="pages"):
+        removed = 0
+        for output_path in self.stale_outputs(kind):
+            if os.path.isfile(output_path):
+                print(f"  Removing stale output: {output_path}")
+                os.remove(output_path)
+                removed += 1
+                _remove_empty_parents(os.path.dirname(output_path), self.dest_dir_path)
+        # Forget them so a second call for the same kind is a no-op.
+        for key in list(self.previous[kind]):
+            if key not in self.entries[kind]:
+                del self.previous[kind][key]
+        return removed
+
+    def changes(self):
+        """
+        Returns the outputs added, modified and removed since the previous
+        build, each as a list of {"path", "kind", "sha256"} sorted by path.
+        Paths are relative to the destination directory. A removed output
+        carries the hash it had.
+        """
+        changes = {"added": [], "modified": [], "removed": []}
+        for kind in OUTPUT_KINDS:
+            previous = self.previous_outputs[kind]
+            current = self.outputs[kind]
+            for key, output_hash in current.items():
+                if key not in previous:
+                    changes["added"].append({"path": key, "kind": kind, "sha256": output_hash})
+                elif previous[key] != output_hash:
+                    changes["modified"].append({"path": key, "kind": kind, "sha256": output_hash})
+            for key, output_hash in previous.items():
+                if key not in current:
+                    changes["removed"].append({"path": key, "kind": kind, "sha256": output_hash})
+        for entries in changes.values():
+            entries.sort(key=lambda entry: entry["path"])
+        return changes
+
+    def save(self):
+        os.makedirs(self.dest_dir_path, exist_ok=True)
+        data = {
+            "format": MANIFEST_FORMAT,
+            "generator_version": GENERATOR_VERSION,
+        }
+        for kind in OUTPUT_KINDS:
+            data[kind] = dict(sorted(self.entries[kind].items()))
+        data["outputs"] = {kind: dict(sorted(self.outputs[kind].items())) for kind in OUTPUT_KINDS}
+        if self.asset_map:
+            data["asset_map"] = dict(sorted(self.asset_map.items()))
+        _write_json(self.path, data)
+
+        changes = self.changes()
+        _write_json(self.changes_path, dict({"generator_version": GENERATOR_VERSION}, **changes))
+        return changes
+
+
+def _as_dict(value):
+    # Sections of a manifest in another format may be missing or shaped
+    # differently; only the ones that still look like key -> hash are used.
+    return value if isinstance(value, dict) else {}
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+    replace_if_changed(tmp_path, path)
+
+
+def _remove_empty_parents(dir_path, stop_path):
+    stop_path = os.path.abspath(stop_path)
+    dir_path = os.path.abspath(dir_path)
+    while dir_path != stop_path and dir_path.startswith(stop_path + os.sep):
+        try:
+            os.rmdir(dir_path)
+        except OSError:
+            return
+        dir_path = os.path.dirname(dir_path)
@@ -0,0 +1,73 @@
+import os
+import struct
+import zlib
+
+from png_optimize import PNG_SIGNATURE, png_chunk
+
+
+# Helpers shared by the test modules.
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def write_bytes(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def read_tree(root):
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path) as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def gradient(width, height, channels):
+    return [bytes((x * 7 + y * 13 + c * 50) % 256 for x in range(width) for c in range(channels)) for y in range(height)]
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def _filter_row(filter_type, row, prior, bpp):
+    # The encoder side of each PNG filter.
+    out = bytearray()
+    for i, value in enumerate(row):
+        a = row[i - bpp] if i >= bpp else 0
+        b = prior[i]
+        c = prior[i - bpp] if i >= bpp else 0
+        predictor = [0, a, b, (a + b) >> 1, _paeth(a, b, c)][filter_type]
+        out.append((value - predictor) & 0xFF)
+    return bytes((filter_type,)) + bytes(out)
+
+
+def make_png(rows, width, color_type=2, bpp=3, extra_chunks=(), filtered=True, level=-1, idat_count=1):
+    """
+    Encodes 8-bit rows of pixels as a PNG. Rows are filtered with each
+    scanline filter in turn, or stored unfiltered, and the compressed data is
+    split across idat_count IDAT chunks the way some encoders write it.
+    """
+    raw = b""
+    prior = bytes(len(rows[0]))
+    for y, row in enumerate(rows):
+        raw += _filter_row(y % 5 if filtered else 0, row, prior, bpp)
+        prior = row
+    compressed = zlib.compress(raw, level)
+    step = len(compressed) // idat_count + 1
+    idats = [png_chunk(b"IDAT", compressed[i:i + step]) for i in range(0, len(compressed), step)]
+    ihdr = struct.pack(">IIBBBBB", width, len(rows), 8, color_type, 0, 0, 0)
+    extra = [png_chunk(chunk_type, payload) for chunk_type, payload in extra_chunks]
+    return PNG_SIGNATURE + png_chunk(b"IHDR", ihdr) + b"".join(extra) + b"".join(idats) + png_chunk(b"IEND", b"")
@@ -1,3 +1,25 @@
+# Props holding URLs. A root-relative URL in one of them is prefixed with the
+# basepath the site is served under when the node is rendered.
+URL_ATTRIBUTES = ("href", "src")
+# Props holding a comma-separated list of "URL descriptor" candidates.
+URL_LIST_ATTRIBUTES = ("srcset",)
+
+
+def prefix_url(url, basepath):
+    # Protocol-relative ("//host/...") and relative URLs are left alone.
+    if url.startswith("/") and not url.startswith("//"):
+        return basepath + url[1:]
+    return url
+
+
+def prefix_srcset(srcset, basepath):
+    candidates = []
+    for candidate in srcset.split(","):
+        url, _, descriptor = candidate.strip().partition(" ")
+        candidates.append(f"{prefix_url(url, basepath)} {descriptor}".rstrip())
+    return ", ".join(candidates)
+
+
 class HTMLNode:
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
@@ -5,15 +27,24 @@ class HTMLNode:
         self.children = children
         self.props = props
 
-    def to_html(self):
+    def to_html(self, basepath="/"):
         raise NotImplementedError("to_html method not implemented")
 
-    def props_to_html(self):
+    def render_to(self, write, basepath="/"):
+        # Streams the node's HTML to write() in chunks. Subclasses that only
+        # implement to_html() still work, as a single chunk.
+        write(self.to_html() if basepath == "/" else self.to_html(basepath))
+
+    def props_to_html(self, basepath="/"):
         if self.props is None:
             return ""
 
         html_attributes = []
         for key, value in self.props.items():
+            if basepath != "/" and key in URL_ATTRIBUTES:
+                value = prefix_url(value, basepath)
+            elif basepath != "/" and key in URL_LIST_ATTRIBUTES:
+                value = prefix_srcset(value, basepath)
             html_attributes.append(f' {key}="{value}"')
 
         return "".join(html_attributes)
@@ -28,14 +59,17 @@ class LeafNode(HTMLNode):
         if self.value is None:
             raise ValueError("Leaf nodes require a value")
 
-    def to_html(self):
+    def to_html(self, basepath="/"):
         if self.tag is None:
             return self.value
 
-        props_string = self.props_to_html()
+        props_string = self.props_to_html(basepath)
 
         return f"<{self.tag}{props_string}>{self.value}</{self.tag}>"
 
+    def render_to(self, write, basepath="/"):
+        write(self.to_html(basepath))
+
     def __repr__(self):
         return f"LeafNode(tag='{self.tag}', value='{self.value}', props={self.props})"
 
@@ -50,19 +84,40 @@ class ParentNode(HTMLNode):
              raise ValueError("ParentNode requires children")
 
 
-    def to_html(self):
-        if self.tag is None:
-            raise ValueError("ParentNode requires a tag")
-        if self.children is None or len(self.children) == 0:
-             raise ValueError("ParentNode requires children")
-
-        props_string = self.props_to_html()
-
-        children_html = ""
-        for child in self.children:
-            children_html += child.to_html()
-
-        return f"<{self.tag}{props_string}>{children_html}</{self.tag}>"
+    def to_html(self, basepath="/"):
+        chunks = []
+        self.render_to(chunks.append, basepath)
+        return "".join(chunks)
+
+    def render_to(self, write, basepath="/"):
+        # Walks the tree with an explicit stack instead of recursing, so the
+        # nesting depth is not limited by Python's recursion limit. Pending
+        # closing tags are pushed as plain strings between the nodes.
+        stack = [self]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            item = pop()
+            item_type = type(item)
+            if item_type is str:
+                write(item)
+            elif item_type is LeafNode:
+                write(item.to_html(basepath))
+            elif item_type is ParentNode or (
+                isinstance(item, ParentNode) and item_type.render_to is ParentNode.render_to
+            ):
+                if item.tag is None:
+                    raise ValueError("ParentNode requires a tag")
+                if item.children is None or len(item.children) == 0:
+                     raise ValueError("ParentNode requires children")
+
+                write(f"<{item.tag}{item.props_to_html(basepath)}>")
+                push(f"</{item.tag}>")
+                stack.extend(reversed(item.children))
+            elif basepath == "/":
+                item.render_to(write)
+            else:
+                item.render_to(write, basepath)
 
     def __repr__(self):
         return f"ParentNode(tag='{self.tag}', children={self.children}, props={self.props})"
@@ -0,0 +1,234 @@
+import json
+import os
+import struct
+
+from build_manifest import hash_bytes
+from output_writer import replace_if_changed
+
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "images.json")
+CACHE_FORMAT = 1
+
+IMAGE_EXTENSIONS = (".png", ".gif", ".webp", ".jpg", ".jpeg")
+
+# JPEG start-of-frame markers, which carry the image size. C4, C8 and CC
+# are other segments that share the range.
+JPEG_SOF_MARKERS = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+# Markers with no length or payload.
+JPEG_STANDALONE_MARKERS = frozenset((0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8))
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def _png_size(header):
+    if header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def _gif_size(header):
+    return struct.unpack("<HH", header[6:10])
+
+
+def _webp_size(header):
+    chunk = header[12:16]
+    if chunk == b"VP8 " and header[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and header[20:21] == b"\x2f":
+        bits = int.from_bytes(header[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(header[24:27], "little") + 1, int.from_bytes(header[27:30], "little") + 1
+    return None
+
+
+def _exif_orientation(exif):
+    # exif is an APP1 payload after "Exif\0\0": a TIFF header, then IFD0.
+    if exif[:2] == b"II":
+        order = "<"
+    elif exif[:2] == b"MM":
+        order = ">"
+    else:
+        return 1
+    offset = struct.unpack(order + "I", exif[4:8])[0]
+    if offset + 2 > len(exif):
+        return 1
+    count = struct.unpack(order + "H", exif[offset:offset + 2])[0]
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(exif):
+            break
+        tag, = struct.unpack(order + "H", exif[entry:entry + 2])
+        if tag == EXIF_ORIENTATION_TAG:
+            return struct.unpack(order + "H", exif[entry + 8:entry + 10])[0]
+    return 1
+
+
+def _jpeg_size(f):
+    # Walks the segments up to the first start-of-frame, seeking past the
+    # rest, so only a few hundred bytes of a large photo are read.
+    f.seek(2)
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        while byte == b"\xff":
+            marker = f.read(1)
+            if marker != b"\xff":
+                break
+            byte = marker
+        else:
+            return None
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in JPEG_SOF_MARKERS:
+            segment = f.read(5)
+            if len(segment) < 5:
+                return None
+            height, width = struct.unpack(">HH", segment[1:5])
+            # Orientations 5 to 8 rotate the image a quarter turn, and
+            # browsers display it rotated.
+            if orientation >= 5:
+                width, height = height, width
+            return width, height
+        if marker == 0xE1:
+            payload = f.read(length - 2)
+            if payload[:6] == b"Exif\x00\x00":
+                orientation = _exif_orientation(payload[6:])
+        elif marker == 0xD9:
+            return None
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_size(path):
+    """
+    Returns (width, height) in pixels of the PNG, GIF, WebP or JPEG image at
+    path, read from its header without decoding it, or None when the file is
+    not one of those or its header is damaged.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(32)
+            if header.startswith(b"\x89PNG\r\n\x1a\n") and len(header) >= 24:
+                return _png_size(header)
+            if header[:6] in (b"GIF87a", b"GIF89a") and len(header) >= 10:
+                return _gif_size(header)
+            if header[:4] == b"RIFF" and header[8:12] == b"WEBP" and len(header) >= 30:
+                return _webp_size(header)
+            if header[:2] == b"\xff\xd8":
+                return _jpeg_size(f)
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+class ImageIndex(dict):
+    """
+    Maps the URL of each image in the built site ("/images/a.png") to its
+    (width, height), so text_node_to_html_node can size <img> tags. Built
+    once per build by load().
+
+    variants maps an image's URL to the (URL, width) of its downscaled
+    copies, which add_variant records; with any, the <img> also gets a
+    srcset and the sizes attribute in sizes_attribute.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.variants = {}
+        self.sizes_attribute = None
+        self._digest = None
+
+    def __setitem__(self, url, size):
+        self._digest = None
+        super().__setitem__(url, size)
+
+    @classmethod
+    def load(cls, manifest, cache_path=DEFAULT_CACHE_PATH):
+        """
+        Indexes the images among the assets recorded in the build manifest.
+        Sizes are cached on disk by content hash, which the manifest already
+        holds for every copied file, so only new or changed images are opened.
+        """
+        cache = {}
+        try:
+            with open(cache_path, 'r') as f:
+                data = json.load(f)
+            if data.get("format") == CACHE_FORMAT:
+                cache = data.get("sizes", {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+        index = cls()
+        sizes = {}
+        images = read = 0
+        for key, content_hash in sorted(manifest.outputs["assets"].items()):
+            if not key.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            images += 1
+            if content_hash in cache:
+                size = cache[content_hash]
+            else:
+                size = read_image_size(os.path.join(manifest.dest_dir_path, *key.split("/")))
+                read += 1
+            sizes[content_hash] = size
+            if size is not None:
+                index["/" + key] = tuple(size)
+
+        # Only the sizes of images in this build are kept.
+        if sizes != cache:
+            cache_dir = os.path.dirname(cache_path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"format": CACHE_FORMAT, "sizes": sizes}, f, sort_keys=True)
+            replace_if_changed(tmp_path, cache_path)
+
+        print(f"Images: {images} indexed, {read} header(s) read, the rest from the cache")
+        return index
+
+    def add_variant(self, url, variant_url, width):
+        self._digest = None
+        self.variants.setdefault(url, []).append((variant_url, width))
+
+    def digest(self):
+        # Identifies the sizes and variants, for the hashes of pages and
+        # blocks that use them.
+        if self._digest is None:
+            parts = [f"{url}={width}x{height}" for url, (width, height) in sorted(self.items())]
+            for url, variants in sorted(self.variants.items()):
+                parts.extend(f"{url}<{variant_url}={width}w" for variant_url, width in variants)
+            parts.append(self.sizes_attribute or "")
+            self._digest = hash_bytes(*parts)
+        return self._digest
+
+    def attributes(self, url):
+        """
+        Returns the props to add to an <img> of url: its width and height when
+        they are known, the srcset of its variants, and lazy loading and async
+        decoding hints.
+        """
+        props = {}
+        path = url.split("#", 1)[0].split("?", 1)[0]
+        size = self.get(path)
+        if size is not None:
+            props["width"] = str(size[0])
+            props["height"] = str(size[1])
+            variants = self.variants.get(path)
+            if variants:
+                candidates = [f"{variant_url} {width}w" for variant_url, width in sorted(variants, key=lambda v: v[1])]
+                candidates.append(f"{url} {size[0]}w")
+                props["srcset"] = ", ".join(candidates)
+                if self.sizes_attribute:
+                    props["sizes"] = self.sizes_attribute
+        props["loading"] = "lazy"
+        props["decoding"] = "async"
+        return props
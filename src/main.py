@@ -1,40 +1,225 @@
+import argparse
 import os
 import shutil
 import sys
 
+import async_build
+import block_cache
+import png_optimize
+import precompress
+import profiling
+import responsive_images
+import search_index
+import stylesheets
+from block_cache import BlockCache
+from build_manifest import BuildManifest
 from markdown_utils import copy_contents_recursive
-from page_generator import generate_pages_recursive
+from assets import AssetMap
+from images import ImageIndex
+from stylesheets import Stylesheets
+from async_build import generate_pages_async
+from page_generator import collect_pages, generate_pages_recursive
 
 
-def main():
-    print("Starting static site generation...")
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the static site into docs/")
+    parser.add_argument("basepath", nargs="?", default="/",
+                        help="URL prefix the site is served under (default: /)")
+    parser.add_argument("--clean", action="store_true",
+                        help="delete the destination directory and rebuild everything")
+    parser.add_argument("--checksum", action="store_true",
+                        help="compare static files by content instead of size and mtime")
+    parser.add_argument("--no-block-cache", dest="block_cache", action="store_false",
+                        help="do not reuse rendered blocks from earlier builds")
+    parser.add_argument("--block-cache-size", type=float, default=block_cache.DEFAULT_MAX_BYTES / (1024 * 1024),
+                        help="size cap in MB for the block render cache (default: %(default)g)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="render pages across N worker processes (0 = one per CPU)")
+    parser.add_argument("--async-io", action="store_true",
+                        help="overlap reading and writing files with rendering (for slow filesystems)")
+    parser.add_argument("--io-concurrency", type=int, default=async_build.DEFAULT_IO_CONCURRENCY,
+                        help="pages in flight at once with --async-io (default: %(default)s)")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="copy static files under content-hashed names and point pages at them")
+    parser.add_argument("--minify", action="store_true",
+                        help="collapse whitespace and drop comments in generated pages (keeps <pre> and <code>)")
+    parser.add_argument("--optimize-png", action="store_true",
+                        help="copy PNGs recompressed losslessly, with metadata chunks stripped")
+    parser.add_argument("--image-dimensions", action="store_true",
+                        help="give <img> tags width/height from the image files, and lazy-loading hints")
+    parser.add_argument("--responsive-images", action="store_true",
+                        help="write narrower copies of PNGs shown in content and list them in srcset "
+                             "(implies --image-dimensions)")
+    parser.add_argument("--responsive-widths", default=",".join(map(str, responsive_images.DEFAULT_WIDTHS)),
+                        help="comma-separated widths in pixels of the copies (default: %(default)s)")
+    parser.add_argument("--inline-css", action="store_true",
+                        help="inline small stylesheets into each page's <head> and load the others without "
+                             "blocking rendering")
+    parser.add_argument("--inline-css-max-size", type=int, default=stylesheets.DEFAULT_INLINE_MAX_SIZE,
+                        help="largest minified stylesheet in bytes to inline (default: %(default)s)")
+    parser.add_argument("--search-index", action="store_true",
+                        help="write a prefix-sharded search index of every page, and its client, to search/")
+    parser.add_argument("--precompress", action="store_true",
+                        help="write .gz (and .br/.zst when available) siblings of compressible outputs")
+    parser.add_argument("--precompress-min-size", type=int, default=precompress.DEFAULT_MIN_SIZE,
+                        help="smallest file in bytes worth precompressing (default: %(default)s)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each build stage and write a trace-event file")
+    parser.add_argument("--profile-output", default=profiling.DEFAULT_PROFILE_PATH,
+                        help="where --profile writes its trace (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive number")
+    if args.io_concurrency < 1:
+        parser.error("--io-concurrency must be a positive number")
+    try:
+        args.responsive_widths = sorted({int(width) for width in args.responsive_widths.split(",")})
+    except ValueError:
+        parser.error("--responsive-widths must be a comma-separated list of widths")
+    if not args.responsive_widths or args.responsive_widths[0] < 1:
+        parser.error("--responsive-widths must be positive numbers")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    return args
+
+
+STATIC_DIR_PATH = "static"
+DEST_DIR_PATH = "docs"
+CONTENT_PATH = "content"
+TEMPLATE_PATH = "template.html"
+
+
+def normalize_basepath(basepath):
+    if not basepath.endswith('/'):
+         basepath += '/'
+    return basepath
+
+
+def build_site(basepath, jobs=1, checksum=False, clean=False, cache=None, io_concurrency=None,
+               precompress_min_size=None, fingerprint=False, minify=False, inline_css_max_size=None,
+               image_dimensions=False, optimize_png=False, responsive_widths=None, search=False):
+    if clean and os.path.exists(DEST_DIR_PATH):
+        print(f"Cleaning destination directory: {DEST_DIR_PATH}")
+        shutil.rmtree(DEST_DIR_PATH)
+
+    if not os.path.exists(DEST_DIR_PATH):
+        print(f"Creating destination directory: {DEST_DIR_PATH}")
+        os.mkdir(DEST_DIR_PATH)
+
+    manifest = BuildManifest.load(DEST_DIR_PATH)
+
+    substitutes = None
+    if optimize_png:
+        with profiling.span("png optimize"):
+            substitutes, _ = png_optimize.optimize_pngs(STATIC_DIR_PATH)
+
+    with profiling.span("static copy"):
+        asset_map = AssetMap(DEST_DIR_PATH) if fingerprint else None
+        copy_contents_recursive(STATIC_DIR_PATH, DEST_DIR_PATH, manifest, checksum, asset_map=asset_map,
+                                substitutes=substitutes)
 
-    static_dir_path = "static"
-    dest_dir_path = "docs"
-    content_path = "content"
-    template_path = "template.html"
+    # Read from the copies just made, once, then compiled into the template.
+    page_stylesheets = None
+    if inline_css_max_size is not None:
+        page_stylesheets = Stylesheets.load(TEMPLATE_PATH, DEST_DIR_PATH, basepath, inline_css_max_size, asset_map)
+        inlined = sum(1 for css in page_stylesheets.values() if css is not None)
+        print(f"Stylesheets: {inlined} inlined, {len(page_stylesheets) - inlined} linked")
 
-    basepath = "/"
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
-        if not basepath.endswith('/'):
-             basepath += '/'
+    images = None
+    if image_dimensions or responsive_widths:
+        images = ImageIndex.load(manifest)
+    if responsive_widths:
+        with profiling.span("responsive images"):
+            responsive_images.generate_variants(manifest, images, CONTENT_PATH, responsive_widths, asset_map)
+
+    # Walked once, for the pages and the search index.
+    with profiling.span("directory walk"):
+        pages = collect_pages(CONTENT_PATH, DEST_DIR_PATH)
+
+    if io_concurrency:
+        generate_pages_async(CONTENT_PATH, TEMPLATE_PATH, DEST_DIR_PATH, basepath, manifest, jobs,
+                             io_concurrency, pages=pages, block_cache=cache, asset_map=asset_map, minify=minify,
+                             stylesheets=page_stylesheets, images=images)
+    else:
+        generate_pages_recursive(CONTENT_PATH, TEMPLATE_PATH, DEST_DIR_PATH, basepath, manifest, jobs, pages=pages,
+                                 block_cache=cache, asset_map=asset_map, minify=minify, stylesheets=page_stylesheets,
+                                 images=images)
+
+    if cache is not None:
+        evicted, freed = cache.gc()
+        if evicted:
+            print(f"Evicted {evicted} block(s) ({freed} bytes) from the block cache")
+
+    if search:
+        with profiling.span("search index"):
+            search_index.build_search_index(manifest, CONTENT_PATH, basepath, pages=pages)
+
+    if precompress_min_size is not None:
+        with profiling.span("precompress"):
+            precompress.precompress_outputs(manifest, precompress_min_size)
+
+    # Compressed and responsive variants left over from pages or assets that
+    # are gone, and search shards no longer produced, are stale too, as are
+    # all of them after a build with --precompress, --responsive-images or
+    # --search-index when this one has none.
+    removed = sum(manifest.remove_stale_outputs(kind) for kind in ("pages", "compressed", "variants", "search"))
+    if removed:
+        print(f"Removed {removed} stale output(s)")
+    changes = manifest.save()
+    print(f"Changes since the previous build: {len(changes['added'])} added, {len(changes['modified'])} modified, "
+          f"{len(changes['removed'])} removed (listed in {manifest.changes_path})")
+    return manifest
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["cache"]:
+        block_cache.main(argv[1:])
+        return
+
+    args = parse_args(argv)
+    print("Starting static site generation...")
 
+    basepath = normalize_basepath(args.basepath)
 
-    if not os.path.exists(static_dir_path):
-        print(f"Error: Static directory not found at {static_dir_path}")
+    if not os.path.exists(STATIC_DIR_PATH):
+        print(f"Error: Static directory not found at {STATIC_DIR_PATH}")
         sys.exit(1)
 
-    if os.path.exists(dest_dir_path):
-        print(f"Cleaning destination directory: {dest_dir_path}")
-        shutil.rmtree(dest_dir_path)
+    cache = None
+    if args.block_cache:
+        cache = BlockCache(max_bytes=int(args.block_cache_size * 1024 * 1024))
 
-    print(f"Creating destination directory: {dest_dir_path}")
-    os.mkdir(dest_dir_path)
+    if args.profile:
+        profiling.enable()
 
-    copy_contents_recursive(static_dir_path, dest_dir_path)
+    try:
+        with profiling.span("build", "other"):
+            build_site(
+                basepath,
+                jobs=args.jobs,
+                checksum=args.checksum,
+                clean=args.clean,
+                cache=cache,
+                io_concurrency=args.io_concurrency if args.async_io else None,
+                precompress_min_size=args.precompress_min_size if args.precompress else None,
+                fingerprint=args.fingerprint,
+                minify=args.minify,
+                inline_css_max_size=args.inline_css_max_size if args.inline_css else None,
+                image_dimensions=args.image_dimensions,
+                optimize_png=args.optimize_png,
+                responsive_widths=args.responsive_widths if args.responsive_images else None,
+                search=args.search_index,
+            )
+    finally:
+        if cache is not None:
+            cache.close()
+        profiler = profiling.disable()
 
-    generate_pages_recursive(content_path, template_path, dest_dir_path, basepath)
+    if profiler is not None:
+        profiler.write_trace(args.profile_output)
+        print(profiler.summary())
+        print(f"Profile written to {args.profile_output}")
 
     print("Static site generation finished.")
 
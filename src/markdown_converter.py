@@ -1,85 +1,138 @@
 from htmlnode import ParentNode, LeafNode
 from textnode import text_to_textnodes, text_node_to_html_node, TextNode, TextType
-from markdown_utils import markdown_to_blocks, block_to_block_type, BlockType
+from markdown_utils import scan_blocks, BlockType
 
 
-def text_to_children(text):
+def text_to_children(text, asset_map=None, images=None):
     text_nodes = text_to_textnodes(text)
     children_html_nodes = []
     for text_node in text_nodes:
-        children_html_nodes.append(text_node_to_html_node(text_node))
+        children_html_nodes.append(text_node_to_html_node(text_node, asset_map, images))
     return children_html_nodes
 
 
-def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
-    block_html_nodes = []
-
-    if not blocks: # Handle empty or whitespace input based on test expectations
+def block_to_html_node(block, asset_map=None, images=None):
+    block_type = block.type
+    lines = block.lines
+
+    if block_type == BlockType.PARAGRAPH:
+        children = text_to_children("\n".join(lines), asset_map, images)
+        return ParentNode("p", children)
+
+    elif block_type == BlockType.HEADING:
+        heading = lines[0]
+        level = 0
+        for char in heading:
+            if char == '#':
+                level += 1
+            else:
+                break
+        heading_text = heading[level:].strip()
+        children = text_to_children(heading_text, asset_map, images)
+        return ParentNode(f"h{level}", children)
+
+    elif block_type == BlockType.CODE:
+        # Code block special case: extract content and remove leading newline if present
+        code_content = "\n".join(lines)[3:-3]
+        if code_content.startswith('\n'):
+            code_content = code_content[1:]
+        raw_code_leaf = LeafNode(None, code_content)
+        code_html = ParentNode("code", [raw_code_leaf])
+        return ParentNode("pre", [code_html])
+
+    elif block_type == BlockType.QUOTE:
+        processed_lines = [line[1:].strip() for line in lines] # Remove '>' and strip
+        processed_text = "\n".join(processed_lines)
+        children = text_to_children(processed_text, asset_map, images)
+        return ParentNode("blockquote", children)
+
+    elif block_type == BlockType.UNORDERED_LIST:
+        list_items = []
+        for line in lines:
+            item_text = line[2:]
+            children = text_to_children(item_text, asset_map, images)
+            list_items.append(ParentNode("li", children))
+        return ParentNode("ul", list_items)
+
+    elif block_type == BlockType.ORDERED_LIST:
+        list_items = []
+        for line in lines:
+             dot_index = line.find('.')
+             space_index = line.find(' ', dot_index + 1)
+             item_text = line[space_index + 1:]
+             children = text_to_children(item_text, asset_map, images)
+             list_items.append(ParentNode("li", children))
+        return ParentNode("ol", list_items)
+
+    raise ValueError(f"Unknown block type: {block_type}")
+
+
+def markdown_to_html_node(markdown, asset_map=None, images=None):
+    # markdown may be a string or an iterable of lines; blocks are converted
+    # one at a time as the scanner yields them.
+    block_html_nodes = [block_to_html_node(block, asset_map, images) for block in scan_blocks(markdown)]
+
+    if not block_html_nodes: # Handle empty or whitespace input based on test expectations
         # Return an empty div using LeafNode as ParentNode requires children
         return LeafNode("div", "")
 
-    for block in blocks:
-        block_type = block_to_block_type(block)
-        html_node = None
-
-        if block_type == BlockType.PARAGRAPH:
-            children = text_to_children(block)
-            html_node = ParentNode("p", children)
-
-        elif block_type == BlockType.HEADING:
-            level = 0
-            for char in block:
-                if char == '#':
-                    level += 1
-                else:
-                    break
-            heading_text = block[level:].strip()
-            children = text_to_children(heading_text)
-            html_node = ParentNode(f"h{level}", children)
-
-        elif block_type == BlockType.CODE:
-            # Code block special case: extract content and remove leading newline if present
-            code_content = block[3:-3]
-            if code_content.startswith('\n'):
-                code_content = code_content[1:]
-            raw_code_leaf = LeafNode(None, code_content)
-            code_html = ParentNode("code", [raw_code_leaf])
-            html_node = ParentNode("pre", [code_html])
-
-        elif block_type == BlockType.QUOTE:
-            lines = block.split('\n')
-            processed_lines = [line[1:].strip() for line in lines] # Remove '>' and strip
-            processed_text = "\n".join(processed_lines)
-            children = text_to_children(processed_text)
-            html_node = ParentNode("blockquote", children)
-
-        elif block_type == BlockType.UNORDERED_LIST:
-            lines = block.split('\n')
-            list_items = []
-            for line in lines:
-                item_text = line[2:]
-                children = text_to_children(item_text)
-                list_items.append(ParentNode("li", children))
-            html_node = ParentNode("ul", list_items)
-
-        elif block_type == BlockType.ORDERED_LIST:
-            lines = block.split('\n')
-            list_items = []
-            for i, line in enumerate(lines):
-                 dot_index = line.find('.')
-                 space_index = line.find(' ', dot_index + 1)
-                 item_text = line[space_index + 1:]
-                 children = text_to_children(item_text)
-                 list_items.append(ParentNode("li", children))
-            html_node = ParentNode("ol", list_items)
-
-        else:
-            raise ValueError(f"Unknown block type: {block_type}")
-
-        if html_node: # Only append if a node was created
-            block_html_nodes.append(html_node)
-
     parent_div = ParentNode("div", block_html_nodes)
     return parent_div
 
+
+class MarkdownStream:
+    """
+    Markdown content that is converted to HTML one block at a time while it
+    is being rendered, so only the current block and its nodes are ever in
+    memory. lines may be a string or any iterable of lines, such as an open
+    file. Renders exactly what markdown_to_html_node(...).render_to would.
+
+    With a BlockCache, blocks rendered before (on any page, in any build) are
+    written from the cache without being parsed again. With an AssetMap,
+    links and images point at fingerprinted static files; with an
+    ImageIndex, images are sized and lazy-loaded.
+    """
+
+    def __init__(self, lines, block_cache=None, asset_map=None, images=None):
+        self.lines = lines
+        self.block_cache = block_cache
+        self.asset_map = asset_map
+        self.images = images
+        # Everything besides the block and the basepath that the cached HTML
+        # depends on.
+        self._cache_context = ()
+        if asset_map is not None or images is not None:
+            self._cache_context = (asset_map.digest() if asset_map is not None else "",
+                                   images.digest() if images is not None else "")
+
+    def render_to(self, write, basepath="/"):
+        blocks = scan_blocks(self.lines)
+        first_block = next(blocks, None)
+        if first_block is None:
+            LeafNode("div", "").render_to(write)
+            return
+
+        write("<div>")
+        try:
+            self._render_block(first_block, write, basepath)
+            for block in blocks:
+                self._render_block(block, write, basepath)
+        finally:
+            if self.block_cache is not None:
+                self.block_cache.flush()
+        write("</div>")
+
+    def _render_block(self, block, write, basepath):
+        cache = self.block_cache
+        if cache is None or not cache.is_cacheable(block.lines):
+            block_to_html_node(block, self.asset_map, self.images).render_to(write, basepath)
+            return
+
+        key = cache.key(block.lines, basepath, *self._cache_context)
+        html = cache.get(key)
+        if html is None:
+            chunks = []
+            block_to_html_node(block, self.asset_map, self.images).render_to(chunks.append, basepath)
+            html = "".join(chunks)
+            cache.put(key, html)
+        write(html)
@@ -1,9 +1,14 @@
+import io
 import re
+from collections import namedtuple
 from enum import Enum
 import os
 import shutil
 import sys
 
+from assets import is_fingerprinted, is_stylesheet
+from build_manifest import hash_bytes, hash_file
+
 
 class BlockType(Enum):
     PARAGRAPH = "paragraph"
@@ -14,6 +19,14 @@ class BlockType(Enum):
     ORDERED_LIST = "ordered_list"
 
 
+# A block as produced by scan_blocks: its BlockType, its lines with the
+# block's surrounding whitespace removed, and the 1-based numbers of its
+# first and last source lines.
+Block = namedtuple("Block", ["type", "lines", "start_line", "end_line"])
+
+HEADING_REGEX = re.compile(r"#{1,6} ")
+
+
 def extract_markdown_images(text):
     matches = re.findall(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
     return matches
@@ -96,72 +109,249 @@ def split_nodes_link(old_nodes):
     return new_nodes
 
 
-def markdown_to_blocks(markdown):
-    blocks = markdown.split("\n\n")
-    filtered_blocks = []
-    for block in blocks:
-        stripped_block = block.strip()
-        if stripped_block != "":
-            filtered_blocks.append(stripped_block)
-    return filtered_blocks
-
+def scan_blocks(markdown):
+    """
+    Scans markdown line by line and yields a Block for each block, without
+    holding more than the current block in memory. markdown may be a string
+    or any iterable of lines, such as an open file.
+
+    Blocks are separated by empty lines. A block whose first line opens a
+    ``` fence runs until a later line closes it, so fenced code may contain
+    empty lines; a fence that is never closed is split like ordinary text.
+    """
+    if isinstance(markdown, str):
+        markdown = io.StringIO(markdown)
+
+    pending = []
+    start_line = 0
+    has_content = False
+    open_fence = False
+
+    for line_number, line in enumerate(markdown, 1):
+        if line.endswith("\n"):
+            line = line[:-1]
+
+        if line == "":
+            if open_fence:
+                pending.append(line)
+            elif pending:
+                yield from _finish_block(pending, start_line)
+                pending = []
+                has_content = False
+            continue
 
-def block_to_block_type(block):
-    lines = block.split('\n')
+        if not pending:
+            start_line = line_number
+
+        stripped = line.strip()
+        if stripped:
+            if not has_content:
+                has_content = True
+                open_fence = stripped.startswith("```") and not (len(stripped) >= 6 and stripped.endswith("```"))
+            elif open_fence and stripped.endswith("```"):
+                open_fence = False
+        pending.append(line)
+
+    if open_fence:
+        # Unterminated fence: fall back to splitting on empty lines.
+        group = []
+        group_start = start_line
+        for offset, line in enumerate(pending):
+            if line == "":
+                if group:
+                    yield from _finish_block(group, group_start)
+                group = []
+                continue
+            if not group:
+                group_start = start_line + offset
+            group.append(line)
+        pending = group
+        start_line = group_start
+
+    if pending:
+        yield from _finish_block(pending, start_line)
+
+
+def _finish_block(lines, start_line):
+    # Equivalent to "\n".join(lines).strip(), without joining and re-splitting.
+    first = 0
+    last = len(lines) - 1
+    while first <= last and not lines[first].strip():
+        first += 1
+    while last >= first and not lines[last].strip():
+        last -= 1
+    if first > last:
+        return
 
-    if all(line.startswith(">") for line in lines):
-        return BlockType.QUOTE
+    block_lines = lines[first:last + 1]
+    block_lines[0] = block_lines[0].lstrip()
+    block_lines[-1] = block_lines[-1].rstrip()
+    yield Block(classify_block_lines(block_lines), block_lines, start_line + first, start_line + last)
 
-    if all(line.startswith("- ") for line in lines):
-        return BlockType.UNORDERED_LIST
 
-    is_ordered_list = True
+def classify_block_lines(lines):
+    is_quote = is_unordered_list = is_ordered_list = True
     for i, line in enumerate(lines):
-        if not line.startswith(f"{i + 1}. "):
+        if is_quote and not line.startswith(">"):
+            is_quote = False
+        if is_unordered_list and not line.startswith("- "):
+            is_unordered_list = False
+        if is_ordered_list and not line.startswith(f"{i + 1}. "):
             is_ordered_list = False
+        if not (is_quote or is_unordered_list or is_ordered_list):
             break
+
+    if is_quote:
+        return BlockType.QUOTE
+
+    if is_unordered_list:
+        return BlockType.UNORDERED_LIST
+
     if is_ordered_list:
         return BlockType.ORDERED_LIST
 
-    if re.match(r"#{1,6} ", block) and len(lines) == 1:
+    if len(lines) == 1 and HEADING_REGEX.match(lines[0]):
         return BlockType.HEADING
 
-    if block.startswith("```") and block.endswith("```"):
+    if lines[0].startswith("```") and lines[-1].endswith("```"):
         return BlockType.CODE
 
     return BlockType.PARAGRAPH
 
 
-def copy_contents_recursive(source_dir_path, dest_dir_path):
+def markdown_to_blocks(markdown):
+    return ["\n".join(block.lines) for block in scan_blocks(markdown)]
+
+
+def block_to_block_type(block):
+    return classify_block_lines(block.split('\n'))
+
+
+class SyncStats:
+    def __init__(self):
+        self.copied = 0
+        self.skipped = 0
+        self.removed = 0
+
+    def __repr__(self):
+        return f"SyncStats(copied={self.copied}, skipped={self.skipped}, removed={self.removed})"
+
+
+def _is_up_to_date(source_stat, source_item_path, dest_item_path, checksum):
+    # Copies keep the source's mtime, so an unchanged file has the same size
+    # and mtime as its source. With checksum the contents are compared
+    # instead, which also recognises files whose mtimes were reset.
+    try:
+        dest_stat = os.stat(dest_item_path)
+    except FileNotFoundError:
+        return False
+
+    if dest_stat.st_size != source_stat.st_size:
+        return False
+
+    if not checksum:
+        return dest_stat.st_mtime_ns == source_stat.st_mtime_ns
+
+    if hash_file(source_item_path) != hash_file(dest_item_path):
+        return False
+    if dest_stat.st_mtime_ns != source_stat.st_mtime_ns:
+        shutil.copystat(source_item_path, dest_item_path)
+    return True
+
+
+def copy_contents_recursive(source_dir_path, dest_dir_path, manifest=None, checksum=False, stats=None,
+                            asset_map=None, substitutes=None, stylesheets=None):
+    """
+    Syncs source_dir_path into dest_dir_path, copying only files that are
+    missing or changed. With a build manifest, files copied by an earlier
+    build whose source has since been removed are deleted as well. Returns
+    a SyncStats with the number of files copied, skipped and removed.
+
+    With an AssetMap, files that pages link to (stylesheets, scripts, images
+    and fonts) are copied under content-hashed names that are added to the
+    map, and a _headers file marks them as immutable. Stylesheets are copied
+    last, with their url()s pointing at the renamed files.
+
+    substitutes maps source files to files to copy in their place, such as
+    the optimized versions of images.
+    """
+    top_level = stats is None
+    if top_level:
+        stats = SyncStats()
+        stylesheets = []
+
     print(f"Copying contents from {source_dir_path} to {dest_dir_path}")
 
     try:
         dir_contents = os.listdir(source_dir_path)
     except FileNotFoundError:
         print(f"Error: Source directory not found at {source_dir_path}")
-        return
+        return stats
 
     if not os.path.exists(dest_dir_path):
         os.mkdir(dest_dir_path)
 
-    for item_name in dir_contents:
+    for item_name in sorted(dir_contents):
         source_item_path = os.path.join(source_dir_path, item_name)
         dest_item_path = os.path.join(dest_dir_path, item_name)
 
         if os.path.isfile(source_item_path):
-            print(f"  Copying file: {source_item_path} to {dest_item_path}")
-            shutil.copy(source_item_path, dest_item_path)
+            if substitutes is not None:
+                source_item_path = substitutes.get(source_item_path, source_item_path)
+            source_stat = os.stat(source_item_path)
+            stat_key = f"{source_stat.st_size}:{source_stat.st_mtime_ns}"
+            if asset_map is not None and is_stylesheet(item_name):
+                stylesheets.append((source_item_path, dest_item_path, stat_key))
+                continue
+            if asset_map is not None and is_fingerprinted(item_name):
+                dest_item_path = asset_map.fingerprint(source_item_path, dest_item_path, stat_key, manifest)
+            if _is_up_to_date(source_stat, source_item_path, dest_item_path, checksum):
+                stats.skipped += 1
+            else:
+                print(f"  Copying file: {source_item_path} to {dest_item_path}")
+                shutil.copy2(source_item_path, dest_item_path)
+                stats.copied += 1
+
+            if manifest is not None:
+                manifest.record(dest_item_path, stat_key, kind="assets")
 
         elif os.path.isdir(source_item_path):
-            print(f"  Creating directory: {dest_item_path}")
-            copy_contents_recursive(source_item_path, dest_item_path)
+            if not os.path.exists(dest_item_path):
+                print(f"  Creating directory: {dest_item_path}")
+            copy_contents_recursive(source_item_path, dest_item_path, manifest, checksum, stats, asset_map,
+                                    substitutes, stylesheets)
+
+    if top_level:
+        for source_item_path, dest_item_path, stat_key in stylesheets:
+            # Rewritten whenever the stylesheet or the names it may refer to change.
+            inputs_key = hash_bytes(stat_key, asset_map.digest())
+            dest_item_path, written = asset_map.copy_stylesheet(source_item_path, dest_item_path, inputs_key,
+                                                                manifest)
+            if written:
+                print(f"  Copying file: {source_item_path} to {dest_item_path}")
+                stats.copied += 1
+            else:
+                stats.skipped += 1
+            if manifest is not None:
+                manifest.record(dest_item_path, inputs_key, kind="assets")
+
+        if asset_map is not None:
+            asset_map.write_headers(manifest)
+        if manifest is not None:
+            if asset_map is not None:
+                manifest.asset_map = dict(asset_map)
+            stats.removed = manifest.remove_stale_outputs(kind="assets")
+        print(f"Static files: {stats.copied} copied, {stats.skipped} unchanged, {stats.removed} removed")
+
+    return stats
 
 
 def extract_title(markdown):
-    lines = markdown.split('\n')
+    # markdown may be a string or an iterable of lines; iteration stops at
+    # the first H1, so a file is only read as far as its title.
+    lines = markdown.split('\n') if isinstance(markdown, str) else markdown
     for line in lines:
         if line.startswith("# "):
             return line[2:].strip()
 
     raise ValueError("Markdown must contain an H1 header (line starting with # )")
-
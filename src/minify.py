@@ -0,0 +1,175 @@
+import re
+
+
+# Elements whose content is written as it is: whitespace is significant in
+# <pre> (code blocks render as <pre><code>), in inline <code> and <textarea>,
+# and script and style content is not HTML at all.
+PRESERVE_TAGS = ("pre", "code", "textarea", "script", "style")
+
+# Elements that are never part of a line of text. Whitespace next to their
+# tags is not rendered, so it is dropped. Whitespace next to any other tag
+# (<b>, <a>, <img>, ...) may separate two words, so it is kept as one space.
+BLOCK_TAGS = frozenset((
+    "html", "head", "body", "title", "meta", "link", "base", "style", "script", "noscript",
+    "article", "section", "nav", "header", "footer", "main", "aside", "div", "p", "hr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "dl", "dt", "dd", "blockquote", "pre",
+    "figure", "figcaption", "table", "thead", "tbody", "tfoot", "tr", "th", "td", "form", "fieldset",
+    "details", "summary", "address",
+))
+
+# Text is processed once this much of it has been written, and at close().
+BUFFER_SIZE = 64 * 1024
+
+# HTML whitespace; a non-breaking space is content.
+WHITESPACE_REGEX = re.compile(r"[ \t\n\r\f]+")
+TAG_REGEX = re.compile(r"<(/?)([A-Za-z][A-Za-z0-9-]*)(?:[^>\"']|\"[^\"]*\"|'[^']*')*>")
+# The start of a tag that continues in text not written yet.
+PARTIAL_TAG_REGEX = re.compile(r"<(?:/|/?[A-Za-z][A-Za-z0-9-]*(?:[^>\"']|\"[^\"]*\"|'[^']*')*(?:\"[^\"]*|'[^']*)?)?\Z")
+PRESERVE_END_REGEXES = {tag: re.compile(rf"</{tag}[ \t\n\r\f/>]", re.IGNORECASE) for tag in PRESERVE_TAGS}
+
+
+class HTMLMinifier:
+    """
+    Minifies HTML as it is rendered: pass its write method to render_to in
+    place of the file's, then call close(). Runs of whitespace in text are
+    collapsed to one space, whitespace next to block-level tags is dropped and
+    comments are removed. Tags and the content of PRESERVE_TAGS are written
+    unchanged.
+    """
+
+    def __init__(self, write):
+        self._write = write
+        self._chunks = []
+        self._size = 0
+        self._pending = ""
+        self._preserve = None
+        # Whitespace read but not written yet, and whether the last thing
+        # written ends a line of text (a block tag, or the document start).
+        self._space = False
+        self._after_block = True
+
+    def write(self, text):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= BUFFER_SIZE:
+            self._process(final=False)
+
+    def close(self):
+        self._process(final=True)
+
+    def _process(self, final):
+        buffer = self._pending + "".join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        out = []
+        pos = 0
+        end = len(buffer)
+
+        while pos < end:
+            if self._preserve is not None:
+                match = self._preserve.search(buffer, pos)
+                if match is None:
+                    # Keep enough to recognise a closing tag split across writes.
+                    keep = 0 if final else len(self._preserve.pattern)
+                    stop = max(pos, end - keep)
+                    out.append(buffer[pos:stop])
+                    pos = stop
+                    break
+                out.append(buffer[pos:match.start()])
+                pos = match.start()
+                self._preserve = None
+
+            lt = buffer.find("<", pos)
+            if lt == -1:
+                self._text(buffer[pos:], out)
+                pos = end
+                break
+            if lt > pos:
+                self._text(buffer[pos:lt], out)
+                pos = lt
+
+            if buffer.startswith("<!", pos):
+                comment = buffer.startswith("<!--", pos)
+                close = buffer.find("-->" if comment else ">", pos + 2)
+                if close == -1:
+                    if not final:
+                        break
+                    close = end
+                if comment:
+                    pos = close + 3
+                else:
+                    close += 1
+                    self._space = False
+                    self._after_block = True
+                    out.append(buffer[pos:close])
+                    pos = close
+                continue
+
+            match = TAG_REGEX.match(buffer, pos)
+            if match is None:
+                if not final and PARTIAL_TAG_REGEX.match(buffer, pos):
+                    break
+                # A "<" that does not start a tag is text.
+                self._text("<", out)
+                pos += 1
+                continue
+
+            name = match.group(2).lower()
+            block = name in BLOCK_TAGS
+            if self._space and not self._after_block and not block:
+                out.append(" ")
+            self._space = False
+            self._after_block = block
+            out.append(match.group())
+            pos = match.end()
+            if not match.group(1) and name in PRESERVE_END_REGEXES and not match.group().endswith("/>"):
+                self._preserve = PRESERVE_END_REGEXES[name]
+                self._after_block = False
+
+        self._pending = buffer[pos:]
+        if out:
+            self._write("".join(out))
+
+    def _text(self, text, out):
+        parts = WHITESPACE_REGEX.split(text)
+        for i, part in enumerate(parts):
+            if i:
+                self._space = True
+            if part:
+                if self._space and not self._after_block:
+                    out.append(" ")
+                self._space = False
+                self._after_block = False
+                out.append(part)
+
+
+def minify_html(html):
+    chunks = []
+    minifier = HTMLMinifier(chunks.append)
+    minifier.write(html)
+    minifier.close()
+    return "".join(chunks)
+
+
+# Strings are matched first so nothing inside them is touched. Whitespace is
+# only removed next to punctuation that cannot need it: never around "+" or
+# "-" (calc() needs those spaces) or before ":" ("a :hover" is a selector).
+CSS_TOKEN_REGEX = re.compile(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|(/\*.*?\*/)|\s*;?\s*(\})\s*|\s*([{;,>])\s*|(:)\s+|\s+""",
+                             re.DOTALL)
+
+
+def _css_token(match):
+    string, comment, close, punctuation, colon = match.groups()
+    if string is not None:
+        return string
+    if comment is not None:
+        return ""
+    return close or punctuation or colon or " "
+
+
+def minify_css(css):
+    """
+    Removes comments and the whitespace a stylesheet does not need, and the
+    last semicolon of each block.
+    """
+    return CSS_TOKEN_REGEX.sub(_css_token, css).strip()
@@ -0,0 +1,64 @@
+import os
+
+
+COMPARE_CHUNK_SIZE = 64 * 1024
+
+
+class WriteStats:
+    """
+    Counts the outputs a build wrote and the ones it left untouched because
+    the file on disk already had the same bytes.
+    """
+
+    def __init__(self):
+        self.written = 0
+        self.unchanged = 0
+
+    def count(self, written):
+        if written:
+            self.written += 1
+        else:
+            self.unchanged += 1
+
+    def add(self, other):
+        self.written += other.written
+        self.unchanged += other.unchanged
+
+
+def files_identical(path_a, path_b, open_b=open):
+    # open_b opens path_b, for files reached through something slower than
+    # the local disk.
+    try:
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+    except OSError:
+        return False
+
+    with open(path_a, 'rb') as a, open_b(path_b, 'rb') as b:
+        while True:
+            chunk = a.read(COMPARE_CHUNK_SIZE)
+            if chunk != b.read(COMPARE_CHUNK_SIZE):
+                return False
+            if not chunk:
+                return True
+
+
+def replace_if_changed(tmp_path, dest_path):
+    """
+    Moves a freshly written tmp_path into place unless dest_path already holds
+    the same bytes, in which case tmp_path is removed and dest_path keeps its
+    mtime, so rsync, CDN syncs and git don't see it as changed. Returns
+    whether dest_path was written.
+    """
+    if files_identical(tmp_path, dest_path):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, dest_path)
+    return True
+
+
+def remove_if_exists(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
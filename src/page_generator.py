@@ -1,86 +1,236 @@
+import contextlib
+import io
 import os
 import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-from markdown_converter import markdown_to_html_node
+import profiling
+from build_manifest import GENERATOR_VERSION, hash_bytes, hash_file
+from markdown_converter import MarkdownStream
 from markdown_utils import extract_title
+from minify import HTMLMinifier
+from output_writer import WriteStats, remove_if_exists, replace_if_changed
+from template import load_template
 
 
-def generate_page(from_path, template_path, dest_path, basepath):
+def generate_page(from_path, template_path, dest_path, basepath, block_cache=None, write_stats=None, asset_map=None,
+                  minify=False, stylesheets=None, images=None):
     print(f"Generating page from {from_path} to {dest_path} using {template_path}")
 
     if not os.path.exists(from_path):
         print(f"Error: Markdown file not found at {from_path}")
-        return
+        return False
 
     if not os.path.exists(template_path):
         print(f"Error: Template file not found at {template_path}")
-        return
-
-    try:
-        with open(from_path, 'r') as f:
-            markdown_content = f.read()
-    except Exception as e:
-        print(f"Error reading markdown file {from_path}: {e}")
-        return
+        return False
 
     try:
-        with open(template_path, 'r') as f:
-            template_content = f.read()
+        template = load_template(template_path, basepath, asset_map, stylesheets)
     except Exception as e:
         print(f"Error reading template file {template_path}: {e}")
-        return
-
-    try:
-        html_content = markdown_to_html_node(markdown_content).to_html()
-    except ValueError as e:
-        print(f"Error converting markdown to HTML for {from_path}: {e}")
-        return
-
-    try:
-        page_title = extract_title(markdown_content)
-    except ValueError as e:
-        print(f"Error extracting title from {from_path}: {e}")
-        return
-
-    final_html = template_content.replace("{{ Title }}", page_title).replace("{{ Content }}", html_content)
-
-    final_html = final_html.replace('href="/', f'href="{basepath}')
-    final_html = final_html.replace('src="/', f'src="{basepath}')
-
-
-    dest_dir = os.path.dirname(dest_path)
-    if dest_dir:
-        os.makedirs(dest_dir, exist_ok=True)
+        return False
 
     try:
-        with open(dest_path, 'w') as f:
-            f.write(final_html)
+        markdown_file = open(from_path, 'r')
     except Exception as e:
-        print(f"Error writing final HTML file to {dest_path}: {e}")
-        return
-
+        print(f"Error reading markdown file {from_path}: {e}")
+        return False
+
+    # The markdown is never read into memory as a whole: the title comes from
+    # a first pass that stops at the H1, then the content is converted and
+    # written block by block as the file is read a second time.
+    with markdown_file:
+        try:
+            page_title = extract_title(profiling.timed_lines(markdown_file))
+        except UnicodeDecodeError as e:
+            print(f"Error reading markdown file {from_path}: {e}")
+            return False
+        except ValueError as e:
+            print(f"Error extracting title from {from_path}: {e}")
+            return False
+        except Exception as e:
+            print(f"Error reading markdown file {from_path}: {e}")
+            return False
+        markdown_file.seek(0)
+
+        # The page is streamed into a temporary file and only moved into place
+        # once it rendered completely, so a failure never leaves a partial page.
+        # An identical page already in place is kept as it is. With minify, the
+        # HTML is minified on its way to the file.
+        tmp_path = dest_path + ".tmp"
+        try:
+            dest_dir = os.path.dirname(dest_path)
+            if dest_dir:
+                os.makedirs(dest_dir, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                write = profiling.timed_write(f.write)
+                if minify:
+                    minifier = HTMLMinifier(write)
+                    write = minifier.write
+                content = MarkdownStream(profiling.timed_lines(markdown_file), block_cache, asset_map, images)
+                template.render_to(write, {"Title": page_title, "Content": content})
+                if minify:
+                    minifier.close()
+            written = replace_if_changed(tmp_path, dest_path)
+        except UnicodeDecodeError as e:
+            remove_if_exists(tmp_path)
+            print(f"Error reading markdown file {from_path}: {e}")
+            return False
+        except ValueError as e:
+            remove_if_exists(tmp_path)
+            print(f"Error converting markdown to HTML for {from_path}: {e}")
+            return False
+        except Exception as e:
+            remove_if_exists(tmp_path)
+            print(f"Error writing final HTML file to {dest_path}: {e}")
+            return False
+
+    if write_stats is not None:
+        write_stats.count(written)
+    return True
+
+
+def page_inputs_hash(from_path, template_hash, basepath):
+    # The markdown is hashed in chunks, so checking a page never reads it
+    # into memory as a whole.
+    return markdown_inputs_hash(hash_file(from_path), template_hash, basepath)
+
+
+def markdown_inputs_hash(markdown_hash, template_hash, basepath):
+    return hash_bytes(GENERATOR_VERSION, template_hash, basepath, markdown_hash)
+
+
+def template_inputs_hash(manifest, template_path, page_options):
+    # Everything a page depends on besides its markdown and the basepath: the
+    # template, and the generate_page options that change its output (the
+    # fingerprinted names of the static files, minification, the inlined
+    # stylesheets and the image sizes).
+    template_hash = manifest.hash_input(template_path)
+    for name in ("asset_map", "stylesheets", "images"):
+        value = page_options.get(name)
+        if value is not None:
+            template_hash = hash_bytes(template_hash, name, value.digest())
+    if page_options.get("minify"):
+        template_hash = hash_bytes(template_hash, "minify")
+    return template_hash
+
+
+def collect_pages(current_content_path, current_dest_path, pages=None):
+    """
+    Walks the content tree and returns (markdown path, html path) pairs in a
+    stable, sorted order without generating anything.
+    """
+    if pages is None:
+        pages = []
 
-def generate_pages_recursive(current_content_path, template_path, current_dest_path, basepath):
     print(f"Processing directory: {current_content_path}")
 
     if not os.path.exists(current_content_path):
         print(f"Error: Content directory not found at {current_content_path}")
-        return
-
-    dir_contents = os.listdir(current_content_path)
+        return pages
 
-    os.makedirs(current_dest_path, exist_ok=True)
-
-    for item_name in dir_contents:
+    for item_name in sorted(os.listdir(current_content_path)):
         src_item_path = os.path.join(current_content_path, item_name)
         dest_item_path_base = os.path.join(current_dest_path, item_name)
 
         if os.path.isfile(src_item_path):
             if item_name.endswith(".md"):
-                dest_html_path = dest_item_path_base[:-3] + ".html"
-                generate_page(src_item_path, template_path, dest_html_path, basepath)
+                pages.append((src_item_path, dest_item_path_base[:-3] + ".html"))
 
         elif os.path.isdir(src_item_path):
-            generate_pages_recursive(src_item_path, template_path, dest_item_path_base, basepath)
+            collect_pages(src_item_path, dest_item_path_base, pages)
+
+    return pages
+
+
+def _generate_page_logged(from_path, template_path, dest_path, basepath, write_stats, page_options):
+    # Serial and parallel builds both go through here, so a page that fails
+    # in a way generate_page does not handle is logged and skipped the same
+    # way by either, instead of ending the build.
+    try:
+        with profiling.page(from_path):
+            return generate_page(from_path, template_path, dest_path, basepath, write_stats=write_stats,
+                                 **page_options)
+    except Exception as e:
+        print(f"Error generating page from {from_path}: {e!r}")
+        return False
+
+
+def _generate_page_job(from_path, template_path, dest_path, basepath, page_options, profile=False):
+    # Runs in a worker process. Output is captured so the parent can print
+    # each page's log in collection order, whatever order pages finish in.
+    # When the build is profiled, the page's timings are sent back as well.
+    if profile:
+        profiling.enable()
+    log = io.StringIO()
+    write_stats = WriteStats()
+    with contextlib.redirect_stdout(log):
+        ok = _generate_page_logged(from_path, template_path, dest_path, basepath, write_stats, page_options)
+    profile_data = profiling.disable().export() if profile else None
+    return ok, log.getvalue(), profile_data, write_stats
+
+
+def _run_page_jobs(pages, template_path, basepath, jobs, page_options, write_stats):
+    """
+    Generates the given pages and yields a success flag for each one, in the
+    order the pages were given. With more than one job the pages are rendered
+    across a process pool, largest markdown files first. page_options are
+    passed on to generate_page.
+    """
+    if jobs <= 1 or len(pages) <= 1:
+        for from_path, dest_path in pages:
+            yield _generate_page_logged(from_path, template_path, dest_path, basepath, write_stats, page_options)
+        return
 
+    profiler = profiling.active()
+    by_size = sorted(range(len(pages)), key=lambda i: os.path.getsize(pages[i][0]), reverse=True)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [None] * len(pages)
+        for i in by_size:
+            from_path, dest_path = pages[i]
+            futures[i] = executor.submit(_generate_page_job, from_path, template_path, dest_path, basepath, page_options,
+                                         profiler is not None)
+
+        for future in futures:
+            ok, log, profile_data, job_write_stats = future.result()
+            sys.stdout.write(log)
+            if profile_data is not None:
+                profiler.merge(profile_data)
+            write_stats.add(job_write_stats)
+            yield ok
+
+
+def generate_pages_recursive(current_content_path, template_path, current_dest_path, basepath, manifest=None, jobs=1,
+                             pages=None, **page_options):
+    # pages, if given, is what collect_pages returned for the same paths.
+    if pages is None:
+        with profiling.span("directory walk"):
+            pages = collect_pages(current_content_path, current_dest_path)
+
+    pending = []
+    inputs_hashes = []
+    if manifest is not None:
+        template_hash = template_inputs_hash(manifest, template_path, page_options)
+    for from_path, dest_path in pages:
+        if manifest is not None:
+            inputs_hash = page_inputs_hash(from_path, template_hash, basepath)
+            if manifest.is_fresh(dest_path, inputs_hash):
+                print(f"Skipping unchanged page: {from_path}")
+                continue
+            inputs_hashes.append(inputs_hash)
+        pending.append((from_path, dest_path))
+
+    write_stats = WriteStats()
+    for i, ok in enumerate(_run_page_jobs(pending, template_path, basepath, jobs, page_options, write_stats)):
+        if ok and manifest is not None:
+            manifest.record(pending[i][1], inputs_hashes[i])
+
+    print_write_stats(write_stats)
+    return write_stats
+
+
+def print_write_stats(write_stats):
+    print(f"Pages: {write_stats.written} written, {write_stats.unchanged} identical to the existing file (write avoided)")
@@ -0,0 +1,170 @@
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from build_manifest import hash_bytes, hash_file
+
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "png")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Ancillary chunks that change how the image looks are kept: transparency
+# and colour space. Text, timestamps, EXIF, physical size and the like are
+# dropped.
+KEPT_ANCILLARY_CHUNKS = frozenset((b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"cICP", b"sBIT"))
+# An animated PNG compresses its frames in fdAT chunks as well; those are
+# left alone.
+ANIMATION_CHUNK = b"acTL"
+
+COMPRESSION_LEVEL = 9
+# Part of every cache key, so changing how PNGs are optimized invalidates
+# the cached results.
+OPTIMIZER_VERSION = f"zlib-{COMPRESSION_LEVEL}-strip-1"
+
+
+def png_chunks(data):
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        end = pos + 12 + length
+        if end > len(data):
+            raise ValueError("truncated chunk")
+        yield chunk_type, data[pos + 8:end - 4]
+        pos = end
+        if chunk_type == b"IEND":
+            return
+    raise ValueError("missing IEND")
+
+
+def png_chunk(chunk_type, payload):
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", zlib.crc32(chunk_type + payload))
+
+
+def _deflate(raw, strategy):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 15, 9, strategy)
+    return compressor.compress(raw) + compressor.flush()
+
+
+def optimize_png(data):
+    """
+    Returns a smaller, pixel-identical version of the PNG in data, or None
+    when it cannot be made smaller or is not a PNG this can rewrite. The
+    image data is inflated and deflated again at the highest zlib level
+    (keeping the best of the default and filtered strategies, and the
+    scanline filters the encoder chose), and ancillary chunks that do not
+    affect rendering are removed.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return None
+    try:
+        chunks = list(png_chunks(data))
+    except (ValueError, struct.error):
+        return None
+    if any(chunk_type == ANIMATION_CHUNK for chunk_type, _ in chunks):
+        return None
+
+    try:
+        raw = zlib.decompress(b"".join(payload for chunk_type, payload in chunks if chunk_type == b"IDAT"))
+    except zlib.error:
+        return None
+    idat = min((_deflate(raw, strategy) for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)), key=len)
+
+    out = [PNG_SIGNATURE]
+    wrote_idat = False
+    for chunk_type, payload in chunks:
+        if chunk_type == b"IDAT":
+            # All the image data goes into one chunk, where the first was.
+            if not wrote_idat:
+                out.append(png_chunk(b"IDAT", idat))
+                wrote_idat = True
+        elif chunk_type[0:1].isupper() or chunk_type in KEPT_ANCILLARY_CHUNKS:
+            out.append(png_chunk(chunk_type, payload))
+    optimized = b"".join(out)
+    if len(optimized) >= len(data):
+        return None
+    return optimized
+
+
+def _optimize_job(source_path, result_path):
+    # Runs in a worker process and writes the result straight into the cache,
+    # so image data never travels back to the parent. An image that cannot be
+    # made smaller gets an empty result, so it is not tried again.
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    optimized = optimize_png(data)
+    tmp_path = result_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        if optimized is not None:
+            f.write(optimized)
+    os.replace(tmp_path, result_path)
+
+
+class OptimizeStats:
+    def __init__(self):
+        self.optimized = 0
+        self.cached = 0
+        self.unchanged = 0
+        self.bytes_saved = 0
+
+
+def optimize_pngs(source_dir_path, cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    """
+    Optimizes every PNG under source_dir_path with optimize_png, across a
+    process pool. Results are cached in cache_dir by the hash of the source
+    file, so each image is only optimized once. Returns a dict from each
+    source path that has a smaller version to the path of that version in
+    the cache, for copy_contents_recursive to copy in the source's place,
+    and an OptimizeStats.
+    """
+    stats = OptimizeStats()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    images = []
+    for dir_path, dir_names, file_names in os.walk(source_dir_path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(".png"):
+                source_path = os.path.join(dir_path, file_name)
+                key = hash_bytes(hash_file(source_path), OPTIMIZER_VERSION)
+                images.append((source_path, os.path.join(cache_dir, key + ".png")))
+
+    jobs = [(source_path, result_path) for source_path, result_path in images if not os.path.exists(result_path)]
+    failed = set()
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), workers or os.cpu_count() or 1)) as executor:
+            futures = [executor.submit(_optimize_job, *job) for job in jobs]
+            for (source_path, result_path), future in zip(jobs, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error optimizing {source_path}, copying it as it is: {e}")
+                    failed.add(result_path)
+
+    substitutes = {}
+    fresh = {result_path for _, result_path in jobs}
+    for source_path, result_path in images:
+        if result_path in failed:
+            stats.unchanged += 1
+            continue
+        optimized_size = os.path.getsize(result_path)
+        if optimized_size == 0:
+            stats.unchanged += 1
+            continue
+        substitutes[source_path] = result_path
+        stats.bytes_saved += os.path.getsize(source_path) - optimized_size
+        if result_path in fresh:
+            stats.optimized += 1
+        else:
+            stats.cached += 1
+
+    # Results for images that are gone or have changed are not needed again.
+    used = {os.path.basename(result_path) for _, result_path in images}
+    for name in os.listdir(cache_dir):
+        if name.endswith(".png") and name not in used:
+            os.remove(os.path.join(cache_dir, name))
+
+    print(f"PNG optimization: {stats.optimized} optimized, {stats.cached} from the cache, "
+          f"{stats.unchanged} already minimal, {stats.bytes_saved} bytes saved")
+    return substitutes, stats
@@ -0,0 +1,136 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from build_manifest import hash_bytes
+from output_writer import remove_if_exists, replace_if_changed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+
+DEFAULT_MIN_SIZE = 1024
+
+COMPRESSIBLE_EXTENSIONS = (
+    ".html", ".css", ".js", ".mjs", ".json", ".map", ".svg", ".xml", ".txt", ".ico", ".webmanifest",
+)
+
+
+def _gzip(data):
+    # mtime=0 keeps the output identical for identical input.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def _zstd(data):
+    return zstd.compress(data, level=19)
+
+
+def available_encodings():
+    """
+    Returns (file suffix, encoder name, compress function) for every encoding
+    this Python can produce. gzip is always available; brotli and zstd only
+    when their modules are installed.
+    """
+    encodings = [(".gz", "gzip-9", _gzip)]
+    if brotli is not None:
+        encodings.append((".br", "brotli-11", _brotli))
+    if zstd is not None:
+        encodings.append((".zst", "zstd-19", _zstd))
+    return encodings
+
+
+class CompressStats:
+    def __init__(self):
+        self.written = 0
+        self.reused = 0
+        self.skipped = 0
+        self.source_bytes = 0
+        self.compressed_bytes = 0
+
+
+def _compress_file(source_path, variant_path, compress):
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    compressed = compress(data)
+    if len(compressed) >= len(data):
+        return None
+    tmp_path = variant_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(compressed)
+    replace_if_changed(tmp_path, variant_path)
+    return len(data), len(compressed)
+
+
+def precompress_outputs(manifest, min_size=DEFAULT_MIN_SIZE, workers=None, encodings=None):
+    """
+    Writes compressed siblings (index.html.gz, ...) of the compressible pages,
+    assets and search index files in the build manifest that are at least min_size bytes, so a
+    static server can send them as they are. Files are compressed on a thread
+    pool; zlib and the brotli and zstd encoders release the GIL.
+
+    Variants are recorded in the manifest under "compressed", keyed by the
+    content hash of their source, so a variant whose source is unchanged is
+    reused and one whose source is gone is removed with the other stale
+    outputs. A variant that would not be smaller than its source is skipped,
+    and recorded as skipped so it is not compressed again until its source
+    changes.
+    """
+    if encodings is None:
+        encodings = available_encodings()
+    stats = CompressStats()
+
+    jobs = []
+    for kind in ("pages", "assets", "search"):
+        for key, source_hash in sorted(manifest.outputs[kind].items()):
+            if not key.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            source_path = os.path.join(manifest.dest_dir_path, *key.split("/"))
+            if os.path.getsize(source_path) < min_size:
+                continue
+            for suffix, encoder, compress in encodings:
+                variant_path = source_path + suffix
+                inputs_hash = hash_bytes(source_hash, encoder)
+                if manifest.is_fresh(variant_path, inputs_hash, kind="compressed"):
+                    stats.reused += 1
+                elif manifest.is_skipped(variant_path, inputs_hash, kind="compressed"):
+                    stats.skipped += 1
+                else:
+                    jobs.append((source_path, variant_path, compress, inputs_hash))
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = [executor.submit(_compress_file, source_path, variant_path, compress)
+                   for source_path, variant_path, compress, _ in jobs]
+        for (source_path, variant_path, _, inputs_hash), future in zip(jobs, futures):
+            sizes = future.result()
+            if sizes is None:
+                # Not tried again until the source or encoder changes. A
+                # variant of an earlier version of the source goes.
+                remove_if_exists(variant_path)
+                manifest.record_skipped(variant_path, inputs_hash, kind="compressed")
+                stats.skipped += 1
+                continue
+            manifest.record(variant_path, inputs_hash, kind="compressed")
+            stats.written += 1
+            stats.source_bytes += sizes[0]
+            stats.compressed_bytes += sizes[1]
+
+    names = ", ".join(suffix for suffix, _, _ in encodings)
+    message = f"Precompressed ({names}): {stats.written} written, {stats.reused} reused, {stats.skipped} not smaller"
+    if stats.source_bytes:
+        message += f", {stats.source_bytes} -> {stats.compressed_bytes} bytes"
+    print(message)
+    return stats
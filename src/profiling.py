@@ -0,0 +1,268 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+import htmlnode
+import markdown_converter
+import minify
+import template
+
+
+STAGES = (
+    "directory walk",
+    "read",
+    "block split",
+    "inline parse",
+    "render",
+    "templating",
+    "basepath rewrite",
+    "minify",
+    "write",
+    "static copy",
+)
+
+DEFAULT_PROFILE_PATH = "build-profile.json"
+
+# The profiler of the running build, or None when profiling is off. The
+# per-block hooks are only installed by enable(), so a build that is not
+# profiled runs the plain functions; only per-page and per-build call sites
+# check this.
+_profiler = None
+_patches = []
+_NO_SPAN = nullcontext()
+
+
+class Profiler:
+    """
+    Collects the time a build spends in each stage. Stage time is exclusive:
+    while a nested stage runs (inline parsing inside rendering, say) the outer
+    one is paused, so the stage totals add up to the time that was measured.
+
+    Spans are the coarse steps (the build, the directory walk, the static
+    copy, each page) and are also kept as trace events.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter_ns()
+        self.totals = defaultdict(int)
+        self.events = []
+        self.pages = []
+        self._stack = []
+        self._mark = 0
+        self._page_stages = None
+
+    def enter(self, stage):
+        now = time.perf_counter_ns()
+        if self._stack:
+            self._charge(self._stack[-1], now - self._mark)
+        self._stack.append(stage)
+        self._mark = now
+
+    def exit(self):
+        now = time.perf_counter_ns()
+        self._charge(self._stack.pop(), now - self._mark)
+        self._mark = now
+
+    def _charge(self, stage, elapsed):
+        self.totals[stage] += elapsed
+        if self._page_stages is not None:
+            self._page_stages[stage] += elapsed
+
+    def export(self):
+        return {"totals": dict(self.totals), "events": self.events, "pages": self.pages}
+
+    def merge(self, data):
+        # Adds what a worker process measured. perf_counter is the system-wide
+        # monotonic clock, so worker timestamps line up with this process's.
+        for stage, elapsed in data["totals"].items():
+            self.totals[stage] += elapsed
+        self.events.extend(data["events"])
+        self.pages.extend(data["pages"])
+
+    def slowest_pages(self, count=10):
+        return sorted(self.pages, key=lambda page: page[1], reverse=True)[:count]
+
+    def write_trace(self, path):
+        """
+        Writes the spans in the Trace Event Format, which chrome://tracing and
+        Perfetto can load. Times are in microseconds from the build's start.
+        """
+        events = []
+        for event in self.events:
+            event = dict(event)
+            event["ts"] = (event["ts"] - self.origin) / 1000
+            event["dur"] = event["dur"] / 1000
+            events.append(event)
+        data = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"stage_totals_ms": {stage: elapsed / 1e6 for stage, elapsed in self._sorted_totals()}},
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1)
+
+    def _sorted_totals(self):
+        return sorted(self.totals.items(), key=lambda item: item[1], reverse=True)
+
+    def summary(self, count=10):
+        total = sum(self.totals.values()) or 1
+        lines = ["Time per stage (summed over all workers):"]
+        for stage, elapsed in self._sorted_totals():
+            lines.append(f"  {stage:<18} {elapsed / 1e6:10.1f} ms {100 * elapsed / total:6.1f}%")
+
+        if self.pages:
+            lines.append("Slowest pages:")
+            for path, elapsed, stages in self.slowest_pages(count):
+                top = sorted(stages.items(), key=lambda item: item[1], reverse=True)[:3]
+                breakdown = ", ".join(f"{stage} {ns / 1e6:.1f} ms" for stage, ns in top)
+                lines.append(f"  {elapsed / 1e6:8.1f} ms  {path} ({breakdown})")
+        return "\n".join(lines)
+
+
+class _Span:
+    def __init__(self, profiler, name, stage, args):
+        self.profiler = profiler
+        self.name = name
+        self.stage = stage
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        self.profiler.enter(self.stage)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.exit()
+        self.profiler.events.append({
+            "name": self.name,
+            "cat": self.stage,
+            "ph": "X",
+            "ts": self.start,
+            "dur": time.perf_counter_ns() - self.start,
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": self.args,
+        })
+        return False
+
+
+class _PageSpan(_Span):
+    def __enter__(self):
+        self.profiler._page_stages = defaultdict(int)
+        return super().__enter__()
+
+    def __exit__(self, *exc_info):
+        super().__exit__(*exc_info)
+        stages = dict(self.profiler._page_stages)
+        self.profiler._page_stages = None
+        event = self.profiler.events[-1]
+        event["args"] = dict(event["args"], **{stage: elapsed / 1e6 for stage, elapsed in stages.items()})
+        self.profiler.pages.append((self.args["path"], event["dur"], stages))
+        return False
+
+
+def active():
+    return _profiler
+
+
+def span(name, stage=None, **args):
+    if _profiler is None:
+        return _NO_SPAN
+    return _Span(_profiler, name, stage or name, args)
+
+
+def page(path):
+    # Time inside a page that no stage claims is charged to "other".
+    if _profiler is None:
+        return _NO_SPAN
+    return _PageSpan(_profiler, "page", "other", {"path": path})
+
+
+def _timed_call(func, stage):
+    def timed(*args, **kwargs):
+        profiler = _profiler
+        profiler.enter(stage)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.exit()
+    timed.__wrapped__ = func
+    return timed
+
+
+def _timed_iter(iterable, stage):
+    iterator = iter(iterable)
+    while True:
+        profiler = _profiler
+        profiler.enter(stage)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            profiler.exit()
+        yield item
+
+
+def timed_lines(lines):
+    # For reading a markdown file: charges the time spent pulling lines from
+    # it to "read".
+    if _profiler is None:
+        return lines
+    return _timed_iter(lines, "read")
+
+
+def timed_write(write):
+    if _profiler is None:
+        return write
+    return _timed_call(write, "write")
+
+
+def _patch(owner, name, replacement):
+    _patches.append((owner, name, getattr(owner, name)))
+    setattr(owner, name, replacement)
+
+
+def _install_hooks():
+    scan_blocks = markdown_converter.scan_blocks
+    _patch(markdown_converter, "scan_blocks",
+           lambda markdown: _timed_iter(scan_blocks(markdown), "block split"))
+    _patch(markdown_converter, "text_to_textnodes",
+           _timed_call(markdown_converter.text_to_textnodes, "inline parse"))
+    _patch(markdown_converter.MarkdownStream, "render_to",
+           _timed_call(markdown_converter.MarkdownStream.render_to, "render"))
+    _patch(template.Template, "render_to",
+           _timed_call(template.Template.render_to, "templating"))
+    # The template's URLs get the basepath once, when it is compiled; every
+    # node's URL props get it as the node is rendered.
+    _patch(template, "rewrite_basepath",
+           _timed_call(template.rewrite_basepath, "basepath rewrite"))
+    _patch(htmlnode, "prefix_url",
+           _timed_call(htmlnode.prefix_url, "basepath rewrite"))
+    _patch(htmlnode, "prefix_srcset",
+           _timed_call(htmlnode.prefix_srcset, "basepath rewrite"))
+    _patch(minify.HTMLMinifier, "_process",
+           _timed_call(minify.HTMLMinifier._process, "minify"))
+
+
+def enable():
+    """
+    Starts profiling in this process and returns the new Profiler. Hooks are
+    installed around the per-block functions only while profiling is on.
+    """
+    global _profiler
+    _profiler = Profiler()
+    if not _patches:
+        _install_hooks()
+    return _profiler
+
+
+def disable():
+    global _profiler
+    while _patches:
+        owner, name, original = _patches.pop()
+        setattr(owner, name, original)
+    profiler, _profiler = _profiler, None
+    return profiler
@@ -0,0 +1,322 @@
+import operator
+import os
+import shutil
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from assets import fingerprinted_name
+from build_manifest import hash_bytes
+from markdown_utils import BlockType, extract_markdown_images, scan_blocks
+from png_optimize import PNG_SIGNATURE, png_chunk, png_chunks
+
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "variants")
+DEFAULT_WIDTHS = (480, 960)
+# The article column is at most 800px wide (see static/index.css).
+DEFAULT_SIZES = "(max-width: 800px) 100vw, 800px"
+
+# Part of every cache key, so changing how variants are made invalidates
+# the cached ones.
+VARIANT_VERSION = "png-box-2"
+
+# Samples per pixel of the 8-bit PNG colour types that can be scaled as they
+# are. Palette images (type 3) are expanded to RGB or RGBA first, and grey
+# or RGB images with a transparent colour to grey with alpha or RGBA.
+CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+# Ancillary chunks that still describe a variant's pixels.
+COLOR_CHUNKS = frozenset((b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"cICP"))
+
+
+def _add(a, b):
+    return (a + b) & 0xFF
+
+
+def _subtract(a, b):
+    return (a - b) & 0xFF
+
+
+def _unfilter(raw, width, height, bpp):
+    # Undoes the per-scanline filters. "Up" maps over whole rows; the other
+    # filters depend on the byte to their left and go byte by byte.
+    stride = width * bpp
+    rows = []
+    prior = bytes(stride)
+    pos = 0
+    for _ in range(height):
+        filter_type = raw[pos]
+        line = bytearray(raw[pos + 1:pos + 1 + stride])
+        pos += 1 + stride
+        if filter_type == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif filter_type == 2:
+            line = bytearray(map(_add, line, prior))
+        elif filter_type == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prior[i]) >> 1)) & 0xFF
+        elif filter_type == 4:
+            for i in range(stride):
+                if i >= bpp:
+                    a = line[i - bpp]
+                    c = prior[i - bpp]
+                else:
+                    a = c = 0
+                b = prior[i]
+                p = a + b - c
+                pa = abs(p - a)
+                pb = abs(p - b)
+                pc = abs(p - c)
+                if pa <= pb and pa <= pc:
+                    line[i] = (line[i] + a) & 0xFF
+                elif pb <= pc:
+                    line[i] = (line[i] + b) & 0xFF
+                else:
+                    line[i] = (line[i] + c) & 0xFF
+        elif filter_type != 0:
+            raise ValueError(f"unknown PNG filter {filter_type}")
+        rows.append(line)
+        prior = line
+    return rows
+
+
+def decode_png(data):
+    """
+    Decodes an 8-bit, non-interlaced PNG into (width, height, colour type,
+    rows of pixel bytes, colour chunks to keep). Palette images come back as
+    RGB, or RGBA when they have transparency, and grey or RGB images with a
+    transparent colour (a tRNS chunk) get an alpha channel. Returns None for
+    anything else (16-bit, interlaced, low bit depth or damaged images).
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return None
+    try:
+        chunks = list(png_chunks(data))
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", chunks[0][1])
+    except (ValueError, struct.error, IndexError):
+        return None
+    if chunks[0][0] != b"IHDR" or bit_depth != 8 or interlace != 0 or color_type not in (0, 2, 3, 4, 6):
+        return None
+
+    palette = transparency = None
+    for chunk_type, payload in chunks:
+        if chunk_type == b"PLTE":
+            palette = payload
+        elif chunk_type == b"tRNS":
+            transparency = payload
+    try:
+        raw = zlib.decompress(b"".join(payload for chunk_type, payload in chunks if chunk_type == b"IDAT"))
+        rows = _unfilter(raw, width, height, 1 if color_type == 3 else CHANNELS[color_type])
+    except (zlib.error, ValueError, IndexError):
+        return None
+
+    if color_type == 3:
+        if palette is None:
+            return None
+        colors = [palette[i:i + 3] for i in range(0, len(palette), 3)]
+        if transparency:
+            colors = [color + bytes((transparency[i] if i < len(transparency) else 255,))
+                      for i, color in enumerate(colors)]
+            color_type = 6
+        else:
+            color_type = 2
+        colors += [colors[0]] * (256 - len(colors))
+        rows = [b"".join([colors[index] for index in row]) for row in rows]
+    elif color_type in (0, 2) and transparency:
+        # The transparent colour is stored as 16-bit samples; at 8 bits only
+        # their low bytes are used.
+        channels = CHANNELS[color_type]
+        key = bytes(transparency[1:2 * channels:2])
+        rows = [b"".join([pixel + (b"\x00" if pixel == key else b"\xff")
+                          for pixel in (bytes(row[i:i + channels]) for i in range(0, len(row), channels))])
+                for row in rows]
+        color_type += 4
+
+    color_chunks = [(chunk_type, payload) for chunk_type, payload in chunks if chunk_type in COLOR_CHUNKS]
+    return width, height, color_type, rows, color_chunks
+
+
+def downscale(rows, width, height, channels, new_width):
+    """
+    Scales rows of pixel bytes down to new_width, keeping the aspect ratio,
+    by averaging the block of source pixels under each new pixel.
+    """
+    new_height = max(1, round(height * new_width / width))
+    x_ranges = [(x * width // new_width, max(x * width // new_width + 1, (x + 1) * width // new_width))
+                for x in range(new_width)]
+    new_rows = []
+    for y in range(new_height):
+        y0 = y * height // new_height
+        y1 = max(y0 + 1, (y + 1) * height // new_height)
+        # Rows are summed a whole row at a time, then columns a block at a time.
+        totals = list(rows[y0])
+        for row in rows[y0 + 1:y1]:
+            totals = list(map(operator.add, totals, row))
+        line = bytearray(new_width * channels)
+        out = 0
+        for x0, x1 in x_ranges:
+            count = (x1 - x0) * (y1 - y0)
+            for c in range(channels):
+                line[out] = (sum(totals[x0 * channels + c:x1 * channels:channels]) + count // 2) // count
+                out += 1
+        new_rows.append(bytes(line))
+    return new_rows, new_height
+
+
+def encode_png(rows, width, height, color_type, extra_chunks=()):
+    # Every scanline but the first uses the "Up" filter, which suits photos
+    # and is cheap to compute a row at a time.
+    filtered = []
+    prior = None
+    for row in rows:
+        if prior is None:
+            filtered.append(b"\x00" + row)
+        else:
+            filtered.append(b"\x02" + bytes(map(_subtract, row, prior)))
+        prior = row
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return b"".join([
+        PNG_SIGNATURE,
+        png_chunk(b"IHDR", ihdr),
+        *(png_chunk(chunk_type, payload) for chunk_type, payload in extra_chunks),
+        png_chunk(b"IDAT", zlib.compress(b"".join(filtered), 9)),
+        png_chunk(b"IEND", b""),
+    ])
+
+
+def _variants_job(source_path, targets):
+    # Runs in a worker process: decodes the image once and writes a variant
+    # for each (width, cache path) straight into the cache. An image that
+    # cannot be decoded gets empty results, so it is not tried again.
+    with open(source_path, 'rb') as f:
+        decoded = decode_png(f.read())
+    for width, cache_path in targets:
+        data = b""
+        if decoded is not None:
+            source_width, source_height, color_type, rows, color_chunks = decoded
+            channels = CHANNELS[color_type]
+            new_rows, new_height = downscale(rows, source_width, source_height, channels, width)
+            data = encode_png(new_rows, width, new_height, color_type, color_chunks)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+
+
+def variant_url(url, width):
+    # /images/a.png -> /images/a-480w.png
+    stem, ext = os.path.splitext(url)
+    return f"{stem}-{width}w{ext}"
+
+
+def referenced_images(content_path):
+    """
+    Returns the root-relative URLs of the images the markdown under
+    content_path shows with ![alt](src), without any query or fragment.
+    Files are scanned a block at a time, and code blocks are skipped.
+    """
+    urls = set()
+    for dir_path, dir_names, file_names in os.walk(content_path):
+        for file_name in file_names:
+            if not file_name.endswith(".md"):
+                continue
+            with open(os.path.join(dir_path, file_name), 'r') as f:
+                for block in scan_blocks(f):
+                    if block.type == BlockType.CODE:
+                        continue
+                    for _, url in extract_markdown_images("\n".join(block.lines)):
+                        url = url.split("#", 1)[0].split("?", 1)[0]
+                        if url.startswith("/") and not url.startswith("//"):
+                            urls.add(url)
+    return urls
+
+
+class VariantStats:
+    def __init__(self):
+        self.images = 0
+        self.generated = 0
+        self.cached = 0
+
+
+def generate_variants(manifest, images, content_path, widths=DEFAULT_WIDTHS, asset_map=None,
+                      cache_dir=DEFAULT_CACHE_DIR, workers=None, sizes=DEFAULT_SIZES):
+    """
+    Writes downscaled copies, at each of widths narrower than the image, of
+    the PNG images the content shows, next to the copied image in the
+    destination, and adds them to the ImageIndex images so their <img> tags
+    get a srcset. Call it after the static copy and ImageIndex.load.
+
+    Variants are made across a process pool and cached in cache_dir by the
+    hash of the source image and the width, so only new or changed images
+    are scaled. They are recorded in the build manifest as "variants".
+    """
+    stats = VariantStats()
+    os.makedirs(cache_dir, exist_ok=True)
+    images.sizes_attribute = sizes
+
+    # (image url, url as written in content, cache key, source path, [(width, cache path)])
+    planned = []
+    for content_url in sorted(referenced_images(content_path)):
+        url = content_url if asset_map is None else asset_map.resolve(content_url)
+        content_hash = manifest.outputs["assets"].get(url[1:])
+        size = images.get(url)
+        if content_hash is None or size is None or not url.lower().endswith(".png"):
+            continue
+        key = hash_bytes(content_hash, VARIANT_VERSION)
+        targets = [(width, os.path.join(cache_dir, f"{key}-{width}.png")) for width in sorted(widths) if width < size[0]]
+        if targets:
+            source_path = os.path.join(manifest.dest_dir_path, *url[1:].split("/"))
+            planned.append((url, content_url, key, source_path, targets))
+
+    jobs = []
+    for _, _, _, source_path, targets in planned:
+        missing = [target for target in targets if not os.path.exists(target[1])]
+        if missing:
+            jobs.append((source_path, missing))
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), workers or os.cpu_count() or 1)) as executor:
+            futures = [executor.submit(_variants_job, *job) for job in jobs]
+            for (source_path, _), future in zip(jobs, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error making variants of {source_path}: {e}")
+
+    fresh = {cache_path for _, missing in jobs for _, cache_path in missing}
+    for url, content_url, key, source_path, targets in planned:
+        stats.images += 1
+        for width, cache_path in targets:
+            if not os.path.exists(cache_path) or os.path.getsize(cache_path) == 0:
+                continue
+            if asset_map is None:
+                url_of_variant = variant_url(url, width)
+            else:
+                # Named after what its bytes depend on, like the other
+                # fingerprinted files, and cached as immutable with them.
+                dir_url, name = variant_url(content_url, width).rsplit("/", 1)
+                url_of_variant = f"{dir_url}/{fingerprinted_name(name, key)}"
+                asset_map.add_immutable(url_of_variant)
+            dest_path = os.path.join(manifest.dest_dir_path, *url_of_variant[1:].split("/"))
+            inputs_hash = hash_bytes(os.path.basename(cache_path))
+            if not manifest.is_fresh(dest_path, inputs_hash, kind="variants"):
+                shutil.copyfile(cache_path, dest_path)
+                manifest.record(dest_path, inputs_hash, kind="variants")
+            images.add_variant(url, url_of_variant, width)
+            if cache_path in fresh:
+                stats.generated += 1
+            else:
+                stats.cached += 1
+
+    # Variants of images that are gone or have changed are not needed again.
+    used = {os.path.basename(cache_path) for *_, targets in planned for _, cache_path in targets}
+    for name in os.listdir(cache_dir):
+        if name.endswith(".png") and name not in used:
+            os.remove(os.path.join(cache_dir, name))
+
+    if asset_map is not None:
+        asset_map.write_headers(manifest)
+
+    print(f"Responsive images: {stats.generated + stats.cached} variant(s) of {stats.images} image(s), "
+          f"{stats.generated} generated, {stats.cached} from the cache")
+    return stats
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+from collections import Counter
+
+from build_manifest import hash_bytes, hash_file
+from markdown_converter import block_to_html_node
+from markdown_utils import scan_blocks
+from output_writer import replace_if_changed
+from page_generator import collect_pages
+
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "search.json")
+INDEX_DIR = "search"
+CACHE_FORMAT = 1
+# Part of every page's cache key, so changing how text is indexed reindexes
+# every page.
+SEARCH_VERSION = "1"
+
+# Terms are sharded by their first PREFIX_LENGTH characters, so a query only
+# fetches the shards of the prefixes it starts with. Shorter terms are not
+# indexed.
+PREFIX_LENGTH = 2
+# A term in the title counts as this many occurrences in the text.
+TITLE_WEIGHT = 5
+TERM_REGEX = re.compile(r"[^\W_]+")
+
+# Loaded by pages with <script src="/search/search.js"></script>, after which
+# siteSearch("query") resolves to [{url, title, score}], best first. Every
+# word of the query must match the start of a term on the page.
+SEARCH_CLIENT = """\
+(() => {
+  const root = document.currentScript.src.replace(/[^/]*$/, "");
+  const files = {};
+  const load = (name) => {
+    if (!(name in files)) {
+      files[name] = fetch(root + encodeURIComponent(name) + ".json").then((r) => (r.ok ? r.json() : {}));
+    }
+    return files[name];
+  };
+
+  window.siteSearch = async (query) => {
+    const index = await load("pages");
+    const words = (query.toLowerCase().match(/[\\p{L}\\p{N}]+/gu) || []).filter((w) => w.length >= index.prefix);
+    let scores = null;
+    for (const word of words) {
+      const shard = await load(word.slice(0, index.prefix));
+      const found = new Map();
+      for (const [term, postings] of Object.entries(shard)) {
+        if (!term.startsWith(word)) continue;
+        for (let i = 0; i < postings.length; i += 2) {
+          found.set(postings[i], (found.get(postings[i]) || 0) + postings[i + 1]);
+        }
+      }
+      if (scores !== null) {
+        for (const id of [...found.keys()]) {
+          if (scores.has(id)) found.set(id, found.get(id) + scores.get(id));
+          else found.delete(id);
+        }
+      }
+      scores = found;
+    }
+    return [...(scores || [])]
+      .map(([id, score]) => ({ url: index.pages[id][0], title: index.pages[id][1], score }))
+      .sort((a, b) => b.score - a.score);
+  };
+})();
+"""
+
+
+def tokenize(text):
+    return [term for term in TERM_REGEX.findall(text.lower()) if len(term) >= PREFIX_LENGTH]
+
+
+def _collect_text(node, parts):
+    if node.children is not None:
+        for child in node.children:
+            _collect_text(child, parts)
+        return
+    parts.append(node.value)
+    if node.props is not None and node.props.get("alt"):
+        parts.append(node.props["alt"])
+
+
+def page_terms(markdown):
+    """
+    Returns the title of a page and how many times each term occurs in it.
+    The text is what the page shows: link text and image alt text but not
+    URLs, code but not markdown syntax. markdown may be a string or an
+    iterable of lines, such as an open file, which is read once, a block at
+    a time. Raises ValueError for a page without a title.
+    """
+    lines = markdown.split("\n") if isinstance(markdown, str) else markdown
+    titles = []
+
+    def note_title(lines):
+        # The title is picked out as the lines go by, the way extract_title
+        # finds it, so the page is not read a second time for it.
+        for line in lines:
+            if not titles and line.startswith("# "):
+                titles.append(line[2:].strip())
+            yield line
+
+    counts = Counter()
+    for block in scan_blocks(note_title(lines)):
+        parts = []
+        _collect_text(block_to_html_node(block), parts)
+        counts.update(tokenize(" ".join(parts)))
+    if not titles:
+        raise ValueError("Markdown must contain an H1 header (line starting with # )")
+    for term in tokenize(titles[0]):
+        counts[term] += TITLE_WEIGHT
+    return titles[0], dict(counts)
+
+
+def page_url(dest_path, dest_dir_path):
+    # docs/blog/tom/index.html -> /blog/tom/
+    url = "/" + os.path.relpath(dest_path, dest_dir_path).replace(os.sep, "/")
+    if url.endswith("/index.html"):
+        url = url[:-len("index.html")]
+    return url
+
+
+class SearchStats:
+    def __init__(self):
+        self.pages = 0
+        self.indexed = 0
+        self.cached = 0
+        self.written = 0
+        self.unchanged = 0
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if data.get("format") != CACHE_FORMAT:
+        return {}
+    return data.get("pages", {})
+
+
+def _write_output(manifest, path, data, stats):
+    # Outputs are recorded under "search" by the hash of their content, so an
+    # unchanged shard is not written again and a shard that is no longer
+    # produced is removed with the other stale outputs.
+    inputs_hash = hash_bytes(data)
+    if manifest.is_fresh(path, inputs_hash, kind="search"):
+        stats.unchanged += 1
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    replace_if_changed(tmp_path, path)
+    manifest.record(path, inputs_hash, kind="search")
+    stats.written += 1
+
+
+def _json_bytes(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def build_search_index(manifest, content_path, basepath="/", cache_path=DEFAULT_CACHE_PATH, pages=None):
+    """
+    Writes an inverted index of the text and titles of every page under
+    content_path to the search/ directory of the destination, for the search
+    client (search/search.js) to query in the browser:
+
+    - search/pages.json: {"prefix": PREFIX_LENGTH,
+      "pages": [[url, title], ...]} indexed by page id, with null for ids
+      not in use.
+    - search/<prefix>.json, one per term prefix:
+      {term: [id, count, id, count, ...]} with ids ascending.
+
+    The terms of each page are cached in cache_path by the hash of its
+    markdown, so only new or changed pages are read again. Pages keep their
+    id from build to build, so a change to a few pages only rewrites the
+    shards of the terms they gained or lost.
+
+    pages, if given, is what collect_pages returned for content_path and
+    the destination, so the build does not walk the content tree twice.
+    """
+    stats = SearchStats()
+    cache = _load_cache(cache_path)
+
+    if pages is None:
+        pages = collect_pages(content_path, manifest.dest_dir_path)
+
+    indexed_pages = {}
+    for from_path, dest_path in pages:
+        url = page_url(dest_path, manifest.dest_dir_path)
+        markdown_hash = hash_bytes(SEARCH_VERSION, hash_file(from_path))
+        cached = cache.get(url)
+        if cached is not None and cached["hash"] == markdown_hash:
+            indexed_pages[url] = cached
+            stats.cached += 1
+            continue
+        try:
+            with open(from_path, 'r') as f:
+                title, terms = page_terms(f)
+        except (ValueError, UnicodeDecodeError) as e:
+            print(f"Error indexing {from_path} for search, leaving it out: {e}")
+            continue
+        indexed_pages[url] = {"hash": markdown_hash, "title": title, "terms": terms}
+        stats.indexed += 1
+    stats.pages = len(indexed_pages)
+
+    # Pages keep the id they had; new pages take the lowest free ones.
+    used_ids = {cache[url]["id"] for url in indexed_pages if url in cache}
+    free_ids = (i for i in range(len(indexed_pages) + len(used_ids)) if i not in used_ids)
+    for url in sorted(indexed_pages):
+        indexed_pages[url]["id"] = cache[url]["id"] if url in cache else next(free_ids)
+
+    page_list = [None] * (max((page["id"] for page in indexed_pages.values()), default=-1) + 1)
+    shards = {}
+    for url, page in sorted(indexed_pages.items(), key=lambda item: item[1]["id"]):
+        page_list[page["id"]] = [basepath + url[1:], page["title"]]
+        for term, count in page["terms"].items():
+            shards.setdefault(term[:PREFIX_LENGTH], {}).setdefault(term, []).extend((page["id"], count))
+
+    index_dir = os.path.join(manifest.dest_dir_path, INDEX_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    _write_output(manifest, os.path.join(index_dir, "search.js"), SEARCH_CLIENT.encode("utf-8"), stats)
+    _write_output(manifest, os.path.join(index_dir, "pages.json"),
+                  _json_bytes({"prefix": PREFIX_LENGTH, "pages": page_list}), stats)
+    for prefix, shard in sorted(shards.items()):
+        _write_output(manifest, os.path.join(index_dir, prefix + ".json"), _json_bytes(shard), stats)
+
+    if indexed_pages != cache:
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"format": CACHE_FORMAT, "pages": indexed_pages}, f, sort_keys=True)
+        replace_if_changed(tmp_path, cache_path)
+
+    print(f"Search index: {stats.pages} page(s), {stats.indexed} indexed, {stats.cached} from the cache; "
+          f"{len(shards)} shard(s), {stats.written} file(s) written, {stats.unchanged} unchanged")
+    return stats
@@ -0,0 +1,161 @@
+import os
+import posixpath
+import re
+
+from build_manifest import hash_bytes
+from minify import minify_css
+
+
+DEFAULT_INLINE_MAX_SIZE = 8 * 1024
+
+LINK_TAG_REGEX = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+ATTRIBUTE_REGEX = re.compile(r"""([A-Za-z-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+CSS_URL_REGEX = re.compile(r"""url\(\s*(["']?)([^"')\s]+)\1\s*\)""")
+# data:, https:, and the like.
+URL_SCHEME_REGEX = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*:")
+
+
+def _attributes(tag):
+    return {name.lower(): double if double is not None else single
+            for name, double, single in ATTRIBUTE_REGEX.findall(tag)}
+
+
+def _stylesheet_href(tag):
+    # The root-relative href of a <link rel="stylesheet">, or None.
+    attributes = _attributes(tag)
+    href = attributes.get("href", "")
+    if "stylesheet" not in attributes.get("rel", "").lower().split():
+        return None
+    if not href.startswith("/") or href.startswith("//"):
+        return None
+    return href
+
+
+def _applies_to_screen(media):
+    # Whether a stylesheet's media attribute matches screens. Sheets for
+    # other media, such as print, don't block rendering to begin with.
+    if not media:
+        return True
+    for query in media.lower().split(","):
+        words = query.split()
+        if words and words[0] == "only":
+            words = words[1:]
+        if not words or words[0] in ("all", "screen") or words[0].startswith("("):
+            return True
+    return False
+
+
+def _rewrite_css_urls(css, stylesheet_url, basepath, asset_map=None):
+    # Relative url()s are relative to the stylesheet, not to the page it is
+    # inlined into, so every local URL is made root-relative and then given
+    # the basepath, like the page's own href and src attributes.
+    def rewrite(match):
+        quote, url = match.groups()
+        if url.startswith(("#", "//")) or URL_SCHEME_REGEX.match(url):
+            return match.group()
+        if not url.startswith("/"):
+            path, separator, rest = url.partition("?") if "?" in url else url.partition("#")
+            url = posixpath.normpath(posixpath.join(posixpath.dirname(stylesheet_url), path)) + separator + rest
+        if asset_map is not None:
+            url = asset_map.resolve(url)
+        return f"url({quote}{basepath}{url[1:]}{quote})"
+    return CSS_URL_REGEX.sub(rewrite, css)
+
+
+def resolve_css_urls(css, stylesheet_url, asset_map):
+    # For stylesheets copied under fingerprinted names: url()s of static
+    # files point at their fingerprinted copies instead, and stay relative
+    # or root-relative as written.
+    stylesheet_dir = posixpath.dirname(stylesheet_url)
+
+    def rewrite(match):
+        quote, url = match.groups()
+        if url.startswith(("#", "//")) or URL_SCHEME_REGEX.match(url):
+            return match.group()
+        root_url = url if url.startswith("/") else posixpath.normpath(posixpath.join(stylesheet_dir, url))
+        resolved = asset_map.resolve(root_url)
+        if resolved == root_url:
+            return match.group()
+        if not url.startswith("/"):
+            resolved = posixpath.relpath(resolved, stylesheet_dir)
+        return f"url({quote}{resolved}{quote})"
+    return CSS_URL_REGEX.sub(rewrite, css)
+
+
+class Stylesheets(dict):
+    """
+    The stylesheets a template links to, read and minified once per build.
+    Maps each stylesheet's href, as written in the template, to the CSS to
+    inline in its place, or to None for a stylesheet too large to inline,
+    which is loaded without blocking rendering instead. Template applies it
+    when it compiles.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._digest = None
+
+    def __setitem__(self, href, css):
+        self._digest = None
+        super().__setitem__(href, css)
+
+    @classmethod
+    def load(cls, template_path, root, basepath="/", max_size=DEFAULT_INLINE_MAX_SIZE, asset_map=None):
+        """
+        Reads the stylesheets template_path links to from the built site in
+        root, so the CSS is the copy that is served, fingerprinted or not.
+        Stylesheets of at most max_size bytes once minified are inlined.
+        """
+        stylesheets = cls()
+        with open(template_path, 'r') as f:
+            source = f.read()
+
+        for tag in LINK_TAG_REGEX.findall(source):
+            href = _stylesheet_href(tag)
+            if href is None or href in stylesheets:
+                continue
+            url = href if asset_map is None else asset_map.resolve(href)
+            path = os.path.join(root, *url.lstrip("/").split("/"))
+            try:
+                with open(path, 'r') as f:
+                    css = minify_css(f.read())
+            except OSError as e:
+                print(f"Error reading stylesheet {path}, leaving it linked: {e}")
+                continue
+            if len(css.encode("utf-8")) > max_size:
+                stylesheets[href] = None
+            else:
+                stylesheets[href] = _rewrite_css_urls(css, url, basepath, asset_map)
+        return stylesheets
+
+    def digest(self):
+        # Identifies what is inlined, for the hashes of the pages it goes into.
+        if self._digest is None:
+            self._digest = hash_bytes(*(part for href, css in sorted(self.items()) for part in (href, css or "")))
+        return self._digest
+
+    def apply(self, source):
+        """
+        Returns the template source with each inlined stylesheet's <link>
+        replaced by a <style> element. A stylesheet too large to inline is
+        preloaded and applied once it has loaded, so it no longer blocks
+        rendering, with the original <link> kept in a <noscript> for
+        browsers without scripts. Stylesheets for media other than screens
+        are left as they are.
+        """
+        def replace(match):
+            tag = match.group()
+            href = _stylesheet_href(tag)
+            if href not in self:
+                return tag
+            media = _attributes(tag).get("media")
+            media_attribute = f' media="{media}"' if media else ""
+            css = self[href]
+            if css is None:
+                if not _applies_to_screen(media):
+                    return tag
+                return (f'<link rel="preload" href="{href}" as="style"{media_attribute}'
+                        f' onload="this.onload=null;this.rel=\'stylesheet\'" /><noscript>{tag}</noscript>')
+            return f"<style{media_attribute}>{css}</style>"
+
+        return LINK_TAG_REGEX.sub(replace, source)
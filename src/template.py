@@ -0,0 +1,95 @@
+import os
+import re
+
+from htmlnode import URL_ATTRIBUTES
+
+
+PLACEHOLDER_REGEX = re.compile(r"\{\{ (\w+) \}\}")
+URL_ATTRIBUTE_REGEX = re.compile(r'(\s(?:%s)=")/(?!/)' % "|".join(URL_ATTRIBUTES))
+ROOT_URL_ATTRIBUTE_REGEX = re.compile(r'(\s(?:%s)=")(/[^"]*)' % "|".join(URL_ATTRIBUTES))
+
+
+def rewrite_basepath(html, basepath):
+    # Only used on the template's own markup, once per compile. Content is
+    # rewritten by the nodes themselves as they render (props_to_html).
+    if basepath == "/":
+        return html
+    return URL_ATTRIBUTE_REGEX.sub(lambda match: match.group(1) + basepath, html)
+
+
+def rewrite_asset_urls(html, asset_map):
+    # Points the template's own references to static files, such as its
+    # stylesheet, at their fingerprinted copies.
+    if not asset_map:
+        return html
+    return ROOT_URL_ATTRIBUTE_REGEX.sub(lambda match: match.group(1) + asset_map.resolve(match.group(2)), html)
+
+
+class Template:
+    """
+    A page template compiled once into alternating literal segments and
+    placeholder slots. The template's own root-relative href/src attributes
+    are rewritten for the asset map and the basepath at compile time, after
+    its stylesheets are inlined.
+
+    A slot value may be a string, which is written as it is, or anything with
+    a render_to(write, basepath) method, such as an HTMLNode, which is
+    streamed straight to the sink and prefixes its own URLs as it renders.
+    The finished document is never rescanned.
+    """
+
+    def __init__(self, source, basepath="/", asset_map=None, stylesheets=None):
+        self.basepath = basepath
+        self.segments = []
+        self.slots = []
+        if stylesheets:
+            source = stylesheets.apply(source)
+
+        last_end = 0
+        for match in PLACEHOLDER_REGEX.finditer(source):
+            segment = rewrite_asset_urls(source[last_end:match.start()], asset_map)
+            self.segments.append(rewrite_basepath(segment, basepath))
+            self.slots.append((match.group(1), match.group(0)))
+            last_end = match.end()
+        self.segments.append(rewrite_basepath(rewrite_asset_urls(source[last_end:], asset_map), basepath))
+
+    def render_to(self, write, values):
+        write(self.segments[0])
+        for (name, placeholder), segment in zip(self.slots, self.segments[1:]):
+            value = values.get(name)
+            if value is None:
+                # Placeholders with no value are left in place, as str.replace did.
+                write(placeholder)
+            elif hasattr(value, "render_to"):
+                value.render_to(write, self.basepath)
+            else:
+                write(value)
+            write(segment)
+
+    def render(self, values):
+        chunks = []
+        self.render_to(chunks.append, values)
+        return "".join(chunks)
+
+
+_template_cache = {}
+
+
+def load_template(template_path, basepath="/", asset_map=None, stylesheets=None):
+    """
+    Returns the compiled template for template_path, reading and compiling the
+    file only when it is new to this process or has changed on disk.
+    """
+    stat = os.stat(template_path)
+    key = (os.path.abspath(template_path), basepath, asset_map.digest() if asset_map else None,
+           stylesheets.digest() if stylesheets else None)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _template_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with open(template_path, 'r') as f:
+        template = Template(f.read(), basepath, asset_map, stylesheets)
+    _template_cache[key] = (version, template)
+    return template
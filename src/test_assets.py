@@ -0,0 +1,144 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from assets import AssetMap, HEADERS_FILENAME, IMMUTABLE_CACHE_CONTROL, fingerprinted_name
+from build_manifest import BuildManifest, hash_file
+from fixtures import write_file
+from markdown_utils import copy_contents_recursive
+from page_generator import generate_pages_recursive
+from template import Template
+from textnode import TextNode, TextType, text_node_to_html_node
+
+
+TEMPLATE = '<html><link href="/index.css" rel="stylesheet"><body>{{ Content }}</body></html>'
+
+
+# Unit tests for asset fingerprinting.
+class TestAssets(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.static = os.path.join(self.root, "static")
+        self.content = os.path.join(self.root, "content")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, TEMPLATE)
+        write_file(os.path.join(self.static, "index.css"), "body {}")
+        write_file(os.path.join(self.static, "images", "a.png"), "png")
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\n![A](/images/a.png) [css](/index.css?v=1)")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, basepath="/"):
+        manifest = BuildManifest.load(self.dest)
+        asset_map = AssetMap(self.dest)
+        with contextlib.redirect_stdout(io.StringIO()):
+            copy_contents_recursive(self.static, self.dest, manifest, asset_map=asset_map)
+            generate_pages_recursive(self.content, self.template, self.dest, basepath, manifest, asset_map=asset_map)
+            manifest.remove_stale_outputs()
+        manifest.save()
+        return asset_map
+
+    def fingerprinted(self, *parts):
+        name = fingerprinted_name(parts[-1], hash_file(os.path.join(self.static, *parts)))
+        return "/" + "/".join(parts[:-1] + (name,))
+
+    # Tests that the hash goes between the name and the extension.
+    def test_fingerprinted_name(self):
+        self.assertEqual(fingerprinted_name("index.css", "0123456789abcdef"), "index.0123456789.css")
+        self.assertEqual(fingerprinted_name("LICENSE", "0123456789abcdef"), "LICENSE.0123456789")
+
+    # Tests that static files are copied under their fingerprinted names only.
+    def test_copies_fingerprinted_files(self):
+        asset_map = self.build()
+        css_url = self.fingerprinted("index.css")
+        self.assertEqual(asset_map["/index.css"], css_url)
+        self.assertTrue(os.path.isfile(asset_map.path(css_url)))
+        self.assertTrue(os.path.isfile(asset_map.path(self.fingerprinted("images", "a.png"))))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "index.css")))
+
+    # Tests that the template and markdown links and images point at the fingerprinted files.
+    def test_pages_reference_fingerprinted_files(self):
+        self.build(basepath="/site/")
+        with open(os.path.join(self.dest, "index.html")) as f:
+            html = f.read()
+        self.assertIn(f'href="/site{self.fingerprinted("index.css")}"', html)
+        self.assertIn(f'src="/site{self.fingerprinted("images", "a.png")}"', html)
+        self.assertIn(f'href="/site{self.fingerprinted("index.css")}?v=1"', html)
+
+    # Tests that a changed asset gets a new name, the old one is removed and pages are regenerated.
+    def test_changed_asset_is_renamed(self):
+        old_url = self.build()["/index.css"]
+        write_file(os.path.join(self.static, "index.css"), "body { color: red }")
+        asset_map = self.build()
+        self.assertNotEqual(asset_map["/index.css"], old_url)
+        self.assertFalse(os.path.exists(asset_map.path(old_url)))
+        with open(os.path.join(self.dest, "index.html")) as f:
+            self.assertIn(asset_map["/index.css"], f.read())
+
+    # Tests that an unchanged file keeps its previous name without being hashed again.
+    def test_unchanged_asset_is_not_rehashed(self):
+        old_url = self.build()["/index.css"]
+        css = os.path.join(self.static, "index.css")
+        stat = os.stat(css)
+        write_file(css, "body ()")
+        os.utime(css, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.build()["/index.css"], old_url)
+
+    # Tests that the _headers file marks every fingerprinted file immutable.
+    def test_headers_file(self):
+        asset_map = self.build()
+        with open(os.path.join(self.dest, HEADERS_FILENAME)) as f:
+            headers = f.read()
+        for url in asset_map.values():
+            self.assertIn(f"{url}\n  Cache-Control: {IMMUTABLE_CACHE_CONTROL}\n", headers)
+
+    # Tests that files looked up by their own names, such as robots.txt and CNAME, keep them.
+    def test_fixed_name_files_are_not_renamed(self):
+        for name in ["robots.txt", "favicon.ico", "CNAME", "_redirects"]:
+            write_file(os.path.join(self.static, name), name)
+        asset_map = self.build()
+        for name in ["robots.txt", "favicon.ico", "CNAME", "_redirects"]:
+            self.assertTrue(os.path.isfile(os.path.join(self.dest, name)), name)
+            self.assertNotIn("/" + name, asset_map)
+        self.assertEqual(sorted(asset_map), ["/images/a.png", "/index.css"])
+
+    # Tests that url()s in copied stylesheets point at the fingerprinted files, and follow them when they change.
+    def test_stylesheet_urls_are_rewritten(self):
+        write_file(os.path.join(self.static, "index.css"),
+                   "a { background: url(images/a.png) } b { background: url('/images/a.png?x') }")
+        asset_map = self.build()
+        with open(asset_map.path(asset_map["/index.css"])) as f:
+            css = f.read()
+        image_url = self.fingerprinted("images", "a.png")
+        self.assertEqual(css, f"a {{ background: url({image_url[1:]}) }} b {{ background: url('{image_url}?x') }}")
+
+        old_css_url = asset_map["/index.css"]
+        self.assertEqual(self.build()["/index.css"], old_css_url)
+        write_file(os.path.join(self.static, "images", "a.png"), "new png")
+        asset_map = self.build()
+        self.assertNotEqual(asset_map["/index.css"], old_css_url)
+        self.assertFalse(os.path.exists(asset_map.path(old_css_url)))
+        with open(asset_map.path(asset_map["/index.css"])) as f:
+            self.assertIn(self.fingerprinted("images", "a.png")[1:], f.read())
+
+    # Tests that URLs without a fingerprinted file are left alone.
+    def test_resolve_unknown_urls(self):
+        asset_map = AssetMap(self.dest)
+        asset_map["/a.css"] = "/a.0123456789.css"
+        self.assertEqual(asset_map.resolve("/a.css#x"), "/a.0123456789.css#x")
+        self.assertEqual(asset_map.resolve("/b.css"), "/b.css")
+        self.assertEqual(asset_map.resolve("https://example.com/a.css"), "https://example.com/a.css")
+        node = text_node_to_html_node(TextNode("A", TextType.IMAGE, "/a.css"), asset_map)
+        self.assertEqual(node.props["src"], "/a.0123456789.css")
+        template = Template('<link href="/a.css"><a href="/b">{{ Content }}</a>', "/site/", asset_map)
+        self.assertEqual(template.render({"Content": ""}), '<link href="/site/a.0123456789.css"><a href="/site/b"></a>')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from async_build import LocalFiles, generate_pages_async
+from build_manifest import BuildManifest
+from fixtures import read_tree, write_file
+from page_generator import generate_pages_recursive
+
+
+TEMPLATE = '<html><title>{{ Title }}</title><link href="/a.css"><body>{{ Content }}</body></html>'
+
+
+class SlowFiles(LocalFiles):
+    """
+    A stand-in for a network or overlay filesystem: opening a file waits for
+    latency seconds before touching the disk. The paths opened are recorded.
+    """
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.opened = []
+
+    def open_file(self, path, mode):
+        time.sleep(self.latency)
+        self.opened.append((path, mode))
+        return super().open_file(path, mode)
+
+
+# Unit tests for the asyncio page pipeline.
+class TestAsyncBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, TEMPLATE)
+        for i in range(8):
+            write_file(os.path.join(self.content, f"post{i}", "index.md"),
+                       f"# Post {i}\n\nSee [home](/) and **bold** text.\n\n```\ncode {i}\n```\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build_async(self, dest, manifest=None, jobs=1, **options):
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            generate_pages_async(self.content, self.template, dest, "/site/", manifest, jobs, **options)
+        return log.getvalue()
+
+    # Tests that the async pipeline writes the same pages and logs as the serial build.
+    def test_matches_serial_build(self):
+        serial_dest = os.path.join(self.root, "serial")
+        serial_log = io.StringIO()
+        with contextlib.redirect_stdout(serial_log):
+            generate_pages_recursive(self.content, self.template, serial_dest, "/site/")
+
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                dest = os.path.join(self.root, f"async{jobs}")
+                log = self.build_async(dest, jobs=jobs, io_concurrency=3)
+                self.assertEqual(read_tree(dest), read_tree(serial_dest))
+                self.assertEqual(log.replace(dest, serial_dest), serial_log.getvalue())
+
+    # Tests that every page is read and written through the I/O threads, with their latency overlapped.
+    def test_overlaps_slow_io(self):
+        latency = 0.05
+        dest = os.path.join(self.root, "docs")
+        files = SlowFiles(latency)
+        start = time.perf_counter()
+        self.build_async(dest, io_concurrency=8, files=files)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(len(read_tree(dest)), 8)
+        pages = [f"post{i}" for i in range(8)]
+        self.assertEqual(sorted(files.opened), sorted(
+            [(os.path.join(self.content, page, "index.md"), 'rb') for page in pages]
+            + [(os.path.join(dest, page, "index.html.tmp"), 'wb') for page in pages]
+        ))
+        # 8 pages with a read and a write each would take 0.8s in series.
+        self.assertLess(elapsed, 8 * 2 * latency / 2)
+        self.assertIsNone(files.spool_dir)
+
+    # Tests that unchanged pages are skipped and recorded in the manifest.
+    def test_manifest_skips_unchanged_pages(self):
+        dest = os.path.join(self.root, "docs")
+        manifest = BuildManifest(dest)
+        self.build_async(dest, manifest)
+        manifest.save()
+
+        write_file(os.path.join(self.content, "post3", "index.md"), "# Post 3\n\nEdited")
+        manifest = BuildManifest.load(dest)
+        log = self.build_async(dest, manifest)
+        self.assertEqual(log.count("Skipping unchanged page"), 7)
+        self.assertEqual(len(manifest.entries["pages"]), 8)
+        with open(os.path.join(dest, "post3", "index.html")) as f:
+            self.assertIn("Edited", f.read())
+
+    # Tests that a large page is hashed and rendered from file to file, never held in memory whole.
+    def test_large_page_has_bounded_memory(self):
+        block = "A paragraph with **bold**, _italic_ and a [link](/somewhere) in it.\n\n"
+        write_file(os.path.join(self.content, "big", "index.md"), "# Big\n\n" + block * 16000)
+        dest = os.path.join(self.root, "docs")
+
+        tracemalloc.start()
+        try:
+            self.build_async(dest, BuildManifest(dest))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # The I/O and render threads and the event loop take some memory of
+        # their own; the page is over a megabyte.
+        self.assertGreater(os.path.getsize(os.path.join(dest, "big", "index.html")), 1_200_000)
+        self.assertLess(peak, 400_000)
+
+    # Tests that a broken page is reported without output while the other pages are written.
+    def test_error_leaves_no_output(self):
+        write_file(os.path.join(self.content, "post0", "index.md"), "# Post\n\nbroken **bold")
+        dest = os.path.join(self.root, "docs")
+        log = self.build_async(dest)
+        self.assertIn("Error converting markdown to HTML", log)
+        self.assertFalse(os.path.exists(os.path.join(dest, "post0")))
+        self.assertEqual(len(read_tree(dest)), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
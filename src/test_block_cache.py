@@ -0,0 +1,112 @@
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+import unittest
+
+import block_cache
+from block_cache import BlockCache
+from images import ImageIndex
+from markdown_converter import MarkdownStream, markdown_to_html_node
+
+
+# Unit tests for the persistent block render cache.
+class TestBlockCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache", "blocks.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def render(self, markdown, cache):
+        chunks = []
+        MarkdownStream(markdown, cache).render_to(chunks.append)
+        return "".join(chunks)
+
+    # Tests that a stored block is found again, also by a new cache instance.
+    def test_put_get_persists(self):
+        cache = BlockCache(self.path)
+        key = cache.key(["some", "lines"])
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "<p>x</p>")
+        self.assertEqual(cache.get(key), "<p>x</p>")
+        cache.close()
+
+        reopened = BlockCache(self.path)
+        self.assertEqual(reopened.get(key), "<p>x</p>")
+        self.assertEqual(reopened.stats()["entries"], 1)
+        reopened.close()
+
+    # Tests that rendering through the cache matches rendering without it, and hits the second time.
+    def test_markdown_stream_with_cache(self):
+        long_paragraph = "A **long** paragraph " * 30
+        markdown = f"# Title\n\n{long_paragraph}\n\n```\ncode\n\n{long_paragraph}\n```\n\nshort"
+        expected = markdown_to_html_node(markdown).to_html()
+
+        cache = BlockCache(self.path)
+        self.assertEqual(self.render(markdown, cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertEqual(self.render(markdown, cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        cache.close()
+
+    # Tests that blocks rendered with different image sizes are cached separately.
+    def test_image_sizes_are_part_of_the_key(self):
+        markdown = "A long paragraph with an image " * 10 + "![a](/a.png)"
+        cache = BlockCache(self.path)
+        rendered = []
+        for size in [(1, 2), (3, 4), (1, 2)]:
+            images = ImageIndex()
+            images["/a.png"] = size
+            chunks = []
+            MarkdownStream(markdown, cache, images=images).render_to(chunks.append)
+            rendered.append("".join(chunks))
+        self.assertEqual(rendered[0], markdown_to_html_node(markdown, images=images).to_html())
+        self.assertIn('width="3" height="4"', rendered[1])
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        cache.close()
+
+    # Tests that gc evicts the least recently used blocks first.
+    def test_gc_evicts_least_recently_used(self):
+        cache = BlockCache(self.path)
+        for name in ["a", "b", "c"]:
+            cache.put(name, name * 100)
+            cache.flush()
+        # Using "a" again makes "b" the least recently used block.
+        cache.get("a")
+        cache.flush()
+
+        removed, freed = cache.gc(max_bytes=200)
+        self.assertEqual((removed, freed), (1, 100))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        cache.close()
+
+    # Tests that a cache sent to a worker process keeps its settings.
+    def test_pickle_keeps_settings(self):
+        cache = BlockCache(self.path, max_bytes=123, min_block_chars=7)
+        copy = pickle.loads(pickle.dumps(cache))
+        self.assertEqual((copy.path, copy.max_bytes, copy.min_block_chars), (self.path, 123, 7))
+        self.assertIs(pickle.loads(pickle.dumps(cache)), copy)
+
+    # Tests the "cache stats" and "cache gc" commands.
+    def test_cache_commands(self):
+        cache = BlockCache(self.path)
+        cache.put("k", "x" * 2048)
+        cache.close()
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            block_cache.main(["stats", "--path", self.path])
+            block_cache.main(["gc", "--path", self.path, "--max-size", "0.001"])
+        self.assertIn("1 block(s)", out.getvalue())
+        self.assertIn("Evicted 1 block(s)", out.getvalue())
+        self.assertIn("0 block(s)", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,221 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest, CHANGES_FILENAME, MANIFEST_FILENAME, hash_bytes, hash_file
+from fixtures import write_file
+from markdown_utils import copy_contents_recursive
+from page_generator import generate_pages_recursive
+
+
+TEMPLATE = "<html><title>{{ Title }}</title><body>{{ Content }}</body></html>"
+
+
+# Unit tests for the incremental build manifest.
+class TestBuildManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, TEMPLATE)
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        write_file(os.path.join(self.content, "blog", "post", "index.md"), "# Post\n\nBody")
+        write_file(os.path.join(self.static, "index.css"), "body {}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, basepath="/", checksum=False):
+        manifest = BuildManifest.load(self.dest)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.stats = copy_contents_recursive(self.static, self.dest, manifest, checksum)
+            generate_pages_recursive(self.content, self.template, self.dest, basepath, manifest)
+            manifest.remove_stale_outputs()
+        self.changes = manifest.save()
+        return manifest
+
+    def paths(self, change):
+        return [entry["path"] for entry in self.changes[change]]
+
+    def mtime(self, *parts):
+        return os.stat(os.path.join(self.dest, *parts)).st_mtime_ns
+
+    def touch_old(self, *parts):
+        os.utime(os.path.join(self.dest, *parts), ns=(0, 0))
+
+    # Tests that hash_bytes separates its parts so concatenations don't collide.
+    def test_hash_bytes_is_unambiguous(self):
+        self.assertNotEqual(hash_bytes("ab", "c"), hash_bytes("a", "bc"))
+
+    # Tests that the first build writes every output and the manifest.
+    def test_first_build_writes_outputs(self):
+        self.build()
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, "index.html")))
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, "blog", "post", "index.html")))
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, "index.css")))
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, MANIFEST_FILENAME)))
+
+    # Tests that a second build with unchanged inputs rewrites nothing.
+    def test_unchanged_build_skips_everything(self):
+        self.build()
+        css_mtime = self.mtime("index.css")
+        for parts in [("index.html",), ("blog", "post", "index.html")]:
+            self.touch_old(*parts)
+        self.build()
+        self.assertEqual(self.mtime("index.html"), 0)
+        self.assertEqual(self.mtime("blog", "post", "index.html"), 0)
+        self.assertEqual(self.mtime("index.css"), css_mtime)
+
+    # Tests that only the changed page is regenerated.
+    def test_changed_page_is_regenerated(self):
+        self.build()
+        self.touch_old("index.html")
+        self.touch_old("blog", "post", "index.html")
+        write_file(os.path.join(self.content, "blog", "post", "index.md"), "# Post\n\nEdited")
+        self.build()
+        self.assertEqual(self.mtime("index.html"), 0)
+        with open(os.path.join(self.dest, "blog", "post", "index.html")) as f:
+            self.assertIn("Edited", f.read())
+
+    # Tests that a template or basepath change regenerates every page.
+    def test_template_and_basepath_invalidate_pages(self):
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\n[Post](/blog/post/)")
+        self.build()
+        self.touch_old("index.html")
+        self.build(basepath="/site/")
+        self.assertNotEqual(self.mtime("index.html"), 0)
+
+        self.touch_old("index.html")
+        write_file(self.template, "<main>" + TEMPLATE + "</main>")
+        self.build(basepath="/site/")
+        self.assertNotEqual(self.mtime("index.html"), 0)
+
+    # Tests that outputs whose sources were removed are deleted, with empty directories.
+    def test_removed_sources_delete_outputs(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post", "index.md"))
+        os.remove(os.path.join(self.static, "index.css"))
+        self.build()
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "blog")))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "index.css")))
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, "index.html")))
+
+    # Tests that a page regenerated with identical HTML keeps its mtime and is counted.
+    def test_identical_output_is_not_rewritten(self):
+        self.build()
+        os.remove(os.path.join(self.dest, MANIFEST_FILENAME))
+        self.touch_old("index.html")
+        manifest = BuildManifest.load(self.dest)
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_stats = generate_pages_recursive(self.content, self.template, self.dest, "/", manifest)
+        self.assertEqual((write_stats.written, write_stats.unchanged), (0, 2))
+        self.assertEqual(self.mtime("index.html"), 0)
+
+    # Tests that a deleted output is regenerated even if its inputs are unchanged.
+    def test_missing_output_is_regenerated(self):
+        self.build()
+        os.remove(os.path.join(self.dest, "index.html"))
+        self.build()
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, "index.html")))
+
+    # Tests that files not tracked by the manifest are left alone.
+    def test_untracked_files_are_kept(self):
+        self.build()
+        write_file(os.path.join(self.dest, "CNAME"), "example.com")
+        self.build()
+        self.assertTrue(os.path.isfile(os.path.join(self.dest, "CNAME")))
+
+    # Tests that a second build copies no static files and reports them as skipped.
+    def test_static_sync_counts(self):
+        write_file(os.path.join(self.static, "images", "a.png"), "png")
+        self.build()
+        self.assertEqual((self.stats.copied, self.stats.skipped, self.stats.removed), (2, 0, 0))
+        self.build()
+        self.assertEqual((self.stats.copied, self.stats.skipped, self.stats.removed), (0, 2, 0))
+
+        os.remove(os.path.join(self.static, "images", "a.png"))
+        write_file(os.path.join(self.static, "index.css"), "body { color: red }")
+        self.build()
+        self.assertEqual((self.stats.copied, self.stats.skipped, self.stats.removed), (1, 0, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images")))
+
+    # Tests that a static file with a new mtime is copied again unless checksum mode finds it identical.
+    def test_static_sync_checksum(self):
+        self.build()
+        css = os.path.join(self.static, "index.css")
+        os.utime(css, ns=(10**18, 10**18))
+        self.build(checksum=True)
+        self.assertEqual((self.stats.copied, self.stats.skipped), (0, 1))
+        self.assertEqual(self.mtime("index.css"), 10**18)
+
+        os.utime(css, ns=(2 * 10**18, 2 * 10**18))
+        self.build()
+        self.assertEqual((self.stats.copied, self.stats.skipped), (1, 0))
+
+    # Tests that the changes file lists every output as added on the first build, with content hashes.
+    def test_changes_first_build(self):
+        self.build()
+        self.assertEqual(self.paths("added"), ["blog/post/index.html", "index.css", "index.html"])
+        self.assertEqual(self.changes["added"][1]["kind"], "assets")
+        self.assertEqual(self.changes["added"][2]["sha256"], hash_file(os.path.join(self.dest, "index.html")))
+        with open(os.path.join(self.dest, CHANGES_FILENAME)) as f:
+            self.assertEqual(json.load(f)["added"], self.changes["added"])
+
+    # Tests that the changes file holds only what differs from the previous build.
+    def test_changes_are_relative_to_previous_build(self):
+        self.build()
+        self.build()
+        self.assertEqual(self.changes, {"added": [], "modified": [], "removed": []})
+
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nEdited")
+        write_file(os.path.join(self.content, "about.md"), "# About\n\nUs")
+        os.remove(os.path.join(self.static, "index.css"))
+        self.build()
+        self.assertEqual(self.paths("added"), ["about.html"])
+        self.assertEqual(self.paths("modified"), ["index.html"])
+        self.assertEqual(self.paths("removed"), ["index.css"])
+
+    # Tests that a page regenerated with the same HTML is not reported as modified.
+    def test_changes_ignore_identical_regeneration(self):
+        self.build()
+        self.build(basepath="/site/")
+        self.assertEqual(self.changes["modified"], [])
+
+    # Tests that after a generator version change, outputs whose source is gone are still removed and listed.
+    def test_changes_across_generator_versions(self):
+        self.build()
+        manifest_path = os.path.join(self.dest, MANIFEST_FILENAME)
+        with open(manifest_path) as f:
+            data = json.load(f)
+        data["generator_version"] = "0"
+        with open(manifest_path, 'w') as f:
+            json.dump(data, f)
+        self.touch_old("index.html")
+
+        os.remove(os.path.join(self.content, "blog", "post", "index.md"))
+        self.build()
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "blog", "post", "index.html")))
+        self.assertEqual(self.paths("removed"), ["blog/post/index.html"])
+        self.assertEqual(self.paths("added") + self.paths("modified"), [])
+        self.assertEqual(self.mtime("index.html"), 0)
+
+    # Tests that an old manifest format is ignored instead of misread.
+    def test_unknown_manifest_format_is_ignored(self):
+        os.makedirs(self.dest)
+        with open(os.path.join(self.dest, MANIFEST_FILENAME), 'w') as f:
+            f.write('{"outputs": {"index.css": "x"}}')
+        with contextlib.redirect_stdout(io.StringIO()):
+            manifest = BuildManifest.load(self.dest)
+        self.assertEqual(manifest.stale_outputs(kind="assets"), [])
+        self.assertEqual(manifest.stale_outputs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
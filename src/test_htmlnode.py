@@ -150,6 +150,108 @@ class TestHTMLNode(unittest.TestCase):
         with self.assertRaisesRegex(ValueError, "ParentNode requires children"):
              ParentNode("div", []).to_html() # Test calling to_html after creation
 
+    # --- render_to tests ---
+
+    def test_render_to_matches_to_html(self):
+        """
+        Tests that streaming a tree produces the same HTML as to_html, in several chunks.
+        """
+        node = ParentNode("div", [
+            ParentNode("p", [LeafNode("b", "bold"), LeafNode(None, " text")]),
+            LeafNode("a", "link", {"href": "/x"}),
+        ], {"class": "c"})
+        chunks = []
+        node.render_to(chunks.append)
+        self.assertEqual("".join(chunks), node.to_html())
+        self.assertEqual(len(chunks), 7)
+
+    def test_render_to_falls_back_to_to_html(self):
+        """
+        Tests that a node subclass that only implements to_html can still be streamed.
+        """
+        class RawNode(HTMLNode):
+            def to_html(self):
+                return "<hr>"
+
+        chunks = []
+        ParentNode("div", [RawNode()]).render_to(chunks.append)
+        self.assertEqual(chunks, ["<div>", "<hr>", "</div>"])
+
+    def test_render_to_raises_error_empty_children_list(self):
+        """
+        Tests that streaming validates ParentNode children like to_html does.
+        """
+        node = ParentNode("div", [LeafNode(None, "x")])
+        node.children = []
+        with self.assertRaisesRegex(ValueError, "ParentNode requires children"):
+            node.render_to(lambda chunk: None)
+
+    def test_render_deeply_nested_tree(self):
+        """
+        Tests that nesting far beyond the recursion limit renders without a RecursionError.
+        """
+        depth = 20000
+        node = LeafNode("b", "core")
+        for _ in range(depth):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertEqual(html, "<span>" * depth + "<b>core</b>" + "</span>" * depth)
+
+    def test_render_nested_order_and_props(self):
+        """
+        Tests that siblings after a nested subtree keep their order and props.
+        """
+        node = ParentNode("ul", [
+            ParentNode("li", [ParentNode("i", [LeafNode(None, "a")]), LeafNode(None, "b")]),
+            ParentNode("li", [LeafNode("a", "c", {"href": "/c"})], {"class": "last"}),
+        ])
+        self.assertEqual(
+            node.to_html(),
+            '<ul><li><i>a</i>b</li><li class="last"><a href="/c">c</a></li></ul>',
+        )
+
+    def test_render_nested_custom_parent_subclass(self):
+        """
+        Tests that a ParentNode subclass with its own render_to is still honoured inside a tree.
+        """
+        class Comment(ParentNode):
+            def render_to(self, write):
+                write("<!-- hidden -->")
+
+        node = ParentNode("div", [Comment("x", [LeafNode(None, "y")]), LeafNode(None, "z")])
+        self.assertEqual(node.to_html(), "<div><!-- hidden -->z</div>")
+
+    def test_basepath_prefixes_url_props(self):
+        """
+        Tests that root-relative href and src props get the basepath and other props and URLs do not.
+        """
+        node = ParentNode("div", [
+            LeafNode("a", "home", {"href": "/"}),
+            LeafNode("a", "ext", {"href": "https://example.com/"}),
+            LeafNode("a", "cdn", {"href": "//cdn.example.com/x"}),
+            LeafNode("a", "rel", {"href": "post/"}),
+            LeafNode("img", "", {"src": "/a.png", "alt": "/a.png"}),
+        ], {"data-src": "/x"})
+        self.assertEqual(
+            node.to_html("/site/"),
+            '<div data-src="/x"><a href="/site/">home</a><a href="https://example.com/">ext</a>'
+            '<a href="//cdn.example.com/x">cdn</a><a href="post/">rel</a>'
+            '<img src="/site/a.png" alt="/a.png"></img></div>',
+        )
+        self.assertEqual(node.to_html(), node.to_html("/"))
+        self.assertIn('href="/"', node.to_html())
+
+    def test_basepath_reaches_custom_nodes(self):
+        """
+        Tests that the basepath is passed on to nodes that render themselves.
+        """
+        class Link(HTMLNode):
+            def to_html(self, basepath="/"):
+                return f'<a href="{basepath}">up</a>'
+
+        node = ParentNode("nav", [Link()])
+        self.assertEqual(node.to_html("/site/"), '<nav><a href="/site/">up</a></nav>')
+
 
 if __name__ == "__main__":
     unittest.main()
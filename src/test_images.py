@@ -0,0 +1,121 @@
+import contextlib
+import io
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+from build_manifest import BuildManifest
+from fixtures import write_bytes
+from images import ImageIndex, read_image_size
+from markdown_converter import markdown_to_html_node
+from markdown_utils import copy_contents_recursive
+from textnode import TextNode, TextType, text_node_to_html_node
+
+
+def png_bytes(width, height):
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr
+            + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr)))
+
+
+def jpeg_bytes(width, height, orientation=None):
+    data = b"\xff\xd8" + b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    if orientation is not None:
+        # A big-endian TIFF header with one IFD0 entry: Orientation (SHORT).
+        tiff = b"MM\x00\x2a" + struct.pack(">I", 8) + struct.pack(">H", 1)
+        tiff += struct.pack(">HHIHH", 0x0112, 3, 1, orientation, 0) + struct.pack(">I", 0)
+        exif = b"Exif\x00\x00" + tiff
+        data += b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif
+    data += b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return data + b"\xff\xd9"
+
+
+# Unit tests for image header parsing and the image index.
+class TestImages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.cache_path = os.path.join(self.tmp.name, "cache", "images.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def size_of(self, data):
+        path = os.path.join(self.tmp.name, "image")
+        write_bytes(path, data)
+        return read_image_size(path)
+
+    def load_index(self):
+        manifest = BuildManifest.load(self.dest)
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            copy_contents_recursive(self.static, self.dest, manifest)
+            index = ImageIndex.load(manifest, self.cache_path)
+        manifest.save()
+        return index, log.getvalue()
+
+    # Tests that PNG and GIF sizes are read from their headers.
+    def test_png_and_gif(self):
+        self.assertEqual(self.size_of(png_bytes(1026, 388)), (1026, 388))
+        self.assertEqual(self.size_of(b"GIF89a" + struct.pack("<HH", 320, 200) + b"\x00" * 20), (320, 200))
+
+    # Tests the three WebP variants: lossy, lossless and extended.
+    def test_webp(self):
+        def riff(chunk, payload):
+            header = b"RIFF" + struct.pack("<I", 4 + 8 + len(payload)) + b"WEBP"
+            return header + chunk + struct.pack("<I", len(payload)) + payload
+
+        lossy = riff(b"VP8 ", b"\x00" * 3 + b"\x9d\x01\x2a" + struct.pack("<HH", 640, 480) + b"\x00" * 4)
+        lossless = riff(b"VP8L", b"\x2f" + ((99 << 14) | 199).to_bytes(4, "little") + b"\x00" * 8)
+        extended = riff(b"VP8X", b"\x00" * 4 + (1919).to_bytes(3, "little") + (1079).to_bytes(3, "little"))
+        self.assertEqual(self.size_of(lossy), (640, 480))
+        self.assertEqual(self.size_of(lossless), (200, 100))
+        self.assertEqual(self.size_of(extended), (1920, 1080))
+
+    # Tests that JPEG segments are walked to the frame header, and rotated orientations swap the size.
+    def test_jpeg(self):
+        self.assertEqual(self.size_of(jpeg_bytes(800, 600)), (800, 600))
+        self.assertEqual(self.size_of(jpeg_bytes(800, 600, orientation=1)), (800, 600))
+        self.assertEqual(self.size_of(jpeg_bytes(800, 600, orientation=6)), (600, 800))
+
+    # Tests that unknown or truncated files have no size.
+    def test_unreadable_images(self):
+        self.assertIsNone(self.size_of(b"not an image"))
+        self.assertIsNone(self.size_of(png_bytes(10, 10)[:20]))
+        self.assertIsNone(self.size_of(jpeg_bytes(800, 600)[:26]))
+        self.assertIsNone(read_image_size(os.path.join(self.tmp.name, "missing.png")))
+
+    # Tests that images get their size and loading hints, and unknown images only the hints.
+    def test_image_attributes(self):
+        write_bytes(os.path.join(self.static, "images", "a.png"), png_bytes(30, 20))
+        index, _ = self.load_index()
+        node = text_node_to_html_node(TextNode("A", TextType.IMAGE, "/images/a.png"), images=index)
+        self.assertEqual(node.to_html(), '<img src="/images/a.png" alt="A" width="30" height="20" loading="lazy" '
+                                         'decoding="async"></img>')
+        html = markdown_to_html_node("![B](https://example.com/b.png)", images=index).to_html()
+        self.assertIn('alt="B" loading="lazy" decoding="async"', html)
+
+    # Tests that sizes come from the on-disk cache unless an image's content changed.
+    def test_sizes_are_cached_by_content_hash(self):
+        write_bytes(os.path.join(self.static, "a.png"), png_bytes(30, 20))
+        write_bytes(os.path.join(self.static, "b.gif"), b"GIF89a" + struct.pack("<HH", 5, 6) + b"\x00" * 20)
+        index, log = self.load_index()
+        self.assertEqual(index, {"/a.png": (30, 20), "/b.gif": (5, 6)})
+        self.assertIn("2 header(s) read", log)
+
+        index, log = self.load_index()
+        self.assertEqual(index, {"/a.png": (30, 20), "/b.gif": (5, 6)})
+        self.assertIn("0 header(s) read", log)
+
+        write_bytes(os.path.join(self.static, "a.png"), png_bytes(40, 20))
+        index, log = self.load_index()
+        self.assertEqual(index["/a.png"], (40, 20))
+        self.assertIn("1 header(s) read", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -37,6 +37,12 @@ class TestMarkdownConverter(unittest.TestCase):
         expected_html = "<div><pre><code>This is text that _should_ remain\nthe **same** even with inline stuff\n</code></pre></div>"
         self.assertEqual(html, expected_html)
 
+    # Tests that a fenced code block containing empty lines stays one code block.
+    def test_codeblock_with_blank_lines(self):
+        md = "```\nfirst\n\nsecond\n```\n\nAfter"
+        html = markdown_to_html_node(md).to_html()
+        self.assertEqual(html, "<div><pre><code>first\n\nsecond\n</code></pre><p>After</p></div>")
+
     # Tests conversion of heading blocks (H1-H6) with inline text.
     def test_headings(self):
         md = "# Heading 1 **bold**\n" + \
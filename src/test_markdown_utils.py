@@ -12,6 +12,8 @@ from markdown_utils import (
     markdown_to_blocks,
     BlockType, # Import the BlockType enum
     block_to_block_type, # Import the new function
+    scan_blocks,
+    Block,
 )
 
 
@@ -551,6 +553,68 @@ Block 3
         self.assertEqual(blocks, ["Block 1", "Block 2"])
 
 
+    # --- scan_blocks tests ---
+
+    def test_scan_blocks_types_and_spans(self):
+        """
+        Tests that scanned blocks carry their type, stripped lines and 1-based line span.
+        """
+        md = "\n# Title\n\n  para line 1\npara line 2  \n\n\n- a\n- b\n"
+        blocks = list(scan_blocks(md))
+        self.assertEqual(
+            blocks,
+            [
+                Block(BlockType.HEADING, ["# Title"], 2, 2),
+                Block(BlockType.PARAGRAPH, ["para line 1", "para line 2"], 4, 5),
+                Block(BlockType.UNORDERED_LIST, ["- a", "- b"], 8, 9),
+            ],
+        )
+
+    def test_scan_blocks_fenced_code_with_blank_lines(self):
+        """
+        Tests that empty lines inside a fenced code block do not split it.
+        """
+        md = "```\ndef f():\n\n    return 1\n```\n\nAfter"
+        blocks = list(scan_blocks(md))
+        self.assertEqual(len(blocks), 2)
+        self.assertEqual(blocks[0].type, BlockType.CODE)
+        self.assertEqual(blocks[0].lines, ["```", "def f():", "", "    return 1", "```"])
+        self.assertEqual((blocks[0].start_line, blocks[0].end_line), (1, 5))
+        self.assertEqual(blocks[1], Block(BlockType.PARAGRAPH, ["After"], 7, 7))
+
+    def test_scan_blocks_unterminated_fence(self):
+        """
+        Tests that a fence that is never closed is split on empty lines like ordinary text.
+        """
+        blocks = list(scan_blocks("```\ncode\n\nmore"))
+        self.assertEqual(
+            blocks,
+            [
+                Block(BlockType.PARAGRAPH, ["```", "code"], 1, 2),
+                Block(BlockType.PARAGRAPH, ["more"], 4, 4),
+            ],
+        )
+
+    def test_scan_blocks_is_lazy_over_lines(self):
+        """
+        Tests that scan_blocks accepts an iterable of lines and yields blocks before reading all of them.
+        """
+        def lines():
+            yield "first block\n"
+            yield "\n"
+            yield "second block\n"
+            raise AssertionError("read past the second block")
+
+        scanner = scan_blocks(lines())
+        self.assertEqual(next(scanner).lines, ["first block"])
+
+    def test_markdown_to_blocks_fenced_code_with_blank_lines(self):
+        """
+        Tests that markdown_to_blocks keeps a fenced code block with empty lines together.
+        """
+        md = "Intro\n\n```\na\n\nb\n```"
+        self.assertEqual(markdown_to_blocks(md), ["Intro", "```\na\n\nb\n```"])
+
     # --- block_to_block_type tests --- # Added tests for block_to_block_type
 
     def test_block_to_block_type_paragraph(self):
@@ -0,0 +1,103 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest
+from markdown_converter import markdown_to_html_node
+from minify import HTMLMinifier, minify_html
+from page_generator import generate_page, generate_pages_recursive
+
+
+def minify_in_chunks(html, size):
+    chunks = []
+    minifier = HTMLMinifier(chunks.append)
+    for i in range(0, len(html), size):
+        minifier.write(html[i:i + size])
+    minifier.close()
+    return "".join(chunks)
+
+
+# Unit tests for the streaming HTML minifier.
+class TestMinify(unittest.TestCase):
+
+    # Tests that whitespace around block-level tags is dropped and comments are removed.
+    def test_block_whitespace_and_comments(self):
+        html = "<html>\n  <head>\n    <title> Home </title>\n  </head>\n  <!-- nav -->\n  <body>\n    <p>Hi</p>\n  </body>\n</html>\n"
+        self.assertEqual(minify_html(html), "<html><head><title>Home</title></head><body><p>Hi</p></body></html>")
+
+    # Tests that whitespace between words and inline elements is collapsed to one space, not removed.
+    def test_inline_whitespace_is_kept(self):
+        html = "<p>Here's   the deal,\n <b>I like</b>  <i>Tolkien</i> <a href=\"/x\">link</a>.</p>"
+        self.assertEqual(minify_html(html), "<p>Here's the deal, <b>I like</b> <i>Tolkien</i> <a href=\"/x\">link</a>.</p>")
+
+    # Tests that the content of code blocks and inline code is written unchanged.
+    def test_preserves_pre_and_code(self):
+        block = markdown_to_html_node("```\ndef f():\n    return  1\n```").to_html()
+        self.assertEqual(minify_html(f"<div>\n  {block}\n</div>"), block.join(["<div>", "</div>"]))
+        self.assertEqual(minify_html("<p>call <code>f(  x )</code>  now</p>"), "<p>call <code>f(  x )</code> now</p>")
+        self.assertEqual(minify_html("<PRE>  a\n  b</PRE >  c"), "<PRE>  a\n  b</PRE >c")
+
+    # Tests that tags and non-breaking spaces are left alone, and a "<" that is not a tag is text.
+    def test_tags_and_text_are_unchanged(self):
+        html = "<p>a  &lt;  b < c  d <img src=\"a b.png\" alt='x > y'></p>"
+        self.assertEqual(minify_html(html), "<p>a &lt; b < c  d <img src=\"a b.png\" alt='x > y'></p>")
+
+    # Tests that the output does not depend on how the HTML is split across writes.
+    def test_streaming_matches_whole_document(self):
+        html = ("<!doctype html>\n<html>\n <body>\n  <p>Some  <b>bold</b>\n text</p>\n  <!-- a comment -->\n"
+                "  <pre><code>  keep\n  this </code></pre>\n  <p>a < b</p>\n </body>\n</html>\n")
+        expected = minify_html(html)
+        for size in (1, 2, 3, 5, 8, 13):
+            self.assertEqual(minify_in_chunks(html, size), expected)
+
+
+# Integration tests for minified page generation.
+class TestMinifiedPages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        os.makedirs(self.content)
+        with open(self.template, 'w') as f:
+            f.write("<html>\n  <body>\n    <article>{{ Content }}</article>\n  </body>\n</html>\n")
+        with open(os.path.join(self.content, "index.md"), 'w') as f:
+            f.write("# Title\n\nSome **bold** text\n\n```\n  indented\n```")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, minify):
+        manifest = BuildManifest.load(self.dest)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = generate_pages_recursive(self.content, self.template, self.dest, "/", manifest, minify=minify)
+        manifest.save()
+        with open(os.path.join(self.dest, "index.html")) as f:
+            return f.read(), stats
+
+    # Tests that generate_page writes the minified page.
+    def test_generate_page_minifies(self):
+        dest_path = os.path.join(self.dest, "page.html")
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(generate_page(os.path.join(self.content, "index.md"), self.template, dest_path, "/",
+                                          minify=True))
+        with open(dest_path) as f:
+            self.assertEqual(f.read(), "<html><body><article><div><h1>Title</h1><p>Some <b>bold</b> text</p>"
+                                       "<pre><code>  indented\n</code></pre></div></article></body></html>")
+
+    # Tests that turning minification on or off regenerates pages built the other way.
+    def test_minify_setting_invalidates_pages(self):
+        plain, _ = self.build(minify=False)
+        minified, stats = self.build(minify=True)
+        self.assertLess(len(minified), len(plain))
+        self.assertEqual(stats.written, 1)
+        _, stats = self.build(minify=True)
+        self.assertEqual(stats.written, 0)
+        self.assertEqual(self.build(minify=False)[0], plain)
+
+
+if __name__ == "__main__":
+    unittest.main()
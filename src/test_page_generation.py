@@ -1,6 +1,17 @@
+import contextlib
+import io
+import os
+import tempfile
+import tracemalloc
 import unittest
 # Import the function to test
+from build_manifest import BuildManifest
+from fixtures import read_tree, write_file
 from markdown_utils import extract_title
+from markdown_converter import markdown_to_html_node
+from page_generator import collect_pages, generate_page, generate_pages_recursive
+from template import Template
+
 
 # Unit tests for page generation related functions.
 class TestPageGeneration(unittest.TestCase):
@@ -84,6 +95,151 @@ This is not part of the title.
         self.assertEqual(title, "First H1 (Should be taken)")
 
 
+
+# Tests for walking the content tree and generating pages, serially and in parallel.
+class TestGeneratePagesRecursive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, "<title>{{ Title }}</title><a href=\"/x\">{{ Content }}</a>")
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        write_file(os.path.join(self.content, "b", "index.md"), "# B\n\n" + "Big page. " * 5000)
+        write_file(os.path.join(self.content, "a", "index.md"), "# A\n\nSmall **page**")
+        write_file(os.path.join(self.content, "a", "notes.txt"), "not markdown")
+        write_file(os.path.join(self.content, "broken", "index.md"), "No title here")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, dest_name, jobs):
+        dest = os.path.join(self.root, dest_name)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            generate_pages_recursive(self.content, self.template, dest, "/site/", jobs=jobs)
+        return read_tree(dest), out.getvalue().replace(dest, "<dest>")
+
+    # Tests that pages are collected in sorted order and non-markdown files are ignored.
+    def test_collect_pages_sorted(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages = collect_pages(self.content, "out")
+        self.assertEqual(
+            [os.path.relpath(src, self.content) for src, _ in pages],
+            [os.path.join("a", "index.md"), os.path.join("b", "index.md"),
+             os.path.join("broken", "index.md"), "index.md"],
+        )
+        self.assertEqual(pages[-1][1], os.path.join("out", "index.html"))
+
+    # Tests that a parallel build produces the same files and the same log as a serial build.
+    def test_parallel_matches_serial(self):
+        serial_files, serial_log = self.build("serial", jobs=1)
+        parallel_files, parallel_log = self.build("parallel", jobs=3)
+        self.assertEqual(serial_files, parallel_files)
+        self.assertEqual(serial_log, parallel_log)
+        self.assertIn("Error extracting title", parallel_log)
+        self.assertIn('<a href="/site/x">', parallel_files["index.html"])
+
+    # Tests that a page that cannot be written is logged and skipped the same way serially and in parallel.
+    def test_unwritable_page_is_skipped_serial_and_parallel(self):
+        logs = []
+        for dest_name, jobs in [("serial", 1), ("parallel", 2)]:
+            # A file where the page's directory should go.
+            write_file(os.path.join(self.root, dest_name, "a"), "not a directory")
+            files, log = self.build(dest_name, jobs)
+            self.assertIn("index.html", files)
+            self.assertIn(f"Error writing final HTML file to {os.path.join('<dest>', 'a', 'index.html')}", log)
+            logs.append(log)
+        self.assertEqual(logs[0], logs[1])
+
+
+
+# Tests for generate_page streaming markdown from disk block by block.
+class TestGeneratePageStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.template_source = '<title>{{ Title }}</title><link href="/a.css">{{ Content }}'
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, self.template_source)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def generate(self, markdown):
+        source = os.path.join(self.root, "page.md")
+        dest = os.path.join(self.root, "out", "page.html")
+        write_file(source, markdown)
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            ok = generate_page(source, self.template, dest, "/site/")
+        html = None
+        if os.path.exists(dest):
+            with open(dest) as f:
+                html = f.read()
+        return ok, html, log.getvalue()
+
+    # Tests that the streamed page matches rendering the whole document at once.
+    def test_streamed_page_matches_in_memory_render(self):
+        markdown = "Intro [link](/x)\n\n# The Title\n\n```\ncode\n\nmore\n```\n\n- a\n- **b**\n\n> quote"
+        ok, html, _ = self.generate(markdown)
+        self.assertTrue(ok)
+        expected = Template(self.template_source, "/site/").render({
+            "Title": "The Title",
+            "Content": markdown_to_html_node(markdown),
+        })
+        self.assertEqual(html, expected)
+
+    # Tests that a markdown error part way through leaves no partial output behind.
+    def test_error_mid_stream_leaves_no_output(self):
+        ok, html, log = self.generate("# Title\n\nfine\n\nbroken **bold")
+        self.assertFalse(ok)
+        self.assertIsNone(html)
+        self.assertIn("Error converting markdown to HTML", log)
+        self.assertEqual(os.listdir(os.path.join(self.root, "out")), [])
+
+    # Tests that peak memory while generating a large page stays far below the page size.
+    def test_large_page_has_bounded_memory(self):
+        block = "A paragraph with **bold**, _italic_ and a [link](/somewhere) in it.\n\n"
+        markdown = "# Big\n\n" + block * 8000
+        source = os.path.join(self.root, "big.md")
+        write_file(source, markdown)
+        dest = os.path.join(self.root, "big.html")
+        del markdown
+
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                ok = generate_page(source, self.template, dest, "/site/")
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertTrue(ok)
+        self.assertGreater(os.path.getsize(dest), 600_000)
+        self.assertLess(peak, 200_000)
+
+    # Tests that hashing a large page for the build manifest keeps memory bounded as well.
+    def test_large_page_with_manifest_has_bounded_memory(self):
+        block = "A paragraph with **bold**, _italic_ and a [link](/somewhere) in it.\n\n"
+        content = os.path.join(self.root, "content")
+        write_file(os.path.join(content, "big.md"), "# Big\n\n" + block * 8000)
+        dest = os.path.join(self.root, "docs")
+        manifest = BuildManifest(dest)
+
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_pages_recursive(content, self.template, dest, "/site/", manifest)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertGreater(os.path.getsize(os.path.join(dest, "big.html")), 600_000)
+        self.assertLess(peak, 200_000)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,84 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import zlib
+
+from fixtures import gradient, make_png, write_bytes
+from markdown_utils import copy_contents_recursive
+from png_optimize import png_chunks, optimize_png, optimize_pngs
+
+
+def stored_png(width=64, height=64, extra_chunks=()):
+    # A gradient stored without compression, split across several IDAT
+    # chunks, for the optimizer to improve on.
+    return make_png(gradient(width, height, 3), width, extra_chunks=extra_chunks, filtered=False, level=0, idat_count=3)
+
+
+def image_data(png):
+    return zlib.decompress(b"".join(payload for chunk_type, payload in png_chunks(png) if chunk_type == b"IDAT"))
+
+
+# Unit tests for lossless PNG optimization.
+class TestPngOptimize(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def optimize(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return optimize_pngs(self.static, self.cache_dir, workers=2)
+
+    # Tests that image data is recompressed into one IDAT and metadata chunks are dropped.
+    def test_recompresses_and_strips(self):
+        png = stored_png(extra_chunks=[(b"tEXt", b"Comment\x00hello"), (b"tRNS", b"\x00\x00\x00\x00\x00\x00"),
+                                       (b"tIME", b"\x07\xe8\x01\x01\x00\x00\x00")])
+        optimized = optimize_png(png)
+        self.assertLess(len(optimized), len(png))
+        self.assertEqual([chunk_type for chunk_type, _ in png_chunks(optimized)], [b"IHDR", b"tRNS", b"IDAT", b"IEND"])
+        self.assertEqual(image_data(optimized), image_data(png))
+
+    # Tests that files that are not PNGs, animated PNGs and already minimal PNGs are left alone.
+    def test_leaves_other_files_alone(self):
+        self.assertIsNone(optimize_png(b"GIF89a"))
+        self.assertIsNone(optimize_png(stored_png()[:-20]))
+        self.assertIsNone(optimize_png(stored_png(extra_chunks=[(b"acTL", b"\x00" * 8)])))
+        self.assertIsNone(optimize_png(optimize_png(stored_png())))
+
+    # Tests that optimized versions are copied in place of the sources, and reused from the cache.
+    def test_optimize_pngs_and_copy(self):
+        write_bytes(os.path.join(self.static, "images", "a.png"), stored_png())
+        write_bytes(os.path.join(self.static, "b.png"), optimize_png(stored_png(width=32)))
+        substitutes, stats = self.optimize()
+        self.assertEqual((stats.optimized, stats.cached, stats.unchanged), (1, 0, 1))
+        self.assertEqual(list(substitutes), [os.path.join(self.static, "images", "a.png")])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            copy_contents_recursive(self.static, self.dest, substitutes=substitutes)
+        with open(os.path.join(self.dest, "images", "a.png"), 'rb') as f:
+            copied = f.read()
+        self.assertEqual(copied, optimize_png(stored_png()))
+        self.assertEqual(stats.bytes_saved, len(stored_png()) - len(copied))
+
+        substitutes, stats = self.optimize()
+        self.assertEqual((stats.optimized, stats.cached, stats.unchanged), (0, 1, 1))
+
+    # Tests that cached results for images that changed or are gone are deleted.
+    def test_stale_results_are_removed(self):
+        write_bytes(os.path.join(self.static, "a.png"), stored_png())
+        self.optimize()
+        write_bytes(os.path.join(self.static, "a.png"), stored_png(width=16))
+        _, stats = self.optimize()
+        self.assertEqual(stats.optimized, 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
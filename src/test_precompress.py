@@ -0,0 +1,112 @@
+import contextlib
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest
+from fixtures import write_file
+from markdown_utils import copy_contents_recursive
+from precompress import available_encodings, precompress_outputs
+
+
+# Unit tests for the precompression stage.
+class TestPrecompress(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        write_file(os.path.join(self.static, "index.css"), "body { color: red; }\n" * 200)
+        write_file(os.path.join(self.static, "small.css"), "a {}")
+        write_file(os.path.join(self.static, "image.png"), "x" * 5000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, encodings=None, min_size=1024):
+        manifest = BuildManifest.load(self.dest)
+        with contextlib.redirect_stdout(io.StringIO()):
+            copy_contents_recursive(self.static, self.dest, manifest)
+            self.stats = precompress_outputs(manifest, min_size, workers=2, encodings=encodings)
+            manifest.remove_stale_outputs(kind="compressed")
+        manifest.save()
+        return manifest
+
+    def path(self, name):
+        return os.path.join(self.dest, name)
+
+    # Tests that large compressible files get a gzip sibling with the same content.
+    def test_writes_gzip_variants(self):
+        self.build()
+        with gzip.open(self.path("index.css.gz"), 'rt') as f, open(self.path("index.css")) as source:
+            self.assertEqual(f.read(), source.read())
+        self.assertEqual(self.stats.written, 1)
+
+    # Tests that small files and file types that don't compress are skipped.
+    def test_skips_small_and_binary_files(self):
+        self.build()
+        self.assertFalse(os.path.exists(self.path("small.css.gz")))
+        self.assertFalse(os.path.exists(self.path("image.png.gz")))
+
+    # Tests that a variant whose source is unchanged is reused without rewriting it.
+    def test_reuses_unchanged_variants(self):
+        self.build()
+        os.utime(self.path("index.css.gz"), ns=(0, 0))
+        self.build()
+        self.assertEqual((self.stats.written, self.stats.reused), (0, 1))
+        self.assertEqual(os.stat(self.path("index.css.gz")).st_mtime_ns, 0)
+
+        write_file(os.path.join(self.static, "index.css"), "body { color: blue; }\n" * 200)
+        self.build()
+        self.assertEqual((self.stats.written, self.stats.reused), (1, 0))
+        with gzip.open(self.path("index.css.gz"), 'rt') as f:
+            self.assertIn("blue", f.read())
+
+    # Tests that variants of removed sources, or from a build that no longer precompresses, are deleted.
+    def test_stale_variants_are_removed(self):
+        self.build()
+        os.remove(os.path.join(self.static, "index.css"))
+        self.build()
+        self.assertFalse(os.path.exists(self.path("index.css.gz")))
+
+        write_file(os.path.join(self.static, "index.css"), "body { color: red; }\n" * 200)
+        self.build()
+        self.build(encodings=[])
+        self.assertFalse(os.path.exists(self.path("index.css.gz")))
+
+    # Tests that a file that does not compress is not compressed again until it changes.
+    def test_incompressible_files_are_not_retried(self):
+        noise = os.path.join(self.static, "noise.txt")
+        with open(noise, 'wb') as f:
+            f.write(os.urandom(4096))
+        self.build(encodings=available_encodings()[:1])
+        self.assertEqual((self.stats.written, self.stats.skipped), (1, 1))
+        self.build(encodings=available_encodings()[:1])
+        self.assertEqual((self.stats.written, self.stats.reused, self.stats.skipped), (0, 1, 1))
+
+        write_file(noise, "a" * 4096)
+        self.build(encodings=available_encodings()[:1])
+        self.assertTrue(os.path.exists(self.path("noise.txt.gz")))
+
+        with open(noise, 'wb') as f:
+            f.write(os.urandom(4096))
+        self.build(encodings=available_encodings()[:1])
+        self.assertEqual(self.stats.skipped, 1)
+        self.assertFalse(os.path.exists(self.path("noise.txt.gz")))
+
+    # Tests that every available encoding is written, and changing encoder settings rewrites variants.
+    def test_extra_encodings(self):
+        reverse = (".rev", "reverse-1", lambda data: gzip.compress(data[::-1], mtime=0))
+        self.build(encodings=available_encodings() + [reverse])
+        self.assertTrue(os.path.exists(self.path("index.css.rev")))
+        self.assertTrue(os.path.exists(self.path("index.css.gz")))
+
+        self.build(encodings=[(".rev", "reverse-2", reverse[2])])
+        self.assertEqual((self.stats.written, self.stats.reused), (1, 0))
+        self.assertFalse(os.path.exists(self.path("index.css.gz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import htmlnode
+import markdown_converter
+import profiling
+import template
+import textnode
+from fixtures import write_file
+from page_generator import generate_pages_recursive
+
+
+TEMPLATE = '<html><title>{{ Title }}</title><body>{{ Content }}</body></html>'
+
+
+# Unit tests for the build profiler.
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.dest = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        write_file(self.template, TEMPLATE)
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nSee [the post](/blog/post/).")
+        write_file(os.path.join(self.content, "blog", "post", "index.md"), "# Post\n\n**Bold** and `code`\n\n- a\n- b")
+
+    def tearDown(self):
+        profiling.disable()
+        self.tmp.cleanup()
+
+    def build(self, jobs=1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_pages_recursive(self.content, self.template, self.dest, "/site/", jobs=jobs)
+
+    # Tests that no hooks are installed and the helpers pass through while profiling is off.
+    def test_disabled_is_passthrough(self):
+        self.assertIs(markdown_converter.text_to_textnodes, textnode.text_to_textnodes)
+        lines = ["# Title"]
+        self.assertIs(profiling.timed_lines(lines), lines)
+        self.assertIs(profiling.timed_write(print), print)
+        self.assertIs(profiling.span("build"), profiling.page("index.md"))
+
+    # Tests that nested stages pause the outer one, so totals are exclusive.
+    def test_stage_time_is_exclusive(self):
+        profiler = profiling.Profiler()
+        start = time.perf_counter_ns()
+        profiler.enter("render")
+        time.sleep(0.02)
+        profiler.enter("inline parse")
+        time.sleep(0.02)
+        profiler.exit()
+        profiler.exit()
+        elapsed = time.perf_counter_ns() - start
+        self.assertGreaterEqual(profiler.totals["inline parse"], 20_000_000)
+        self.assertGreaterEqual(profiler.totals["render"], 20_000_000)
+        self.assertLessEqual(profiler.totals["render"] + profiler.totals["inline parse"], elapsed)
+
+    # Tests that a profiled build times every page stage and restores the hooks afterwards.
+    def test_profiled_build_records_stages(self):
+        rewrite_basepath = template.rewrite_basepath
+        profiling.enable()
+        self.build()
+        profiler = profiling.disable()
+
+        for stage in ["directory walk", "read", "block split", "inline parse", "render",
+                      "templating", "basepath rewrite", "write"]:
+            self.assertGreater(profiler.totals[stage], 0, stage)
+        self.assertEqual(sorted(page[0] for page in profiler.pages),
+                         sorted([os.path.join(self.content, "index.md"),
+                                 os.path.join(self.content, "blog", "post", "index.md")]))
+        self.assertIs(markdown_converter.text_to_textnodes, textnode.text_to_textnodes)
+        self.assertIs(template.rewrite_basepath, rewrite_basepath)
+
+    # Tests that prefixing the URLs of rendered nodes counts as "basepath rewrite", not "render".
+    def test_node_url_prefixing_is_timed(self):
+        prefix_url = htmlnode.prefix_url
+        profiling.enable()
+        html = htmlnode.LeafNode("a", "x", {"href": "/y", "srcset": "/a.png 1x"}).to_html("/site/")
+        profiler = profiling.disable()
+        self.assertEqual(html, '<a href="/site/y" srcset="/site/a.png 1x">x</a>')
+        self.assertGreater(profiler.totals["basepath rewrite"], 0)
+        self.assertIs(htmlnode.prefix_url, prefix_url)
+
+    # Tests that profiling does not change the generated HTML.
+    def test_profiled_output_is_identical(self):
+        self.build()
+        with open(os.path.join(self.dest, "blog", "post", "index.html")) as f:
+            expected = f.read()
+
+        profiling.enable()
+        self.build()
+        profiling.disable()
+        with open(os.path.join(self.dest, "blog", "post", "index.html")) as f:
+            self.assertEqual(f.read(), expected)
+
+    # Tests that page timings measured in worker processes are merged into the build's profile.
+    def test_parallel_build_merges_worker_profiles(self):
+        profiling.enable()
+        self.build(jobs=2)
+        profiler = profiling.disable()
+        self.assertEqual(len(profiler.pages), 2)
+        self.assertGreater(profiler.totals["inline parse"], 0)
+
+    # Tests that the trace file is trace-event JSON with one complete event per page.
+    def test_write_trace(self):
+        profiling.enable()
+        with profiling.span("build", "other"):
+            self.build()
+        profiler = profiling.disable()
+
+        path = os.path.join(self.root, "profile.json")
+        profiler.write_trace(path)
+        with open(path) as f:
+            trace = json.load(f)
+
+        events = trace["traceEvents"]
+        self.assertTrue(all(event["ph"] == "X" and event["ts"] >= 0 for event in events))
+        pages = [event for event in events if event["name"] == "page"]
+        self.assertEqual(len(pages), 2)
+        self.assertIn("render", pages[0]["args"])
+        self.assertIn("render", trace["otherData"]["stage_totals_ms"])
+        self.assertIn("Slowest pages:", profiler.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
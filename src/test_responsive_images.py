@@ -0,0 +1,129 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from assets import AssetMap, HEADERS_FILENAME, IMMUTABLE_CACHE_CONTROL
+from build_manifest import BuildManifest
+from fixtures import gradient, make_png, write_bytes
+from images import ImageIndex
+from markdown_converter import markdown_to_html_node
+from markdown_utils import copy_contents_recursive
+from responsive_images import decode_png, downscale, encode_png, generate_variants
+
+
+# Unit tests for responsive image variants.
+class TestResponsiveImages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        write_bytes(os.path.join(self.static, "images", "a.png"), make_png(gradient(40, 20, 3), 40))
+        write_bytes(os.path.join(self.static, "images", "unused.png"), make_png(gradient(40, 20, 3), 40))
+        write_bytes(os.path.join(self.content, "index.md"), b"# Home\n\n![A](/images/a.png)")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, widths=(10, 20, 80), fingerprint=False):
+        manifest = BuildManifest.load(self.dest)
+        asset_map = AssetMap(self.dest) if fingerprint else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            copy_contents_recursive(self.static, self.dest, manifest, asset_map=asset_map)
+            images = ImageIndex.load(manifest, os.path.join(self.tmp.name, "images.json"))
+            stats = generate_variants(manifest, images, self.content, widths, asset_map,
+                                      cache_dir=self.cache_dir, workers=2)
+            manifest.remove_stale_outputs(kind="variants")
+            manifest.remove_stale_outputs(kind="assets")
+        manifest.save()
+        return images, stats
+
+    # Tests that every scanline filter is undone, for each colour type.
+    def test_decode_all_filters(self):
+        for color_type, channels in [(0, 1), (2, 3), (4, 2), (6, 4)]:
+            rows = gradient(9, 10, channels)
+            width, height, decoded_type, decoded_rows, _ = decode_png(make_png(rows, 9, color_type, channels))
+            self.assertEqual((width, height, decoded_type), (9, 10, color_type))
+            self.assertEqual([bytes(row) for row in decoded_rows], rows)
+
+    # Tests that palette images are expanded to RGB, or RGBA with transparency.
+    def test_decode_palette(self):
+        palette = (b"\xff\x00\x00", b"\x00\xff\x00")
+        rows = [b"\x00\x01", b"\x01\x00"]
+        png = make_png(rows, 2, 3, 1, [(b"PLTE", b"".join(palette)), (b"tRNS", b"\x80")])
+        _, _, color_type, decoded_rows, _ = decode_png(png)
+        self.assertEqual(color_type, 6)
+        self.assertEqual(bytes(decoded_rows[0]), b"\xff\x00\x00\x80\x00\xff\x00\xff")
+        self.assertIsNone(decode_png(b"GIF89a"))
+
+    # Tests that grey and RGB images with a transparent colour get an alpha channel.
+    def test_decode_transparent_color(self):
+        png = make_png([b"\x10\x20"], 2, 0, 1, [(b"tRNS", b"\x00\x20")])
+        _, _, color_type, decoded_rows, _ = decode_png(png)
+        self.assertEqual((color_type, bytes(decoded_rows[0])), (4, b"\x10\xff\x20\x00"))
+
+        png = make_png([b"\x01\x02\x03\x01\x02\x04"], 2, 2, 3, [(b"tRNS", b"\x00\x01\x00\x02\x00\x03")])
+        _, _, color_type, decoded_rows, _ = decode_png(png)
+        self.assertEqual((color_type, bytes(decoded_rows[0])), (6, b"\x01\x02\x03\x00\x01\x02\x04\xff"))
+
+    # Tests that downscaling averages the source pixels under each new pixel.
+    def test_downscale(self):
+        rows = [bytes([0, 10, 20, 30]), bytes([100, 110, 120, 130])]
+        self.assertEqual(downscale(rows, 4, 2, 1, 2), ([bytes([55, 75])], 1))
+        rows, height = downscale(gradient(40, 20, 3), 40, 20, 3, 10)
+        self.assertEqual(height, 5)
+        decoded = decode_png(encode_png(rows, 10, height, 2))
+        self.assertEqual(decoded[:3], (10, 5, 2))
+        self.assertEqual([bytes(row) for row in decoded[3]], rows)
+
+    # Tests that variants are written for images shown in content, narrower than the image only.
+    def test_generate_variants(self):
+        images, stats = self.build()
+        self.assertEqual((stats.images, stats.generated, stats.cached), (1, 2, 0))
+        self.assertEqual(images.variants, {"/images/a.png": [("/images/a-10w.png", 10), ("/images/a-20w.png", 20)]})
+        with open(os.path.join(self.dest, "images", "a-10w.png"), 'rb') as f:
+            width, height = decode_png(f.read())[:2]
+        self.assertEqual((width, height), (10, 5))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images", "unused-10w.png")))
+
+        html = markdown_to_html_node("![A](/images/a.png)", images=images).to_html("/site/")
+        self.assertIn('srcset="/site/images/a-10w.png 10w, /site/images/a-20w.png 20w, /site/images/a.png 40w"', html)
+        self.assertIn('sizes="(max-width: 800px) 100vw, 800px"', html)
+
+    # Tests that variants come from the cache, and are removed when no longer produced.
+    def test_cached_and_stale_variants(self):
+        self.build()
+        _, stats = self.build()
+        self.assertEqual((stats.generated, stats.cached), (0, 2))
+
+        self.build(widths=(20,))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images", "a-10w.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "images", "a-20w.png")))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    # Tests that with fingerprinting, variants get content-hashed names and are listed as immutable in _headers.
+    def test_fingerprinted_variants_are_immutable(self):
+        images, _ = self.build(fingerprint=True)
+        [(source_url, variants)] = images.variants.items()
+        self.assertRegex(source_url, r"^/images/a\.[0-9a-f]{10}\.png$")
+        urls = [url for url, _ in variants]
+        self.assertEqual(len(urls), 2)
+        for url in urls:
+            self.assertRegex(url, r"^/images/a-\d+w\.[0-9a-f]{10}\.png$")
+            self.assertTrue(os.path.isfile(os.path.join(self.dest, *url[1:].split("/"))))
+        with open(os.path.join(self.dest, HEADERS_FILENAME)) as f:
+            headers = f.read()
+        for url in urls:
+            self.assertIn(f"{url}\n  Cache-Control: {IMMUTABLE_CACHE_CONTROL}", headers)
+
+        self.build(fingerprint=True)
+        with open(os.path.join(self.dest, HEADERS_FILENAME)) as f:
+            self.assertEqual(f.read(), headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
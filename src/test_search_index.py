@@ -0,0 +1,104 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest
+from fixtures import write_file
+from page_generator import collect_pages
+from search_index import build_search_index, page_terms, tokenize
+
+
+# Unit tests for the client-side search index.
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.cache_path = os.path.join(self.tmp.name, "cache", "search.json")
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nWelcome to the shire.")
+        write_file(os.path.join(self.content, "blog", "tom", "index.md"),
+                   "# Tom Bombadil\n\nTom sings in the **Old Forest**. [Read more](https://example.com/shire)")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, basepath="/"):
+        manifest = BuildManifest.load(self.dest)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = build_search_index(manifest, self.content, basepath, self.cache_path)
+            manifest.remove_stale_outputs(kind="search")
+        return stats, manifest.save()
+
+    def read_json(self, name):
+        with open(os.path.join(self.dest, "search", name), 'r') as f:
+            return json.load(f)
+
+    # Tests that only the visible text is indexed, and title terms are weighted.
+    def test_page_terms(self):
+        self.assertEqual(tokenize("Tom's `code_block` a I 42"), ["tom", "code", "block", "42"])
+        title, terms = page_terms("# Tom\n\nTom and [the shire](https://example.com/x) ![Old Man](/w.png)\n\n"
+                                  "```\nsing()\n```")
+        self.assertEqual(title, "Tom")
+        self.assertEqual(terms, {"tom": 7, "and": 1, "the": 1, "shire": 1, "old": 1, "man": 1, "sing": 1})
+        with self.assertRaises(ValueError):
+            page_terms("no title")
+
+    # Tests that pages are listed by id and postings are sharded by term prefix.
+    def test_index_files(self):
+        stats, _ = self.build("/site/")
+        self.assertEqual((stats.pages, stats.indexed, stats.cached), (2, 2, 0))
+        self.assertEqual(self.read_json("pages.json"),
+                         {"prefix": 2, "pages": [["/site/", "Home"], ["/site/blog/tom/", "Tom Bombadil"]]})
+        self.assertEqual(self.read_json("sh.json"), {"shire": [0, 1]})
+        self.assertEqual(self.read_json("to.json"), {"to": [0, 1], "tom": [1, 7]})
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "search", "search.js")))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "search", "ex.json")))
+
+    # Tests that an edit only reindexes its page and rewrites the shards whose terms changed.
+    def test_incremental_update(self):
+        self.build()
+        stats, changes = self.build()
+        self.assertEqual((stats.indexed, stats.cached, stats.written), (0, 2, 0))
+        self.assertEqual(changes["modified"] + changes["added"], [])
+
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nWelcome to the zebra shire.")
+        stats, changes = self.build()
+        self.assertEqual((stats.indexed, stats.cached), (1, 1))
+        self.assertEqual([change["path"] for change in changes["added"]], ["search/ze.json"])
+        self.assertEqual(changes["modified"], [])
+
+    # Tests that a removed page's shards are updated or removed, and other pages keep their ids.
+    def test_removed_page(self):
+        write_file(os.path.join(self.content, "about.md"), "# About\n\nZebras.")
+        self.build()
+        self.assertEqual([page[1] for page in self.read_json("pages.json")["pages"]], ["Home", "About", "Tom Bombadil"])
+
+        os.remove(os.path.join(self.content, "about.md"))
+        _, changes = self.build()
+        self.assertEqual(self.read_json("pages.json")["pages"], [["/", "Home"], None, ["/blog/tom/", "Tom Bombadil"]])
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "search", "ze.json")))
+        self.assertIn({"path": "search/ze.json", "kind": "search"},
+                      [{"path": change["path"], "kind": change["kind"]} for change in changes["removed"]])
+
+        write_file(os.path.join(self.content, "new.md"), "# New")
+        self.build()
+        self.assertEqual(self.read_json("pages.json")["pages"][1], ["/new.html", "New"])
+
+    # Tests that pages already collected for the build are indexed without walking the content again.
+    def test_collected_pages_are_reused(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            pages = collect_pages(self.content, self.dest)
+        manifest = BuildManifest.load(self.dest)
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            stats = build_search_index(manifest, self.content, cache_path=self.cache_path, pages=pages[:1])
+        self.assertNotIn("Processing directory", log.getvalue())
+        self.assertEqual(stats.pages, 1)
+        self.assertEqual(self.read_json("pages.json")["pages"], [["/blog/tom/", "Tom Bombadil"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest
+from fixtures import write_file
+from minify import minify_css
+from page_generator import generate_pages_recursive
+from stylesheets import Stylesheets
+from template import Template
+
+
+TEMPLATE = """<html>
+  <head>
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+    <link href="/big.css" rel="stylesheet" />
+    <link href="/print.css" rel="stylesheet" media="print" />
+    <link href="https://example.com/font.css" rel="stylesheet" />
+  </head>
+  <body>{{ Content }}</body>
+</html>
+"""
+
+
+# Unit tests for stylesheet inlining.
+class TestStylesheets(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, "docs")
+        self.content = os.path.join(self.tmp.name, "content")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        write_file(self.template, TEMPLATE)
+        write_file(os.path.join(self.dest, "index.css"), "body {\n  color: red;\n}\n")
+        write_file(os.path.join(self.dest, "big.css"), "h1 { font-weight: bold }\n" * 10)
+        write_file(os.path.join(self.dest, "print.css"), "/* print */\np { margin: 0 }\n" * 50)
+        write_file(os.path.join(self.content, "index.md"), "# Home\n\nHello")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, stylesheets):
+        manifest = BuildManifest.load(self.dest)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = generate_pages_recursive(self.content, self.template, self.dest, "/", manifest,
+                                             stylesheets=stylesheets)
+        manifest.save()
+        with open(os.path.join(self.dest, "index.html")) as f:
+            return f.read(), stats
+
+    # Tests that comments, spare whitespace and final semicolons are removed, but not inside strings.
+    def test_minify_css(self):
+        css = "/* a */\na :hover , b > c {\n  width: calc(1px + 2px);\n  content: \"a  ; }\";\n}\n"
+        self.assertEqual(minify_css(css), 'a :hover,b>c{width:calc(1px + 2px);content:"a  ; }"}')
+
+    # Tests that small stylesheets are inlined and larger ones loaded without blocking rendering.
+    def test_inline_and_preload(self):
+        stylesheets = Stylesheets.load(self.template, self.dest, max_size=100)
+        self.assertEqual(stylesheets, {"/index.css": "body{color:red}", "/big.css": None, "/print.css": None})
+
+        html = Template(TEMPLATE, "/site/", stylesheets=stylesheets).render({"Title": "T", "Content": ""})
+        self.assertIn("<style>body{color:red}</style>", html)
+        self.assertNotIn('href="/site/index.css"', html)
+        self.assertIn('<link rel="preload" href="/site/big.css" as="style"'
+                      ' onload="this.onload=null;this.rel=\'stylesheet\'" />'
+                      '<noscript><link href="/site/big.css" rel="stylesheet" /></noscript>', html)
+        self.assertEqual(html.count("big.css"), 2)
+        self.assertEqual(html.count("print.css"), 1)
+        self.assertIn('<link href="/site/print.css" rel="stylesheet" media="print" />', html)
+        self.assertIn('<link href="https://example.com/font.css" rel="stylesheet" />', html)
+
+        stylesheets = Stylesheets.load(self.template, self.dest)
+        html = Template(TEMPLATE, stylesheets=stylesheets).render({})
+        self.assertIn('<style media="print">p{margin:0}', html)
+        self.assertNotIn("preload", html)
+
+    # Tests that url()s in inlined CSS are made relative to the site root and get the basepath.
+    def test_css_urls_are_rewritten(self):
+        write_file(os.path.join(self.dest, "css", "site.css"),
+                   "a { background: url(../images/a.png) } b { background: url('/b.png?x#y') }"
+                   " i { background: url(data:image/png;base64,AA==) }")
+        write_file(self.template, '<link href="/css/site.css" rel="stylesheet">')
+        stylesheets = Stylesheets.load(self.template, self.dest, "/site/")
+        self.assertEqual(stylesheets["/css/site.css"],
+                         "a{background:url(/site/images/a.png)}b{background:url('/site/b.png?x#y')}"
+                         "i{background:url(data:image/png;base64,AA==)}")
+
+    # Tests that pages are regenerated when an inlined stylesheet changes, and only then.
+    def test_changed_stylesheet_regenerates_pages(self):
+        html, _ = self.build(Stylesheets.load(self.template, self.dest))
+        self.assertIn("color:red", html)
+        _, stats = self.build(Stylesheets.load(self.template, self.dest))
+        self.assertEqual(stats.written, 0)
+
+        write_file(os.path.join(self.dest, "index.css"), "body { color: blue }")
+        html, stats = self.build(Stylesheets.load(self.template, self.dest))
+        self.assertEqual(stats.written, 1)
+        self.assertIn("color:blue", html)
+
+
+if __name__ == "__main__":
+    unittest.main()
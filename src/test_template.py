@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+
+from htmlnode import LeafNode, ParentNode
+from template import Template, load_template, rewrite_basepath
+
+
+# Unit tests for the compiled page template.
+class TestTemplate(unittest.TestCase):
+
+    # Tests that placeholders are filled and literal text is kept.
+    def test_render_basic(self):
+        template = Template("<title>{{ Title }}</title><body>{{ Content }}</body>")
+        html = template.render({"Title": "Hi", "Content": "<p>x</p>"})
+        self.assertEqual(html, "<title>Hi</title><body><p>x</p></body>")
+
+    # Tests that the template's own links are rewritten for the basepath at compile time.
+    def test_basepath_applied_to_template(self):
+        template = Template('<link href="/index.css" /><img src="/a.png" />{{ Content }}', "/site/")
+        self.assertEqual(
+            template.render({"Content": ""}),
+            '<link href="/site/index.css" /><img src="/site/a.png" />',
+        )
+
+    # Tests that string values are written as they are, without rescanning them for URLs.
+    def test_string_values_are_not_rewritten(self):
+        template = Template('<a href="/">{{ Content }}</a>', "/site/")
+        self.assertEqual(
+            template.render({"Content": '<img src="/x.png">'}),
+            '<a href="/site/"><img src="/x.png"></a>',
+        )
+
+    # Tests that node values prefix their URL props but not text that only looks like one.
+    def test_node_values_rewrite_props_only(self):
+        template = Template("{{ Content }}", "/site/")
+        node = ParentNode("p", [
+            LeafNode("code", 'href="/docs"'),
+            LeafNode("img", "", {"src": "/a.png", "alt": "/a.png"}),
+        ])
+        self.assertEqual(
+            template.render({"Content": node}),
+            '<p><code>href="/docs"</code><img src="/site/a.png" alt="/a.png"></img></p>',
+        )
+
+    # Tests that node values are streamed to the sink in chunks.
+    def test_render_to_streams_nodes(self):
+        template = Template("<body>{{ Content }}</body>", "/site/")
+        node = ParentNode("p", [LeafNode(None, "see "), LeafNode("a", "this", {"href": "/x"})])
+        chunks = []
+        template.render_to(chunks.append, {"Content": node})
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual("".join(chunks), '<body><p>see <a href="/site/x">this</a></p></body>')
+
+    # Tests that placeholders without a value stay in the output.
+    def test_missing_value_keeps_placeholder(self):
+        template = Template("{{ Title }} {{ Unknown }}")
+        self.assertEqual(template.render({"Title": "T"}), "T {{ Unknown }}")
+
+    # Tests that a template without placeholders renders unchanged.
+    def test_no_placeholders(self):
+        self.assertEqual(Template("<p>static</p>").render({}), "<p>static</p>")
+
+    # Tests rewrite_basepath on both href and src attributes.
+    def test_rewrite_basepath(self):
+        html = '<a href="/a">x</a><img src="/b.png"><a href="https://c">y</a><script src="//cdn/d.js">'
+        self.assertEqual(
+            rewrite_basepath(html, "/repo/"),
+            '<a href="/repo/a">x</a><img src="/repo/b.png"><a href="https://c">y</a><script src="//cdn/d.js">',
+        )
+        self.assertIs(rewrite_basepath(html, "/"), html)
+
+    # Tests that load_template caches per file and recompiles when the file changes.
+    def test_load_template_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, 'w') as f:
+                f.write("<a>{{ Title }}</a>")
+            first = load_template(path)
+            self.assertIs(load_template(path), first)
+            self.assertIsNot(load_template(path, "/other/"), first)
+
+            with open(path, 'w') as f:
+                f.write("<b>{{ Title }}</b>")
+            os.utime(path, ns=(1, 1))
+            self.assertEqual(load_template(path).render({"Title": "t"}), "<b>t</b>")
+
+
+if __name__ == "__main__":
+    unittest.main()
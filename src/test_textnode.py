@@ -1,3 +1,4 @@
+import random
 import unittest
 
 # Import everything needed from textnode.py
@@ -7,6 +8,7 @@ from textnode import (
     text_node_to_html_node,
     split_nodes_delimiter, # Correctly import from textnode
     text_to_textnodes,
+    _text_to_textnodes_by_passes,
 )
 # Import LeafNode from htmlnode.py
 from htmlnode import LeafNode
@@ -347,6 +349,76 @@ class TestTextNode(unittest.TestCase):
         expected_nodes = []
         self.assertListEqual(expected_nodes, text_to_textnodes(text))
 
+    # --- single-pass lexer tests ---
+
+    def test_text_to_textnodes_delimiters_inside_link(self):
+        """
+        Tests that emphasis markers inside link and image text stay part of that text.
+        """
+        text = "see [**bold** _link_](/a) and ![`alt`](/b.png) **after**"
+        expected_nodes = [
+            TextNode("see ", TextType.TEXT),
+            TextNode("**bold** _link_", TextType.LINK, "/a"),
+            TextNode(" and ", TextType.TEXT),
+            TextNode("`alt`", TextType.IMAGE, "/b.png"),
+            TextNode(" ", TextType.TEXT),
+            TextNode("after", TextType.BOLD),
+        ]
+        self.assertListEqual(expected_nodes, text_to_textnodes(text))
+
+    def test_text_to_textnodes_precedence(self):
+        """
+        Tests that bold is split before italic and italic before code, as the sequential passes did.
+        """
+        text = "**a_b** _c`d`_ `e`"
+        expected_nodes = [
+            TextNode("a_b", TextType.BOLD),
+            TextNode(" ", TextType.TEXT),
+            TextNode("c`d`", TextType.ITALIC),
+            TextNode(" ", TextType.TEXT),
+            TextNode("e", TextType.CODE),
+        ]
+        self.assertListEqual(expected_nodes, text_to_textnodes(text))
+
+    def test_text_to_textnodes_unbalanced_errors(self):
+        """
+        Tests that invalid markdown raises the same error as the sequential passes.
+        """
+        for text in ["**a [l](u) b**", "_a **b** c_", "`a_b`", "a ` b", "![i](u) _x"]:
+            with self.assertRaises(ValueError) as expected:
+                _text_to_textnodes_by_passes(text)
+            with self.assertRaises(ValueError) as actual:
+                text_to_textnodes(text)
+            self.assertEqual(str(expected.exception), str(actual.exception))
+
+    def test_text_to_textnodes_matches_sequential_passes(self):
+        """
+        Tests the lexer against the sequential passes on random mixes of markup fragments.
+        """
+        fragments = ["a", " ", "*", "**", "_", "`", "[", "]", "(", ")", "!",
+                     "![a](b)", "[l](u)", "x)y", "\n"]
+        rng = random.Random(6)
+
+        def run(function, text):
+            try:
+                return function(text)
+            except ValueError as e:
+                return str(e)
+
+        for _ in range(5000):
+            text = "".join(rng.choice(fragments) for _ in range(rng.randint(0, 14)))
+            self.assertEqual(
+                run(_text_to_textnodes_by_passes, text), run(text_to_textnodes, text), repr(text)
+            )
+
+    def test_text_to_textnodes_adversarial_input(self):
+        """
+        Tests long runs of unmatched brackets, which must not make matching backtrack badly.
+        """
+        text = "[" * 20000 + "](" * 20000 + "![" * 20000
+        nodes = text_to_textnodes(text)
+        self.assertEqual(nodes, [TextNode(text, TextType.TEXT)])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,155 @@
+import contextlib
+import http.client
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from build_manifest import BuildManifest
+from main import build_site
+from watch import (
+    LIVE_RELOAD_SCRIPT,
+    LiveReload,
+    SiteWatcher,
+    diff_snapshots,
+    inject_live_reload,
+    make_server,
+)
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+# Tests for watch mode's targeted rebuilds and live reload server.
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        write_file("template.html", "<title>{{ Title }}</title><body>{{ Content }}</body>")
+        write_file(os.path.join("content", "index.md"), "# Home\n\nWelcome")
+        write_file(os.path.join("content", "post", "index.md"), "# Post\n\nBody")
+        write_file(os.path.join("static", "index.css"), "body {}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_site("/")
+        self.live_reload = LiveReload()
+        self.watcher = SiteWatcher("/", self.live_reload)
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp.cleanup()
+
+    def poll(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.watcher.poll()
+
+    def age(self, path):
+        os.utime(path, ns=(0, 0))
+
+    # Tests that diff_snapshots reports added, modified and removed files.
+    def test_diff_snapshots(self):
+        old = {"a": (1, 1), "b": (1, 1), "c": (1, 1)}
+        new = {"a": (1, 1), "b": (2, 1), "d": (1, 1)}
+        self.assertEqual(diff_snapshots(old, new), ({"b", "d"}, {"c"}))
+
+    # Tests that polling without changes does nothing.
+    def test_poll_without_changes(self):
+        self.assertFalse(self.poll())
+        self.assertEqual(self.live_reload.version, 0)
+
+    # Tests that editing one page regenerates only that page and notifies browsers.
+    def test_edit_regenerates_only_that_page(self):
+        self.age(os.path.join("docs", "index.html"))
+        write_file(os.path.join("content", "post", "index.md"), "# Post\n\nEdited")
+        self.assertTrue(self.poll())
+        self.assertIn("Edited", read_file(os.path.join("docs", "post", "index.html")))
+        self.assertEqual(os.stat(os.path.join("docs", "index.html")).st_mtime_ns, 0)
+        self.assertEqual(self.live_reload.version, 1)
+
+        # The manifest knows about the edit, so a full build has nothing left to do.
+        self.age(os.path.join("docs", "post", "index.html"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_site("/")
+        self.assertEqual(os.stat(os.path.join("docs", "post", "index.html")).st_mtime_ns, 0)
+
+    # Tests that a deleted page's output is removed and forgotten by the manifest.
+    def test_deleted_page_removes_output(self):
+        os.remove(os.path.join("content", "post", "index.md"))
+        self.poll()
+        self.assertFalse(os.path.exists(os.path.join("docs", "post", "index.html")))
+        with contextlib.redirect_stdout(io.StringIO()):
+            manifest = BuildManifest.load("docs")
+        self.assertEqual(sorted(manifest.previous["pages"]), ["index.html"])
+        self.assertEqual(sorted(manifest.previous["assets"]), ["index.css"])
+
+    # Tests that a page that no longer builds loses its old output, as in a full build.
+    def test_failed_page_removes_output(self):
+        write_file(os.path.join("content", "post", "index.md"), "No title any more")
+        self.poll()
+        self.assertFalse(os.path.exists(os.path.join("docs", "post", "index.html")))
+        with contextlib.redirect_stdout(io.StringIO()):
+            manifest = BuildManifest.load("docs")
+        self.assertEqual(sorted(manifest.previous["pages"]), ["index.html"])
+
+    # Tests that a template change regenerates every page.
+    def test_template_change_regenerates_all_pages(self):
+        write_file("template.html", "<main>{{ Title }}{{ Content }}</main>")
+        self.poll()
+        self.assertTrue(read_file(os.path.join("docs", "index.html")).startswith("<main>"))
+        self.assertTrue(read_file(os.path.join("docs", "post", "index.html")).startswith("<main>"))
+
+    # Tests that static changes are synced.
+    def test_static_change_is_synced(self):
+        write_file(os.path.join("static", "app.js"), "let x;")
+        self.poll()
+        self.assertEqual(read_file(os.path.join("docs", "app.js")), "let x;")
+
+
+# Tests for the live reload script and server.
+class TestLiveReloadServer(unittest.TestCase):
+
+    # Tests that the script goes before </body>, or at the end without one.
+    def test_inject_live_reload(self):
+        self.assertEqual(inject_live_reload(b"<body>x</body>"), b"<body>x" + LIVE_RELOAD_SCRIPT + b"</body>")
+        self.assertEqual(inject_live_reload(b"x"), b"x" + LIVE_RELOAD_SCRIPT)
+
+    # Tests that served pages get the script and that event-stream clients hear about rebuilds.
+    def test_server_serves_pages_and_reload_events(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stderr(io.StringIO()):
+            write_file(os.path.join(tmp, "index.html"), "<body>hi</body>")
+            live_reload = LiveReload()
+            server = make_server(0, live_reload, directory=tmp)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                port = server.server_address[1]
+                connection = http.client.HTTPConnection("localhost", port, timeout=5)
+                connection.request("GET", "/")
+                body = connection.getresponse().read()
+                self.assertIn(LIVE_RELOAD_SCRIPT, body)
+                self.assertTrue(os.path.getsize(os.path.join(tmp, "index.html")) < len(body))
+
+                events = http.client.HTTPConnection("localhost", port, timeout=5)
+                events.request("GET", "/__livereload")
+                response = events.getresponse()
+                self.assertEqual(response.getheader("Content-Type"), "text/event-stream")
+                live_reload.notify()
+                self.assertEqual(response.readline(), b"data: reload\n")
+                events.close()
+                connection.close()
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import re
 from enum import Enum
 from htmlnode import LeafNode
 # Import splitting functions that are in markdown_utils
@@ -34,7 +35,10 @@ class TextNode:
         return f"TextNode({repr(self.text)}, {repr(self.text_type.value)}, {repr(self.url)})"
 
 
-def text_node_to_html_node(text_node):
+def text_node_to_html_node(text_node, asset_map=None, images=None):
+    # With an AssetMap, link and image URLs of static files point at their
+    # fingerprinted copies. With an ImageIndex, images get their size and
+    # lazy-loading attributes.
     if text_node.text_type == TextType.TEXT:
         return LeafNode(None, text_node.text)
     elif text_node.text_type == TextType.BOLD:
@@ -44,9 +48,14 @@ def text_node_to_html_node(text_node):
     elif text_node.text_type == TextType.CODE:
         return LeafNode("code", text_node.text)
     elif text_node.text_type == TextType.LINK:
-        return LeafNode("a", text_node.text, {"href": text_node.url})
+        url = text_node.url if asset_map is None else asset_map.resolve(text_node.url)
+        return LeafNode("a", text_node.text, {"href": url})
     elif text_node.text_type == TextType.IMAGE:
-        return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
+        url = text_node.url if asset_map is None else asset_map.resolve(text_node.url)
+        props = {"src": url, "alt": text_node.text}
+        if images is not None:
+            props.update(images.attributes(url))
+        return LeafNode("img", "", props)
     else:
         raise ValueError(f"Invalid text type: {text_node.text_type}")
 
@@ -73,7 +82,80 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
 
     return new_nodes
 
-def text_to_textnodes(text):
+# Same patterns as markdown_utils.extract_markdown_images/links. The inline
+# lexer matches links and the three delimiters in one alternation; only one
+# alternative can start at any given character, so tokens never compete.
+IMAGE_REGEX = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+INLINE_TOKEN_REGEX = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)|\*\*|_|`")
+
+
+class _UnbalancedDelimiter(Exception):
+    pass
+
+
+def _lex_segment(text, start, end, nodes):
+    """
+    Lexes text[start:end], a stretch with no images in it, appending TextNodes
+    to nodes. Links end the current run of delimited text; inside a run, "**"
+    takes precedence over "_", which takes precedence over "`", exactly like
+    the three split_nodes_delimiter passes applied in that order.
+    """
+    bold = italic = code = False
+    run_start = start
+
+    for match in INLINE_TOKEN_REGEX.finditer(text, start, end):
+        token = match.group(0)
+        token_start = match.start()
+
+        if match.group(1) is not None or match.group(2) is not None:
+            if bold or italic or code:
+                raise _UnbalancedDelimiter()
+            if token_start > run_start:
+                nodes.append(TextNode(text[run_start:token_start], TextType.TEXT))
+            nodes.append(TextNode(match.group(1), TextType.LINK, match.group(2)))
+            run_start = match.end()
+
+        elif token == "**":
+            if bold:
+                nodes.append(TextNode(text[run_start:token_start], TextType.BOLD))
+            elif italic or code:
+                raise _UnbalancedDelimiter()
+            elif token_start > run_start:
+                nodes.append(TextNode(text[run_start:token_start], TextType.TEXT))
+            bold = not bold
+            run_start = match.end()
+
+        elif bold:
+            continue
+
+        elif token == "_":
+            if italic:
+                nodes.append(TextNode(text[run_start:token_start], TextType.ITALIC))
+            elif code:
+                raise _UnbalancedDelimiter()
+            elif token_start > run_start:
+                nodes.append(TextNode(text[run_start:token_start], TextType.TEXT))
+            italic = not italic
+            run_start = match.end()
+
+        elif italic:
+            continue
+
+        else:
+            if code:
+                nodes.append(TextNode(text[run_start:token_start], TextType.CODE))
+            elif token_start > run_start:
+                nodes.append(TextNode(text[run_start:token_start], TextType.TEXT))
+            code = not code
+            run_start = match.end()
+
+    if bold or italic or code:
+        raise _UnbalancedDelimiter()
+    if end > run_start:
+        nodes.append(TextNode(text[run_start:end], TextType.TEXT))
+
+
+def _text_to_textnodes_by_passes(text):
     # These splitting functions operate sequentially
     nodes = [TextNode(text, TextType.TEXT)]
     nodes = split_nodes_image(nodes)         # Lives in markdown_utils
@@ -83,3 +165,26 @@ def text_to_textnodes(text):
     nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)   # Lives in textnode
     return nodes
 
+
+def text_to_textnodes(text):
+    """
+    Splits inline markdown into TextNodes in a single left-to-right scan.
+    Produces the same nodes as running split_nodes_image, split_nodes_link
+    and the "**", "_" and "`" delimiter splits one after another. Both
+    patterns use only negated character classes, so matching stays linear
+    in the length of the text.
+    """
+    nodes = []
+    try:
+        position = 0
+        if "![" in text:
+            for match in IMAGE_REGEX.finditer(text):
+                _lex_segment(text, position, match.start(), nodes)
+                nodes.append(TextNode(match.group(1), TextType.IMAGE, match.group(2)))
+                position = match.end()
+        _lex_segment(text, position, len(text), nodes)
+    except _UnbalancedDelimiter:
+        # Invalid markdown is rare; rerun the individual passes so the error
+        # names the same delimiter and text they always have.
+        return _text_to_textnodes_by_passes(text)
+    return nodes
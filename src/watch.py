@@ -0,0 +1,261 @@
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from block_cache import BlockCache
+from build_manifest import BuildManifest
+from main import (
+    CONTENT_PATH,
+    DEST_DIR_PATH,
+    STATIC_DIR_PATH,
+    TEMPLATE_PATH,
+    build_site,
+)
+from markdown_utils import copy_contents_recursive
+from page_generator import generate_page, page_inputs_hash
+
+
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SCRIPT = (
+    f'<script>new EventSource("{LIVE_RELOAD_PATH}").onmessage = '
+    'function () { location.reload(); };</script>'
+).encode("utf-8")
+
+
+def snapshot(paths):
+    """
+    Returns {file path: (mtime_ns, size)} for every file that is, or is under,
+    one of the given paths. Missing paths are skipped.
+    """
+    files = {}
+    for path in paths:
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            files[path] = (stat.st_mtime_ns, stat.st_size)
+            continue
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                files[file_path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def diff_snapshots(old, new):
+    # Returns (changed, removed); added files count as changed.
+    changed = {path for path, signature in new.items() if old.get(path) != signature}
+    removed = set(old) - set(new)
+    return changed, removed
+
+
+def page_dest_path(markdown_path):
+    relative_path = os.path.relpath(markdown_path, CONTENT_PATH)
+    return os.path.join(DEST_DIR_PATH, relative_path)[:-3] + ".html"
+
+
+def _is_under(path, directory):
+    return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+
+
+def _remove_page_output(manifest, dest_path, reason):
+    manifest.forget(dest_path)
+    if os.path.isfile(dest_path):
+        print(f"  Removing output of {reason}: {dest_path}")
+        os.remove(dest_path)
+
+
+class LiveReload:
+    """
+    A build counter that browser connections wait on. Every notify() wakes
+    all waiting connections so they can tell their page to reload.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._condition = threading.Condition()
+
+    def notify(self):
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class SiteWatcher:
+    """
+    Polls content/, static/ and the template and rebuilds only what a change
+    affects: edited pages are regenerated on their own, static changes are
+    synced, and a template change regenerates every page.
+    """
+
+    def __init__(self, basepath="/", live_reload=None, block_cache=None):
+        self.basepath = basepath
+        self.live_reload = live_reload
+        self.block_cache = block_cache
+        self.watched_paths = [CONTENT_PATH, STATIC_DIR_PATH, TEMPLATE_PATH]
+        self.files = snapshot(self.watched_paths)
+
+    def poll(self):
+        files = snapshot(self.watched_paths)
+        changed, removed = diff_snapshots(self.files, files)
+        self.files = files
+        if not changed and not removed:
+            return False
+
+        started = time.perf_counter()
+        self.rebuild(changed, removed)
+        print(f"Rebuilt in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        if self.live_reload is not None:
+            self.live_reload.notify()
+        return True
+
+    def rebuild(self, changed, removed):
+        touched = changed | removed
+        if TEMPLATE_PATH in touched:
+            build_site(self.basepath, cache=self.block_cache)
+            return
+
+        manifest = BuildManifest.load(DEST_DIR_PATH)
+        manifest.carry_over("pages")
+        manifest.carry_over("compressed")
+        manifest.carry_over("variants")
+        manifest.carry_over("search")
+
+        if any(_is_under(path, STATIC_DIR_PATH) for path in touched):
+            copy_contents_recursive(STATIC_DIR_PATH, DEST_DIR_PATH, manifest)
+        else:
+            manifest.carry_over("assets")
+
+        template_hash = manifest.hash_input(TEMPLATE_PATH)
+        for path in sorted(changed):
+            if path.endswith(".md") and _is_under(path, CONTENT_PATH):
+                dest_path = page_dest_path(path)
+                inputs_hash = page_inputs_hash(path, template_hash, self.basepath)
+                if generate_page(path, TEMPLATE_PATH, dest_path, self.basepath, self.block_cache):
+                    manifest.record(dest_path, inputs_hash)
+                else:
+                    # A full build removes it as stale too.
+                    _remove_page_output(manifest, dest_path, "page that failed to build")
+
+        for path in sorted(removed):
+            if path.endswith(".md") and _is_under(path, CONTENT_PATH):
+                _remove_page_output(manifest, page_dest_path(path), "deleted page")
+
+        manifest.save()
+
+
+def inject_live_reload(html):
+    index = html.rfind(b"</body>")
+    if index == -1:
+        return html + LIVE_RELOAD_SCRIPT
+    return html[:index] + LIVE_RELOAD_SCRIPT + html[index:]
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the built site, adds the live reload script to HTML pages as they
+    are served (the files on disk are left untouched) and streams reload
+    events to browsers over server-sent events.
+    """
+
+    def do_GET(self):
+        url_path = urllib.parse.urlsplit(self.path).path
+        if url_path == LIVE_RELOAD_PATH:
+            self._serve_live_reload()
+            return
+
+        file_path = self.translate_path(self.path)
+        if os.path.isdir(file_path) and url_path.endswith("/"):
+            file_path = os.path.join(file_path, "index.html")
+        if file_path.endswith(".html") and os.path.isfile(file_path):
+            self._serve_html(file_path)
+            return
+
+        super().do_GET()
+
+    def _serve_html(self, file_path):
+        with open(file_path, 'rb') as f:
+            body = inject_live_reload(f.read())
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve_live_reload(self):
+        # Read the version before answering, so a rebuild that finishes while
+        # the browser is connecting is not missed.
+        version = self.server.live_reload.version
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        try:
+            while True:
+                new_version = self.server.live_reload.wait_for_change(version, timeout=15)
+                if new_version == version:
+                    # Comment line: keeps the connection alive and notices closed tabs.
+                    self.wfile.write(b": ping\n\n")
+                else:
+                    version = new_version
+                    self.wfile.write(b"data: reload\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+def make_server(port, live_reload, directory=DEST_DIR_PATH):
+    handler = functools.partial(DevRequestHandler, directory=directory)
+    server = ThreadingHTTPServer(("localhost", port), handler)
+    server.daemon_threads = True
+    server.live_reload = live_reload
+    return server
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Rebuild the site on change and serve it with live reload")
+    parser.add_argument("--port", type=int, default=8888, help="port to serve docs/ on (default: 8888)")
+    parser.add_argument("--interval", type=float, default=0.2,
+                        help="seconds between checks for changed files (default: 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    cache = BlockCache()
+    build_site("/", cache=cache)
+
+    live_reload = LiveReload()
+    watcher = SiteWatcher("/", live_reload, cache)
+    server = make_server(args.port, live_reload)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving {DEST_DIR_PATH} at http://localhost:{args.port} and watching for changes")
+
+    try:
+        while True:
+            time.sleep(args.interval)
+            watcher.poll()
+    except KeyboardInterrupt:
+        print("Stopping watch mode")
+    finally:
+        server.shutdown()
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()